@@ -3,24 +3,77 @@ import streamlit as st
 from pathlib import Path
 import sys
 
-# for pdfs
-import tempfile
-import requests
-from io import BytesIO
-from PIL import Image
-from fpdf import FPDF
+import json
+import os
+import time
 
 
 project_root = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(project_root / "src"))
 sys.path.insert(0, str(project_root / "app"))
 
-from picto_helpers import get_picto_with_variants # robust functions to extract pictos
+from picto_helpers import attach_pictos, resolve_choice_picto # robust functions to extract pictos
 
-from qcmgen.nlp import extract_facts
-from qcmgen.qcm import generate_qcms
-from qcmgen.pictos.resolve import resolve_term_to_picto_strict, _load_cache
-from qcmgen.sentence_generation import generate_text
+from qcmgen.bank import generation_key, get_question_bank
+from qcmgen.jobs import get_job_runner
+from qcmgen.metrics import get_metrics
+from qcmgen.nlp import get_nlp
+from qcmgen.pdf import build_pdf
+from qcmgen.pipeline import generate_worksheet, prefetch_worksheet
+from qcmgen.qcm import QuestionType
+from qcmgen.pictos.arasaac_client import set_default_session, static_url
+from qcmgen.pictos.cache import get_cache_store
+from qcmgen.text_pool import get_text_pool
+
+MAX_SHARED_GENERATIONS = 256
+BANK_RESULTS = 50  # questions proposées par la banque pour un jeu de filtres
+# budget de temps d'une génération (secondes): au-delà, on rend les questions déjà prêtes
+GENERATION_BUDGET_S = float(os.environ.get("QCMGEN_BUDGET_S", "3"))
+
+# Ressources partagées par toutes les sessions du serveur (un seul exemplaire par processus)
+
+@st.cache_resource
+def load_shared_nlp():
+    return get_nlp()
+
+@st.cache_resource
+def load_shared_picto_store(lang: str = "fr"):
+    return get_cache_store(lang)
+
+@st.cache_resource
+def start_nlp_warmup():
+    """
+    Load the spaCy model in the background: the first page of a new worker renders
+    without waiting for it (a generation started meanwhile waits in get_nlp)
+    """
+    return get_job_runner("prefetch").submit(lambda job: get_nlp(), name="nlp-warmup")
+
+@st.cache_resource
+def load_shared_http_session():
+    import requests
+
+    session = requests.Session()
+    set_default_session(session)
+    return session
+
+@st.cache_resource
+def load_distractor_engine():
+    """
+    Vector-similarity distractors over the categories.json terms that have a picto.
+    from_cache (every cached picto, labelled by ARASAAC tag) is the alternative; on the
+    shipped cache it covers fewer categories (see scripts/bench_distractors.py)
+    """
+    from qcmgen.distractors import VectorDistractorEngine, spacy_vector_fn
+
+    categories = json.loads((project_root / "scripts" / "categories.json").read_text())
+    return VectorDistractorEngine.from_categories(categories, spacy_vector_fn(load_shared_nlp()))
+
+@st.cache_resource
+def load_shared_generations() -> dict:
+    """
+    Generation results keyed by text hash + options: {key: qcms}
+    """
+    return {}
 
 def apply_styles():
 
@@ -46,13 +99,16 @@ def render_controls():
     col1, col2 = st.columns([1,1])
     with col1:
         generate = st.button("Générer les QCM", type ="primary")
+        regenerate = st.button("Régénérer", help="Nouvelle génération, sans reprendre les questions déjà générées pour ce texte.")
         reset = st.button("Réinitialiser", type = "primary")
     with col2:
         use_llm_generation = st.toggle("Utiliser l'assistant IA pour générer le QCM", value=True)
         llm_text_generation = st.toggle("Utiliser l'assistant IA pour générer des phrases", value=False)
+        speculative = st.toggle("Préparer les QCM pendant la saisie", value=False,
+                                help="Analyse le texte et cherche les pictogrammes des réponses dès qu'il change.")
         debug_mode = st.checkbox("Afficher debug", value = False)
 
-    return text, use_llm_generation, llm_text_generation, generate, debug_mode, reset
+    return text, use_llm_generation, llm_text_generation, generate, regenerate, debug_mode, reset, speculative
 
 def init_session_state():
     """
@@ -65,15 +121,9 @@ def init_session_state():
     if "submitted" not in st.session_state:
         st.session_state.submitted = False
 
-    if "picto_cache" not in st.session_state:
-        st.session_state.picto_cache = {}
-
     if "has_generated" not in st.session_state:
         st.session_state.has_generated = False
 
-    if "picto_urls" not in st.session_state:
-        st.session_state.picto_urls = {}
-
     if "llm_text_generation" not in st.session_state:
         st.session_state.llm_text_generation = False
 
@@ -83,74 +133,178 @@ def init_session_state():
     if "input_text" not in st.session_state:
         st.session_state.input_text = ""
 
-def generate_qcms_from_text(text: str = "", 
-                            use_llm_generation: bool = False, 
-                            require_pictos: bool = True,
-                            items: dict = {}):
+STAGE_LABELS = {
+    "parse": "Analyse du texte",
+    "llm": "Assistant IA",
+    "answers": "Pictos des bonnes réponses",
+    "pictos": "Pictos des choix",
+}
+
+def submit_generation(text: str = "",
+                      use_llm_generation: bool = False,
+                      require_pictos: bool = True,
+                      items: dict = {},
+                      use_lemmas: bool = True,
+                      budget_s: float | None = GENERATION_BUDGET_S,
+                      regenerate: bool = False):
     """
-    Given some text, generate qcm questions and answers
+    Start generating the qcm questions of a text as a background job (qcmgen.jobs).
+    Returns the qcms right away when this text was already generated, else None:
+    the result is picked up by collect_generation on a later rerun.
+    With regenerate, the text is generated again and replaces the shared and banked result.
     """
 
-    st.session_state.submitted = False
-
     if not text.strip():
         st.warning("Veuillez entrer un texte avant de générer des QCM.")
         return []
-    
-    else:
-
-        if use_llm_generation:
-
-            from qcmgen.llm import generate_qcms_from_text_llm
-
-            qcms = generate_qcms_from_text_llm(text, items)
-            st.session_state.qcms = qcms
-
-        else:
-
-            facts = extract_facts(text)
-            qcms = []
-            for fact in facts:
-                qcms.extend(generate_qcms(fact))
-
-        print(len(qcms), "QCM générés avant filtrage.")
-
-        # load in cache answers that are not in the cache already
-        cache_fr = _load_cache('fr')
-
-        for q in qcms:
-            answer = q.choices[q.answer_index]
 
-            if answer not in cache_fr:
-                resolve_term_to_picto_strict(answer, expected_type = q.qtype)
-
-        if require_pictos:
-
-            # Filtrer les QCM sans pictos valides
-            filtered = []
-            counter = 0
-            for q in qcms:
-                expected_type = q.qtype if isinstance(q.qtype, str) else None
-                print(expected_type)
-                urls = [ get_picto_with_variants(c, expected_type=expected_type)[1] for c in q.choices ]
-                if all(u is not None for u in urls):
-                    counter += 1
-                    filtered.append(q)
-                    st.session_state.picto_urls[counter] = urls
-                else:
-                    print(f'Removing question {q.question} with choices {q.choices}')
-                    print(f'urls found: {[u is not None for u in urls]}')
-
-            qcms = filtered
+    generations = load_shared_generations()
+    key = generation_key(text, use_llm_generation, require_pictos, items)
+    if regenerate:
+        generations.pop(key, None)
+    elif key not in generations:
+        # texte déjà généré par une autre session ou un autre processus (qcmgen.bank)
+        banked = get_question_bank().get_generation(key)
+        if banked is not None:
+            generations[key] = banked
+    if key in generations:
+        cancel_generation()
+        st.session_state.submitted = False
+        st.session_state.generation_notice = None
+        _clear_answers()
+        return list(generations[key])
+
+    job = st.session_state.get("generation_job")
+    if job is not None and job.key == key and not job.finished and not regenerate:
+        return None  # même texte déjà en cours: un second clic ne relance pas tout
+    cancel_generation()
+
+    engine = load_distractor_engine()  # ressources partagées résolues dans le thread du script
+    # mode debug: profilage (cProfile + tracemalloc) de cette génération seulement
+    profile = "all" if st.session_state.get("profile_next") else None
+    st.session_state.profile_next = False
+
+    def work(job):
+        result = generate_worksheet(text, use_llm_generation=use_llm_generation, require_pictos=require_pictos,
+                                    items=items, picto_resolver=resolve_choice_picto,
+                                    attach=lambda qcms, progress: attach_pictos(qcms, use_lemmas=use_lemmas, progress=progress),
+                                    distractor_engine=engine, budget_s=budget_s, job=job, profile=profile)
+        if not result.partial and result.qcms:
+            # génération complète et non vide seulement, comme le partage entre sessions;
+            # au mieux: un échec de la banque ne fait jamais échouer la génération
+            try:
+                get_question_bank().put_generation(key, text, result.qcms, options={
+                    "use_llm_generation": use_llm_generation, "require_pictos": require_pictos, "items": items})
+            except Exception as e:
+                print(f"Question bank write failed: {e}")
+        return result
+
+    st.session_state.generation_job = get_job_runner().submit(work, key=key, name="generation")
+    st.session_state.generation_input = (text.strip(), use_llm_generation)
+    return None
+
+def start_prefetch(text: str):
+    """
+    Speculative mode: when the text changes, parse it and resolve its likely answers
+    in the background (qcmgen.pipeline.prefetch_worksheet); stale work is cancelled.
+    """
+    text = text.strip()
+    if not text or st.session_state.get("prefetch_text") == text:
+        return
+    job = st.session_state.get("prefetch_job")
+    if job is not None:
+        job.cancel()
+    st.session_state.prefetch_job = get_job_runner("prefetch").submit(
+        lambda job: prefetch_worksheet(text, picto_resolver=resolve_choice_picto, job=job), key=text, name="prefetch")
+    st.session_state.prefetch_text = text
+
+def cancel_generation():
+    job = st.session_state.get("generation_job")
+    if job is not None:
+        job.cancel()
+    st.session_state.generation_job = None
+
+def collect_generation(job):
+    """
+    Pick up a finished generation job: qcms for the session, shared result
+    (complete generations only), notice for the teacher.
+    """
+    st.session_state.generation_job = None
+    st.session_state.submitted = False
 
-            print(len(qcms), "QCM générés après filtrage.")
+    if job.status == "cancelled":
+        return st.session_state.qcms
+    if job.status == "failed":
+        st.session_state.generation_notice = f"La génération a échoué : {job.error}"
+        return []
 
-        # Nettoyer les anciennes réponses
-        for k in list(st.session_state.keys()):
-            if k.startswith("qcm_"):
-             del st.session_state[k]
+    result = job.result
+    st.session_state.generation_cut = list(result.cut)
+    st.session_state.generation_trace = result.trace
+    st.session_state.generation_profile = result.profile
+
+    if result.cut:
+        # budget épuisé: on rend ce qui est prêt, résultat partiel non partagé
+        st.session_state.generation_notice = (f"Génération limitée à {GENERATION_BUDGET_S:.0f} s : "
+                                              "certaines questions ont pu être omises.")
+    elif result.cache_only:
+        # ARASAAC indisponible: pictos du cache local seulement, résultat partiel non partagé
+        st.session_state.generation_notice = ("ARASAAC ne répond pas : les pictogrammes viennent uniquement du cache local, "
+                                              "certaines questions peuvent manquer.")
+    else:
+        st.session_state.generation_notice = None
+    if not result.partial and result.qcms:
+        # génération complète et non vide: partagée (un texte sans question est retenté)
+        generations = load_shared_generations()
+        generations[job.key] = list(result.qcms)
+        while len(generations) > MAX_SHARED_GENERATIONS:
+            generations.pop(next(iter(generations)), None)
+
+    _clear_answers()
+    return result.qcms
+
+@st.fragment(run_every=0.5)
+def render_generation_progress():
+    """
+    Progress of the running generation job, refreshed on its own; a full rerun
+    picks up the result once the job is finished.
+    """
+    job = st.session_state.get("generation_job")
+    if job is None:
+        return
+    if job.finished:
+        st.rerun()
 
-    return qcms
+    label = STAGE_LABELS.get(job.stage, "Préparation")
+    if job.total:
+        label = f"{label} : {job.done}/{job.total}"
+    st.progress(job.fraction() or 0.0, text=f"Génération du QCM en cours… {label} ({job.elapsed():.1f} s)")
+    st.button("Annuler", on_click=cancel_generation, key="cancel_generation")
+
+def render_metrics(trace):
+    """Debug: where the last generation's time went, and the process-wide totals (JSON / Prometheus export)."""
+    if trace is not None:
+        st.caption("Dernière génération : temps par étape (self = sans les étapes imbriquées)")
+        st.dataframe(trace.rows(), hide_index=True)
+        counters = trace.snapshot()["counters"]
+        if counters:
+            st.caption(" · ".join(f"{k} : {v:g}" for k, v in sorted(counters.items())))
+
+    metrics = get_metrics()
+    with st.expander("Métriques du processus"):
+        st.dataframe(metrics.rows(), hide_index=True)
+        st.json(metrics.snapshot()["counters"])
+        col_json, col_prom = st.columns(2)
+        col_json.download_button("Exporter (JSON)", data=metrics.to_json(), file_name="qcmgen_metrics.json",
+                                 mime="application/json")
+        col_prom.download_button("Exporter (Prometheus)", data=metrics.to_prometheus(), file_name="qcmgen_metrics.prom",
+                                 mime="text/plain")
+
+def _clear_answers():
+    # Nettoyer les anciennes réponses
+    for k in list(st.session_state.keys()):
+        if k.startswith("qcm_"):
+            del st.session_state[k]
 
 def display_qcm_question(i, qcm, debug_mode = False):
     """
@@ -178,9 +332,23 @@ def display_qcm_question(i, qcm, debug_mode = False):
     if key not in st.session_state:
         st.session_state[key] = None
 
-    cols = st.columns(len(qcm.choices))
+    render_choices(i, qcm, qcm.picto_urls(), debug_mode)
+
+    st.divider()  
 
-    urls = st.session_state.picto_urls[i]
+def select_choice(key, j):
+    st.session_state[key] = j
+
+@st.fragment
+def render_choices(i, qcm, urls, debug_mode = False):
+    """
+    Choice widgets of one question. Runs as a fragment: selecting an answer
+    only re-renders this question, not the whole page.
+    """
+    started = time.perf_counter()
+    key = f"qcm_{i}"
+
+    cols = st.columns(len(qcm.choices))
 
     for j, (col, choice_text) in enumerate(zip(cols, qcm.choices)):
         with col:
@@ -191,24 +359,26 @@ def display_qcm_question(i, qcm, debug_mode = False):
 
             url = urls[j]
             if url:
-                st.image(url, width='content')
+                st.image(static_url(url), width='content')
             else:
                 st.write("❓")
 
             if debug_mode:
                 st.markdown(f"<div class='choice-label'>{choice_text}</div>", unsafe_allow_html=True)
 
-            # Le bouton est la vraie interaction
-            if st.button("Sélectionner" if not is_selected else "Sélectionné ✅", key=f"{key}_btn_{j}"):
-                st.session_state[key] = j
-                st.rerun() #actualisation directe pour voir ce qui a été selectionné
+            # Le bouton est la vraie interaction: le callback s'exécute avant le rerun du fragment,
+            # donc la sélection est visible directement (plus besoin de st.rerun() sur toute la page)
+            st.button("Sélectionner" if not is_selected else "Sélectionné ✅", key=f"{key}_btn_{j}",
+                      on_click=select_choice, args=(key, j))
 
             st.markdown("</div>", unsafe_allow_html=True)
 
             if debug_mode:
                 st.caption(choice_text)
 
-    st.divider()  
+    if debug_mode:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.caption(f"Rendu de la question : {elapsed_ms:.1f} ms (dernière page complète : {st.session_state.get('last_run_ms', 0):.1f} ms)")
 
 def evaluation_and_scoring(qcms):
     """
@@ -248,64 +418,37 @@ def render_qcms(qcms):
     if st.session_state.submitted and qcms:
         evaluation_and_scoring(qcms)
 
-def _download_picto_to_file(url: str) -> str | None:
-    if not url:
-        return None
-    r = requests.get(url, timeout=10)
-    if r.status_code != 200:
-        return None
-
-    img = Image.open(BytesIO(r.content)).convert("RGB")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    img.save(tmp.name, "JPEG")
-    return tmp.name
-
-def build_pdf(qcms, picto_urls, edited_questions) -> bytes:
-    pdf = FPDF(unit="mm", format="A4")
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Helvetica", size=13)
-
-    for i, q in enumerate(qcms, start=1):
-        paragraph = q.paragraph or ""
-        question = edited_questions.get(f"edit_qcm_{i}", q.question)
-
-        if paragraph:
-            pdf.set_font("Helvetica", style="", size=11)
-            pdf.multi_cell(0, 6, f"Contexte: {paragraph}")
-            pdf.ln(1)
-
-        pdf.set_font("Helvetica", style="B", size=13)
-        pdf.multi_cell(0, 8, f"{i}. {question}")
-        pdf.ln(2)
-
-        pdf.set_font("Helvetica", size=11)
-        # Affichage des choix sur une seule ligne (4 pictos)
-        urls = picto_urls.get(i, [])
-        img_size = 18
-        cell_width = 45  # largeur par picto + texte
-
-        start_x = pdf.get_x()
-        y = pdf.get_y()
-
-        for j, choice in enumerate(q.choices):
-            x = start_x + j * cell_width
-            pdf.set_xy(x, y)
-
-            url = urls[j] if j < len(urls) else None
-            img_path = _download_picto_to_file(url)
-
-            if img_path:
-                pdf.image(img_path, x=x, y=y, w=img_size, h=img_size)
-                pdf.set_xy(x + img_size + 2, y + 5)
-                #pdf.cell(cell_width - img_size - 2, 6, choice)
-            #else:
-                #pdf.cell(cell_width, 6, choice)
-
-        # sauter une ligne après la rangée
-        pdf.ln(img_size + 6)
-
-    return pdf.output(dest="S").encode("latin1")
+def render_question_bank():
+    """
+    Build a worksheet from questions already generated (qcmgen.bank): filter them,
+    tick some, add them to the current questions
+    """
+    bank = get_question_bank()
+    with st.expander("Banque de questions"):
+        col_type, col_answer, col_category = st.columns(3)
+        qtype = col_type.selectbox("Type", ["(tous)"] + [t.value for t in QuestionType], key="bank_qtype")
+        answer = col_answer.text_input("Réponse", key="bank_answer")
+        category = col_category.selectbox("Catégorie", ["(toutes)"] + [c for c, _ in bank.categories()], key="bank_category")
+
+        found = bank.search(qtype=None if qtype == "(tous)" else qtype, answer=answer or None,
+                            category=None if category == "(toutes)" else category, limit=BANK_RESULTS,
+                            distinct=True)
+        if not found:
+            st.caption("Aucune question de la banque ne correspond.")
+            return
+        picked = [qid for qid, q in found
+                  if st.checkbox(f"{q.question} → {q.choices[q.answer_index]}", key=f"bank_pick_{qid}")]
+        if st.button("Ajouter à la fiche", disabled=not picked):
+            from qcmgen.dedup import drop_near_duplicates
+
+            # pas de quasi-doublon d'une question déjà sur la fiche
+            st.session_state.qcms, skipped = drop_near_duplicates(list(st.session_state.qcms) + bank.get(picked))
+            st.session_state.generation_notice = (f"{len(skipped)} question(s) déjà sur la fiche (ou presque) : "
+                                                  "non ajoutée(s)." if skipped else None)
+            st.session_state.has_generated = True
+            for qid in picked:
+                del st.session_state[f"bank_pick_{qid}"]
+            st.rerun()
 
 def collect_selected_questions(qcms) -> list[str]:
     selected = []
@@ -315,26 +458,42 @@ def collect_selected_questions(qcms) -> list[str]:
     return selected
 
 
+# temps d'exécution du script complet (affiché en mode debug)
+run_started = time.perf_counter()
+
 # instantiate styling
 apply_styles()
 
+# warm up shared resources (once per server process)
+load_shared_http_session()
+load_shared_picto_store("fr")
+start_nlp_warmup()
+
 # instantiate session state()
 init_session_state()
 if st.session_state.should_generate_text:
-    paragraphs, items = generate_text(st.session_state.nb_phrases, st.session_state.complexity)
+    # texte tiré de la réserve pré-générée (qcmgen.text_pool), jamais deux fois le même par session
+    seen = st.session_state.setdefault("seen_text_ids", set())
+    paragraphs, items, text_id = get_text_pool().get_text(st.session_state.complexity, st.session_state.nb_phrases, seen_ids=seen)
+    seen.add(text_id)
     st.session_state.input_text = "\n \n".join(paragraphs)
     st.session_state.should_generate_text = False
 
 # instantiate buttons
-text, use_llm_generation, llm_text_generation, generate, debug_mode, reset = render_controls()
+text, use_llm_generation, llm_text_generation, generate, regenerate, debug_mode, reset, speculative = render_controls()
+
+# mode spéculatif (génération sans LLM seulement: c'est elle qui part de extract_facts)
+if speculative and not use_llm_generation:
+    start_prefetch(text)
 
 qcms = st.session_state.qcms
 
 if reset:
+    cancel_generation()
+    st.session_state.generation_notice = None
     st.session_state.qcms = []
     st.session_state.submitted = False
     st.session_state.has_generated = False
-    st.session_state.picto_urls = {}
     # delete qcm answer keys
     keys_to_delete = [ key for key in st.session_state.keys() if key.startswith('qcm_')]
     for key in keys_to_delete:
@@ -355,20 +514,38 @@ else:
     generate_text_with_llm = False
         
 
-if generate:
-    st.subheader("Generation du QCM en cours ... ")
+if generate or regenerate:
     st.session_state.has_generated = True
     if generate_text_with_llm:
-        qcms = generate_qcms_from_text(text = text, 
-                                       use_llm_generation = use_llm_generation, 
-                                       items = items)
+        ready = submit_generation(text = text,
+                                  use_llm_generation = use_llm_generation,
+                                  items = items,
+                                  regenerate = regenerate)
+    else:
+        ready = submit_generation(text = text,
+                                  use_llm_generation = use_llm_generation,
+                                  regenerate = regenerate)
+    if ready is not None:
+        qcms = st.session_state.qcms = ready
+
+# génération en tâche de fond: annulée si le texte change, récupérée une fois finie
+job = st.session_state.get("generation_job")
+if job is not None:
+    if job.finished:
+        qcms = st.session_state.qcms = collect_generation(job)
+    elif st.session_state.get("generation_input") != (text.strip(), use_llm_generation):
+        cancel_generation()
+        st.info("Le texte a changé : génération annulée.")
     else:
-        qcms = generate_qcms_from_text(text = text, 
-                                            use_llm_generation = use_llm_generation) 
-    st.session_state.qcms = qcms
+        render_generation_progress()
+
+if st.session_state.get("generation_notice"):
+    st.info(st.session_state.generation_notice)
 
 if not qcms:
-    if not st.session_state.has_generated:
+    if st.session_state.get("generation_job") is not None:
+        pass  # résultat affiché au rerun qui suit la fin de la tâche
+    elif not st.session_state.has_generated:
         st.info("Entrez un texte pour commencer.")
     else:
         st.info("Aucune question générée (texte trop court ou structure non reconnue).")
@@ -377,13 +554,15 @@ else:
     st.subheader("QCM générés")
     render_qcms(qcms)
 
+render_question_bank()
+
 selected_questions = collect_selected_questions(qcms)
 
 if st.button("Préparer le PDF"):
     selected_qcms = [q for i, q in enumerate(qcms, start=1) if st.session_state.get(f"keep_qcm_{i}", False)]
     edited_questions = {k: v for k, v in st.session_state.items() if k.startswith("edit_qcm_")}
 
-    st.session_state.pdf_bytes = build_pdf(selected_qcms, st.session_state.picto_urls, edited_questions)
+    st.session_state.pdf_bytes = build_pdf(selected_qcms, edited_questions)
 
 if st.session_state.get("pdf_bytes"):
     st.download_button(
@@ -393,5 +572,16 @@ if st.session_state.get("pdf_bytes"):
         mime="application/pdf"
     )
 
-
-
+# mesure de la latence d'un rerun complet, à comparer au rendu d'une question (fragment)
+st.session_state.last_run_ms = (time.perf_counter() - run_started) * 1000
+if debug_mode:
+    st.caption(f"Rerun complet : {st.session_state.last_run_ms:.1f} ms pour {len(qcms)} questions")
+    prefetch = st.session_state.get("prefetch_job")
+    if prefetch is not None:
+        st.caption(f"Préparation spéculative : {prefetch.status}, {prefetch.done}/{prefetch.total} réponses, {prefetch.elapsed():.1f} s")
+    if st.session_state.get("generation_cut"):
+        st.caption(f"Étapes coupées par le budget de temps : {', '.join(st.session_state.generation_cut)}")
+    render_metrics(st.session_state.get("generation_trace"))
+    st.checkbox("Profiler la prochaine génération (cProfile + tracemalloc)", key="profile_next")
+    if st.session_state.get("generation_profile"):
+        st.caption(f"Profil de la dernière génération : python scripts/show_profile.py {Path(st.session_state.generation_profile).name}")
@@ -1,6 +1,12 @@
+import threading
+import time
 import unicodedata
-import streamlit as st
-from qcmgen.pictos.resolve import resolve_term_to_picto_strict
+from collections import OrderedDict
+from qcmgen.metrics import incr
+from qcmgen.nlp import lemmatize_terms
+from qcmgen.pictos.arasaac_client import is_cache_only
+from qcmgen.pictos.resolve import ResolvedPicto, resolve_term_to_picto_strict
+from qcmgen.qcm import ChoicePicto
 
 
 def cleanup_term(term: str) -> str:
@@ -26,53 +32,145 @@ def cleanup_term(term: str) -> str:
 
     return term
 
+# (terme, expected_type) -> (ResolvedPicto ou None, expiration), partagé par toutes les sessions du
+# processus. LRU de module sous verrou plutôt que st.cache_resource: get_picto est appelé depuis les
+# threads de génération, et un même terme peut être résolu différemment selon expected_type.
+# Un manque (None) n'est gardé que PICTO_MISS_TTL_S: une réponse vide ou en erreur d'ARASAAC
+# ne doit pas devenir un manque définitif jusqu'au redémarrage.
+PICTO_MEMO_SIZE = 4096
+PICTO_MISS_TTL_S = 300.0
+_PICTO_MEMO: "OrderedDict[tuple[str, str | None], tuple[ResolvedPicto | None, float | None]]" = OrderedDict()
+_PICTO_MEMO_LOCK = threading.Lock()
+
 def term_variants(term: str) -> list[str]:
     """
     Enlever les conjugaisons (heuristique)
     """
     base = cleanup_term(term)
-    variants = {base}
+    variants = [base]
 
     # singulier simple
     if base.endswith("s") and len(base) > 3:
-        variants.add(base[:-1])
+        variants.append(base[:-1])
 
     # heuristiques de conjugaison (présent / imparfait / futur proche)
     for suffix in ("e", "es", "ent", "ons", "ez", "ais", "ait", "aient"):
         if base.endswith(suffix) and len(base) > len(suffix) + 2:
             stem = base[: -len(suffix)]
-            variants.add(stem)
-            variants.add(stem + "er")  # ex: mange -> manger
-            variants.add(stem + "ir")
-            variants.add(stem + "re")
+            variants.append(stem)
+            variants.append(stem + "er")  # ex: mange -> manger
+            variants.append(stem + "ir")
+            variants.append(stem + "re")
+
+    return list(dict.fromkeys(variants))
+
+def lemma_variants(term: str, lemma: str | None = None) -> list[str]:
+    """
+    Ordered candidates: lemma first, then the surface form, then the heuristic variants
+    (only tried if the first two miss, since lookups stop at the first match)
+    """
+    variants = []
+    if lemma:
+        variants.append(cleanup_term(lemma))
+    variants.extend(term_variants(term))
+    return [v for v in dict.fromkeys(variants) if v]
 
-    return list(variants)
+def get_picto_with_variants(term: str, expected_type: str | None = None, lemma: str | None = None):
+    """
+    Loops on all possible variants, starting with the lemma (if given) then the cleanup regular version,
+    and returns the first match
+    """
+    candidate, picto = resolve_with_variants(term, expected_type=expected_type, lemma=lemma)
+    return candidate, (picto.url if picto else None)
 
-def get_picto_with_variants(term: str, expected_type: str | None = None):
+def resolve_with_variants(term: str, expected_type: str | None = None, lemma: str | None = None):
     """
-    Loops on all possible variants, starting with the cleanup regular version, and returns the first match
+    Same as get_picto_with_variants but returns (variant, ResolvedPicto)
     """
-    for candidate in term_variants(term):
-        url = get_picto_url(candidate, expected_type=expected_type)
-        if url:
-            return candidate, url
+    for candidate in lemma_variants(term, lemma):
+        picto = get_picto(candidate, expected_type=expected_type)
+        if picto:
+            return candidate, picto
     return None, None
 
+def resolve_choice_picto(term: str, expected_type: str | None = None, lemma: str | None = None) -> ChoicePicto | None:
+    """
+    Resolve one choice to the ChoicePicto carried by QCM objects (also used as picto_resolver during generation)
+    """
+    variant, r = resolve_with_variants(term, expected_type=expected_type, lemma=lemma)
+    return ChoicePicto(picto_id=r.picto_id, url=r.url, variant=variant) if r else None
+
 def get_picto_url(term: str, expected_type: str | None = None) -> str | None:
     """
     Fetch pictogram image url given the pictogram term
     """
+    picto = get_picto(term, expected_type=expected_type)
+    return picto.url if picto else None
+
+def get_picto(term: str, expected_type: str | None = None) -> ResolvedPicto | None:
+    """
+    Fetch pictogram given the pictogram term (shared cache, then strict resolver)
+    """
     term_norm = term.strip().lower()
     if not term_norm:
         return None
     
     #term_norm = cleanup_term(term_norm)
 
-    cache = st.session_state.picto_cache
-    if term_norm in cache:
-        return cache[term_norm]
+    key = (term_norm, expected_type)
+    with _PICTO_MEMO_LOCK:
+        known = _PICTO_MEMO.get(key)
+        if known is not None:
+            memo, expires_at = known
+            if expires_at is not None and time.monotonic() > expires_at:
+                del _PICTO_MEMO[key]  # manque expiré: nouvelle tentative
+                known = None
+            else:
+                _PICTO_MEMO.move_to_end(key)
+    if known is not None:
+        # manque récent (None): pas de nouvel appel à ARASAAC
+        incr("picto_memo_hits" if memo is not None else "picto_negative_hits")
+        return memo
 
+    # résolution hors verrou: deux threads peuvent résoudre le même terme, le résultat est le même
     r = resolve_term_to_picto_strict(term_norm, lang="fr", expected_type=expected_type)
-    url = r.url if r else None
-    cache[term_norm] = url
-    return url
+    if r is None and is_cache_only():
+        return None  # ARASAAC indisponible: un manque n'est pas définitif, on ne le mémorise pas
+    with _PICTO_MEMO_LOCK:
+        _PICTO_MEMO[key] = (r, None if r is not None else time.monotonic() + PICTO_MISS_TTL_S)
+        _PICTO_MEMO.move_to_end(key)
+        while len(_PICTO_MEMO) > PICTO_MEMO_SIZE:
+            _PICTO_MEMO.popitem(last=False)
+    return r
+
+def attach_pictos(qcms, use_lemmas: bool = True, progress=None):
+    """
+    Batched resolution stage: resolve every distinct choice of the worksheet once
+    and store the result on each QCM (qcm.pictos), so that the UI filter and the
+    PDF builder never call the resolver again.
+    progress(done, total) is called after each distinct choice is resolved.
+    """
+    todo = [q for q in qcms if not q.has_all_pictos()]
+
+    # Lemmatiser tous les choix de la fiche en une seule passe spaCy
+    lemmas = lemmatize_terms([c for q in todo for c in q.choices]) if (use_lemmas and todo) else {}
+
+    total = len({(c, q.qtype if isinstance(q.qtype, str) else None) for q in todo for c in q.choices})
+    resolved = {}
+    for q in todo:
+        expected_type = q.qtype if isinstance(q.qtype, str) else None
+        known = q.pictos if (q.pictos is not None and len(q.pictos) == len(q.choices)) else [None] * len(q.choices)
+
+        pictos = []
+        for choice, picto in zip(q.choices, known):
+            if picto is None:
+                key = (choice, expected_type)
+                if key not in resolved:
+                    resolved[key] = resolve_choice_picto(choice, expected_type=expected_type, lemma=lemmas.get(choice))
+                    if progress is not None:
+                        progress(len(resolved), total)
+                picto = resolved[key]
+            pictos.append(picto)
+        q.pictos = pictos
+
+    return qcms
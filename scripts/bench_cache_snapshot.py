@@ -0,0 +1,125 @@
+"""
+Benchmark: open + lookups on a large pictogram cache, JSON vs mmap snapshot.
+
+Builds a synthetic cache of N terms in a temporary directory, then measures in
+fresh child processes (so the peak RSS is that of one cold process):
+    - time to open the cache and get the first entry,
+    - mean time of a lookup,
+    - peak RSS.
+
+Usage: python scripts/bench_cache_snapshot.py [--terms 100000] [--lookups 20000]
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.cache import PictoCacheStore, to_file_format
+from qcmgen.pictos.snapshot import build_snapshot, snapshot_path_for
+
+
+def synthetic_cache(n_terms: int, seed: int = 0):
+    rng = random.Random(seed)
+    tags = ["animal", "food", "clothes", "vehicle", "color", "place", "sport", "verb"]
+    flat = {}
+    for i in range(n_terms):
+        picto_id = i // 2  # singulier / pluriel sur le même picto
+        term = f"terme{picto_id}" + ("s" if i % 2 else "")
+        flat[term] = {
+            "picto_id": picto_id,
+            "url": f"https://static.arasaac.org/pictograms/{picto_id}/{picto_id}_300.png",
+            "score": float(rng.randint(1, 20)),
+            "tags": rng.sample(tags, 2),
+            "categories": [f"categorie {rng.randint(0, 50)}"],
+            "keyword": f"terme{picto_id}",
+            "plural": f"terme{picto_id}s",
+            "fetched_at": 1.7e9 + i,
+            "schema_version": 1,
+        }
+    return flat
+
+
+def peak_rss_mb() -> float:
+    # VmHWM est propre au processus; ru_maxrss hérite du pic du parent à travers fork/exec sous Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(path: str, terms_file: str) -> None:
+    with open(terms_file, encoding="utf-8") as f:
+        terms = json.load(f)
+    t0 = time.perf_counter()
+    store = PictoCacheStore(path)
+    cache = store.data()
+    cache.get(terms[0])
+    open_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    found = sum(1 for t in terms if cache.get(t) is not None)
+    lookup_us = (time.perf_counter() - t0) / len(terms) * 1e6
+
+    print(json.dumps({"open_ms": open_ms, "lookup_us": lookup_us, "found": found, "rss_mb": peak_rss_mb()}))
+
+
+def run_child(path: str, terms_file: str):
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", path, terms_file],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--terms", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    flat = synthetic_cache(args.terms)
+    rng = random.Random(1)
+    terms = rng.sample(list(flat), min(args.lookups, len(flat)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_dir, snap_dir = Path(tmp) / "json", Path(tmp) / "snap"
+        json_dir.mkdir()
+        snap_dir.mkdir()
+        terms_file = str(Path(tmp) / "terms.json")
+        with open(terms_file, "w", encoding="utf-8") as f:
+            json.dump(terms, f)
+
+        for d in (json_dir, snap_dir):
+            with open(d / "cache.json", "w", encoding="utf-8") as f:
+                json.dump(to_file_format(flat), f, ensure_ascii=False, indent=1)
+        build_snapshot(flat, snapshot_path_for(str(snap_dir / "cache.json")))
+
+        json_size = (json_dir / "cache.json").stat().st_size
+        snap_size = Path(snapshot_path_for(str(snap_dir / "cache.json"))).stat().st_size
+        print(f"{args.terms} terms, {len(terms)} lookups | JSON {json_size / 1e6:.1f} MB, snapshot {snap_size / 1e6:.1f} MB")
+
+        for name, d in (("json", json_dir), ("snapshot", snap_dir)):
+            r = run_child(str(d / "cache.json"), terms_file)
+            assert r["found"] == len(terms), r
+            print(f"{name:9s} open {r['open_ms']:8.1f} ms | lookup {r['lookup_us']:6.2f} µs | peak RSS {r['rss_mb']:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
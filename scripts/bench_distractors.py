@@ -0,0 +1,79 @@
+"""
+Vector distractor engine (qcmgen.distractors): build time and pick time, for the
+two ways of building it:
+
+  categories  VectorDistractorEngine.from_categories(scripts/categories.json),
+              terms of the curated lists that have a cached picto
+  cache       VectorDistractorEngine.from_cache, every cached picto labelled
+              with its first ARASAAC tag of DEFAULT_CACHE_TAGS
+
+Answers are the engine's own terms (a worksheet answer is usually a known
+term), drawn at random, with their engine category. Each batch size is picked
+--runs times; the script prints the median time per batch and per answer, and
+how many answers got k distractors.
+
+Usage: python scripts/bench_distractors.py [--sizes 1,20,200] [--runs 50]
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.distractors import VectorDistractorEngine, spacy_vector_fn
+from qcmgen.nlp import get_nlp
+
+
+def bench(label, engine, sizes, runs, k, rng):
+    if not len(engine):
+        print(f"{label:11s} no term with a picto")
+        return
+    for n in sizes:
+        times, full = [], 0
+        for _ in range(runs):
+            answers = [rng.choice(engine.terms) for _ in range(n)]
+            categories = [engine.category_of(a) for a in answers]
+            t0 = time.perf_counter()
+            picks = engine.pick(answers, categories, k=k)
+            times.append((time.perf_counter() - t0) * 1000)
+            full += sum(len(p) == k for p in picks)
+        median = statistics.median(times)
+        print(f"{label:11s} {n:6d} answers  median {median:8.3f} ms  ({median / n * 1000:7.1f} µs per answer)  "
+              f"{full / (n * runs):6.1%} with {k} picks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,20,200", help="answers per pick() call")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    vector_fn = spacy_vector_fn(get_nlp())
+    categories = json.loads((project_root / "scripts" / "categories.json").read_text())
+
+    t0 = time.perf_counter()
+    by_categories = VectorDistractorEngine.from_categories(categories, vector_fn)
+    categories_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    by_cache = VectorDistractorEngine.from_cache(vector_fn)
+    cache_s = time.perf_counter() - t0
+    print(f"categories  built in {categories_s * 1000:7.1f} ms: {len(by_categories)} terms, "
+          f"{len(by_categories.category_names)} categories")
+    print(f"cache       built in {cache_s * 1000:7.1f} ms: {len(by_cache)} terms, "
+          f"{len(by_cache.category_names)} categories\n")
+
+    rng = random.Random(args.seed)
+    bench("categories", by_categories, sizes, args.runs, args.k, rng)
+    bench("cache", by_cache, sizes, args.runs, args.k, rng)
+
+
+if __name__ == "__main__":
+    main()
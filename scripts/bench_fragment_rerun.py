@@ -0,0 +1,81 @@
+"""
+Latency of selecting an answer on a worksheet, before and after the
+per-question fragments (render_choices in app/app.py).
+
+Before, a click called st.rerun(): the whole script ran again. Now the click
+only reruns the fragment of the clicked question. streamlit's AppTest always
+reruns the whole script, so both costs are read from the app's own debug
+timings, after each click:
+
+  full rerun  st.session_state.last_run_ms: the whole script (cost of a click before)
+  fragment    "Rendu de la question" of the clicked question (cost of a click now)
+
+The worksheet is built from cached pictos (no network, no NLP). Streamlit's own
+per-rerun overhead (websocket, diff of the page) comes on top of both.
+
+Usage: python scripts/bench_fragment_rerun.py [--questions 20] [--clicks 30]
+"""
+from pathlib import Path
+import argparse
+import random
+import re
+import statistics
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from streamlit.testing.v1 import AppTest
+
+from qcmgen.pictos.resolve import _cache_items
+from qcmgen.qcm import QCM, ChoicePicto, QuestionType
+
+_FRAGMENT_MS = re.compile(r"Rendu de la question : ([0-9.]+) ms")
+
+
+def synthetic_sheet(n: int, rng: random.Random):
+    """n QCMs of 4 cached pictos each."""
+    entries = [(t, hit) for t, hit in _cache_items("fr") if hit.get("url")]
+    qcms = []
+    for i in range(n):
+        picked = rng.sample(entries, 4)
+        qcms.append(QCM(
+            question=f"Que montre l'image {i + 1} ?",
+            choices=[t for t, _ in picked],
+            answer_index=rng.randrange(4),
+            qtype=QuestionType.OBJECT,
+            pictos=[ChoicePicto(picto_id=int(hit["picto_id"]), url=str(hit["url"]), variant=t) for t, hit in picked],
+        ))
+    return qcms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    at = AppTest.from_file(str(project_root / "app" / "app.py"), default_timeout=120).run()
+    at.checkbox[[c.label for c in at.checkbox].index("Afficher debug")].check().run()
+    at.session_state["qcms"] = synthetic_sheet(args.questions, rng)
+    at.run()
+
+    full, fragment = [], []
+    for _ in range(args.clicks):
+        i, j = rng.randrange(args.questions) + 1, rng.randrange(4)
+        at.button(key=f"qcm_{i}_btn_{j}").click().run()
+        if at.exception:
+            sys.exit(f"app error: {at.exception}")
+        timings = [float(m.group(1)) for c in at.caption for m in [_FRAGMENT_MS.match(c.value)] if m]
+        full.append(at.session_state["last_run_ms"])
+        fragment.append(timings[i - 1])
+
+    print(f"{args.questions} questions, {args.clicks} clicks (median / max)")
+    print(f"  full rerun (st.rerun, before)  {statistics.median(full):8.1f} ms  {max(full):8.1f} ms")
+    print(f"  fragment rerun (now)           {statistics.median(fragment):8.1f} ms  {max(fragment):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Check the keyword index against `_score_candidate` on the local cache
+(golden set) and time single / batch lookups.
+
+Usage: python scripts/bench_keyword_index.py
+"""
+from pathlib import Path
+import sys
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.keyword_index import KeywordIndex
+from qcmgen.pictos.resolve import _cache_keywords, _load_cache, _score_candidate
+
+
+def brute_force(term_norm, entries):
+    scored = []
+    for i, (key, kws) in enumerate(entries):
+        cand = {"keywords": kws}
+        scored.append((_score_candidate(term_norm, cand), i, key))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    return [(s, key) for s, _, key in scored]
+
+
+def main():
+    cache = _load_cache("fr")
+    entries = [(term, _cache_keywords(term, hit)) for term, hit in cache.items()]
+
+    index = KeywordIndex()
+    for key, kws in entries:
+        index.add(key, kws)
+
+    # golden set: every cached term, its prefixes/substrings and a few misses
+    golden = set()
+    for key, _ in entries:
+        golden.add(key)
+        golden.add(key[:3])
+        golden.add(key[1:4])
+    golden |= {"zzz", "a", "e", "ch"}
+    golden.discard("")
+
+    mismatches = 0
+    for term in sorted(golden):
+        if index.search(term, include_any=True) != brute_force(term, entries):
+            mismatches += 1
+            print(f"MISMATCH: {term}")
+    print(f"Golden set: {len(golden)} terms, {mismatches} mismatches")
+
+    terms = sorted(golden)
+    t0 = time.perf_counter()
+    for term in terms:
+        index.search(term)
+    per_lookup = (time.perf_counter() - t0) / len(terms)
+    print(f"Single lookup: {per_lookup * 1e6:.1f} us")
+
+    for n in (1000, 2000, 4000, 8000):
+        batch = [terms[i % len(terms)] + str(i // len(terms) or "") for i in range(n)]
+        t0 = time.perf_counter()
+        index.search_many(batch)
+        print(f"Batch {n:5d}: {(time.perf_counter() - t0) * 1e3:.1f} ms")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
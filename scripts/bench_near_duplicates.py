@@ -0,0 +1,148 @@
+"""
+Near-duplicate detection (qcmgen.dedup) at bank scale.
+
+For each size, N synthetic questions are built from templates over the local
+picto cache terms. About 5 % of them are rewritten copies of an earlier
+question: an adjective or a place is added, or the article changes. The
+questions then go through:
+
+  batch        signatures + duplicate_of, all at once (like drop_near_duplicates)
+  incremental  one question at a time, like the bank: NearDuplicateIndex query,
+               exact Jaccard of the candidates, only kept questions are indexed
+
+The script prints the time per question for each size. It stays flat when
+the cost is near linear. It also prints how many questions are flagged and
+how many of the rewritten ones. Some rewrites fall below the threshold on
+purpose, e.g. a place added to a 3-word question.
+
+--exact M compares the first M questions with an exhaustive search. Only
+questions with the same answer can reach the threshold, so each pair of
+such questions is compared exactly.
+
+Usage: python scripts/bench_near_duplicates.py [--sizes 50000,100000,200000] [--exact 20000]
+"""
+from pathlib import Path
+import argparse
+import random
+import sys
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+import numpy as np
+
+from qcmgen.dedup import (ESTIMATE_MARGIN, NEAR_DUP_THRESHOLD, NearDuplicateIndex, duplicate_of, get_minhasher,
+                          jaccard, normalize_words, question_tokens)
+from qcmgen.pictos.resolve import _load_cache
+from qcmgen.qcm import PEOPLE
+
+VERBS = ["mange", "regarde", "voit", "porte", "cherche", "attrape", "aime", "suit", "dessine", "prend",
+         "lave", "pousse", "tire", "cache", "trouve", "donne", "achète", "range", "casse", "répare"]
+ADJECTIVES = ["petit", "grand", "gros", "joli", "vieux", "jeune", "noir", "blanc", "rouge", "bleu"]
+PLACES = ["dans le jardin", "à l'école", "dans la cuisine", "au parc", "près de la maison", "le matin",
+          "dans la forêt", "sur la table", "à la plage", "ce soir"]
+
+
+def render(parts) -> tuple:
+    verb, subj, obj, adj, place, det, qtype = parts
+    subj_text = f"{det} {adj + ' ' if adj else ''}{subj}" if subj not in PEOPLE else subj
+    tail = f" {place}" if place else ""
+    if qtype == "object":
+        return f"Que {verb} {subj_text}{tail} ?", obj
+    return f"Qui {verb} {det} {adj + ' ' if adj else ''}{obj}{tail} ?", subj
+
+
+def synthetic_questions(n: int, rng: random.Random, rewritten: float = 0.05):
+    """(question, answer) pairs and {index of a rewritten question: index of its original}."""
+    terms = [t for t in _load_cache("fr") if " " not in t]
+    parts, origin = [], {}
+    for i in range(n):
+        if parts and rng.random() < rewritten:
+            j = rng.randrange(len(parts))
+            verb, subj, obj, adj, place, det, qtype = parts[j]
+            change = rng.randrange(3)
+            if change == 0 and not adj:
+                adj = rng.choice(ADJECTIVES)
+            elif change == 1 and not place:
+                place = rng.choice(PLACES)
+            else:
+                det = "un" if det == "le" else "le"
+            parts.append((verb, subj, obj, adj, place, det, qtype))
+            origin[i] = j
+            continue
+        parts.append((rng.choice(VERBS), rng.choice(terms + PEOPLE), rng.choice(terms), None,
+                      rng.choice(PLACES) if rng.random() < 0.5 else None, "le",
+                      rng.choice(["object", "subject"])))
+    return [render(p) for p in parts], origin
+
+
+def exhaustive_duplicates(token_sets, answers, threshold: float):
+    """Indices that have an earlier question with exact Jaccard >= threshold (same normalized answer only)."""
+    by_answer = {}
+    for i, a in enumerate(answers):
+        by_answer.setdefault(" ".join(normalize_words(a)), []).append(i)
+    dups = set()
+    for members in by_answer.values():
+        for k, j in enumerate(members):
+            if any(jaccard(token_sets[i], token_sets[j]) >= threshold for i in members[:k]):
+                dups.add(j)
+    return dups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50000,100000,200000")
+    parser.add_argument("--exact", type=int, default=20000, help="questions checked against an exhaustive search")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"threshold {args.threshold}, bands x rows {NearDuplicateIndex(args.threshold).bands} x "
+          f"{NearDuplicateIndex(args.threshold).rows}")
+    print(f"{'questions':>10} {'signatures':>12} {'batch':>10} {'incremental':>13} {'index MB':>9} "
+          f"{'flagged':>8} {'(incr.)':>8} {'rewritten flagged':>18}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        qa, origin = synthetic_questions(n, random.Random(args.seed))
+        token_sets = [question_tokens(q, a) for q, a in qa]
+
+        t0 = time.perf_counter()
+        sigs = get_minhasher().signatures(token_sets)
+        sig_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        dup = duplicate_of(sigs, args.threshold, token_sets)
+        batch_s = time.perf_counter() - t0
+
+        index = NearDuplicateIndex(args.threshold)
+        flagged_incremental = 0
+        t0 = time.perf_counter()
+        for k in range(n):
+            candidates = index.query(sigs[k], args.threshold - ESTIMATE_MARGIN)
+            if any(jaccard(token_sets[c], token_sets[k]) >= args.threshold for c, _ in candidates):
+                flagged_incremental += 1
+            else:
+                index.insert(k, sigs[k])
+        incremental_s = time.perf_counter() - t0
+
+        rewritten = np.mean([dup[k] >= 0 for k in origin]) if origin else 1.0
+        print(f"{n:10d} {sig_s / n * 1e6:9.1f} µs {batch_s / n * 1e6:7.1f} µs {incremental_s / n * 1e6:10.1f} µs "
+              f"{index.nbytes / 1e6:9.1f} {int((dup >= 0).sum()):8d} {flagged_incremental:8d} {rewritten:18.1%}")
+
+    if args.exact:
+        qa, _ = synthetic_questions(args.exact, random.Random(args.seed))
+        token_sets = [question_tokens(q, a) for q, a in qa]
+        expected = exhaustive_duplicates(token_sets, [a for _, a in qa], args.threshold)
+        dup = duplicate_of(get_minhasher().signatures(token_sets), args.threshold, token_sets)
+        found = set(np.flatnonzero(dup >= 0).tolist())
+        print(f"\nexhaustive search on {args.exact} questions: {len(expected)} have an earlier near-duplicate; "
+              f"found {len(found & expected)} ({len(found & expected) / max(len(expected), 1):.1%}), "
+              f"{len(found - expected)} flagged below the exact threshold")
+        for k in sorted(expected - found)[:3]:
+            print(f"  missed: {qa[k][0]} -> {qa[k][1]}")
+        for k in sorted(found - expected)[:3]:
+            print(f"  extra:  {qa[k][0]} -> {qa[k][1]}  (kept: {qa[dup[k]][0]} -> {qa[dup[k]][1]})")
+
+
+if __name__ == "__main__":
+    main()
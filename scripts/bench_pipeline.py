@@ -0,0 +1,237 @@
+"""
+Benchmark suite of the text -> PDF pipeline, against the local ARASAAC stand-in.
+
+Times each stage on the fixed French corpus of benchmarks/corpus_fr.json:
+    extract_facts, generate_payloads, generate_qcms (batched, with pictos),
+    build_choices_with_arasaac, resolve_term_to_picto(_strict),
+    sample_cached_by_tag, get_picto_with_variants, build_pdf
+for pictogram caches of 1k / 10k / 100k entries: the real cache entries plus
+synthetic ones (see bench_cache_snapshot.synthetic_cache). Each cache size runs
+in a fresh process with an isolated data dir (QCMGEN_DATA_DIR) and ARASAAC
+pointed at scripts/fake_arasaac_server.py, so nothing leaves the machine
+(--fixtures DIR: the stand-in replays responses recorded from the real API).
+
+Each benchmark goes `--repeat` times over its inputs; per call we keep the
+first round (cold caches) and the median / min of the rounds.
+
+With --save the run is appended to benchmarks/results.jsonl (one line per cache
+size, with the git commit); --compare checks the run against the last saved run
+of another commit and exits with status 1 on a regression. A run from a tree
+with uncommitted changes does not measure its commit: --save refuses it unless
+--allow-dirty (it is then flagged "dirty" and never used as a baseline).
+
+Usage: python scripts/bench_pipeline.py [--sizes 1000,10000,100000] [--repeat 3] [--fixtures DIR]
+                                       [--save [--allow-dirty]] [--compare] [--threshold 0.25]
+"""
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "scripts"))
+sys.path.insert(0, str(project_root / "app"))
+
+CORPUS_FILE = project_root / "benchmarks" / "corpus_fr.json"
+RESULTS_FILE = project_root / "benchmarks" / "results.jsonl"
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def load_corpus():
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_cache(size: int, static_base: str):
+    """Real cache entries + synthetic filler up to `size` terms, image URLs on the stand-in server."""
+    from bench_cache_snapshot import synthetic_cache
+    from qcmgen.pictos.cache import PictoCacheStore, cache_path
+
+    flat = {t: dict(hit) for t, hit in PictoCacheStore(cache_path("fr")).data().items()}
+    offset = 1 + max((int(h["picto_id"]) for h in flat.values()), default=0)
+    for term, hit in synthetic_cache(max(0, size - len(flat))).items():
+        flat[term] = dict(hit, picto_id=hit["picto_id"] + offset)
+    for hit in flat.values():
+        hit["url"] = f"{static_base}/pictograms/{hit['picto_id']}/{hit['picto_id']}_500.png"
+    return flat
+
+
+def timed(fn, inputs, repeat: int):
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for x in inputs:
+            fn(x)
+        rounds.append((time.perf_counter() - t0) / len(inputs) * 1000)
+    return {
+        "calls": len(inputs),
+        "first_ms": rounds[0],
+        "median_ms": statistics.median(rounds[1:] or rounds),
+        "min_ms": min(rounds),
+    }
+
+
+def child(size: int, repeat: int) -> None:
+    # importés ici: QCMGEN_DATA_DIR et ARASAAC_* sont posés par le parent
+    from picto_helpers import get_picto_with_variants, resolve_choice_picto
+    from qcmgen.nlp import Fact, extract_facts
+    from qcmgen.pdf import build_pdf
+    from qcmgen.pictos.cache import get_cache_store
+    from qcmgen.pictos.resolve import resolve_term_to_picto, resolve_term_to_picto_strict, sample_cached_by_tag
+    from qcmgen.qcm import build_choices_with_arasaac, generate_payloads, generate_qcms_for_facts
+
+    random.seed(0)
+    corpus = load_corpus()
+    facts = [Fact(**dict(f, adj_pairs=[tuple(p) for p in f["adj_pairs"]])) for f in corpus["facts"]]
+    terms, tags = corpus["terms"], corpus["tags"]
+    n_cached = len(get_cache_store("fr").data())
+
+    results = {}
+    try:
+        results["extract_facts"] = timed(extract_facts, corpus["texts"], repeat)
+    except OSError as e:  # modèle spaCy absent
+        results["extract_facts"] = {"skipped": str(e).splitlines()[0]}
+    results["generate_payloads"] = timed(generate_payloads, facts, repeat)
+    results["resolve_term_to_picto"] = timed(resolve_term_to_picto, terms, repeat)
+    results["resolve_term_to_picto_strict"] = timed(resolve_term_to_picto_strict, terms, repeat)
+    results["get_picto_with_variants"] = timed(get_picto_with_variants, terms, repeat)
+    results["sample_cached_by_tag"] = timed(sample_cached_by_tag, tags, repeat)
+    results["build_choices_with_arasaac"] = timed(build_choices_with_arasaac, terms, repeat)
+
+    generate = lambda fs: generate_qcms_for_facts(fs, require_pictos=True, picto_resolver=resolve_choice_picto)
+    results["generate_qcms"] = timed(generate, [facts], repeat)
+    qcms = generate(facts)
+    results["build_pdf"] = timed(lambda qs: build_pdf(qs, {}), [qcms], repeat)
+    results["build_pdf"]["questions"] = len(qcms)
+
+    print(RESULT_PREFIX + json.dumps({"size": size, "cached_terms": n_cached, "results": results}))
+
+
+def run_child(size: int, repeat: int, env: dict):
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", str(size), "--repeat", str(repeat)],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise RuntimeError(f"benchmark process for {size} terms failed (exit {proc.returncode})")
+    line = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_PREFIX)][-1]
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+def git_revision():
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=project_root, capture_output=True, text=True)
+    rev = git("rev-parse", "--short", "HEAD")
+    if rev.returncode != 0:
+        return None, False
+    # fichiers non suivis compris; le fichier de résultats lui-même ne compte pas
+    status = git("status", "--porcelain", "--", ".", f":(exclude){RESULTS_FILE.relative_to(project_root)}")
+    return rev.stdout.strip(), bool(status.stdout.strip())
+
+
+def load_saved():
+    if not RESULTS_FILE.exists():
+        return []
+    with open(RESULTS_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(runs, saved, commit: str, threshold: float, min_delta_ms: float) -> bool:
+    """Print current vs. last clean saved run of another commit; True when some benchmark regressed."""
+    regressed = False
+    for run in runs:
+        baseline = next((r for r in reversed(saved)
+                         if r["size"] == run["size"] and r.get("commit") != commit and not r.get("dirty")), None)
+        if baseline is None:
+            print(f"[{run['size']}] no saved run of another commit to compare with")
+            continue
+        print(f"[{run['size']}] vs {baseline['commit']} ({baseline['date']})")
+        for name, cur in run["results"].items():
+            base = baseline["results"].get(name, {})
+            if "median_ms" not in cur or "median_ms" not in base:
+                continue
+            ratio = cur["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+            bad = ratio > 1 + threshold and cur["median_ms"] - base["median_ms"] > min_delta_ms
+            regressed |= bad
+            print(f"  {name:30s} {base['median_ms']:10.3f} -> {cur['median_ms']:10.3f} ms  x{ratio:5.2f}{'  REGRESSION' if bad else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="cache sizes (number of terms), comma separated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", action="store_true", help=f"append the run to {RESULTS_FILE.relative_to(project_root)}")
+    parser.add_argument("--allow-dirty", action="store_true", help="with --save, also save a run with uncommitted changes")
+    parser.add_argument("--compare", action="store_true", help="compare with the last saved run of another commit")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore slowdowns smaller than this (timer noise)")
+    parser.add_argument("--fixtures", metavar="DIR", help="replay ARASAAC responses recorded with fake_arasaac_server.py --record DIR")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child, args.repeat)
+        return
+
+    from fake_arasaac_server import make_server
+
+    # sans fixtures, index de recherche construit depuis le vrai cache (data/arasaac_cache_fr.json)
+    server, fake = make_server(port=0, replay=args.fixtures)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    commit, dirty = git_revision()
+    if args.save and dirty and not args.allow_dirty:
+        sys.exit(f"Uncommitted changes: the run would not measure {commit}. Commit first, or pass --allow-dirty.")
+    date = datetime.datetime.now().isoformat(timespec="seconds")
+    runs = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        with tempfile.TemporaryDirectory() as tmp:
+            from qcmgen.pictos.cache import PictoCacheStore
+
+            PictoCacheStore(str(Path(tmp) / "arasaac_cache_fr.json")).save(build_cache(size, base))
+            env = dict(os.environ, QCMGEN_DATA_DIR=tmp, ARASAAC_API_BASE=f"{base}/v1", ARASAAC_STATIC_BASE=base)
+            requests_before = fake.requests
+            run = run_child(size, args.repeat, env)
+
+        run.update(commit=commit, dirty=dirty, date=date, repeat=args.repeat,
+                   python=platform.python_version(), machine=platform.machine(),
+                   arasaac_requests=fake.requests - requests_before, arasaac=fake.mode)
+        runs.append(run)
+
+        print(f"[{size}] {run['cached_terms']} cached terms, {run['arasaac_requests']} requests to the stand-in")
+        for name, r in run["results"].items():
+            if "skipped" in r:
+                print(f"  {name:30s} skipped: {r['skipped']}")
+            else:
+                print(f"  {name:30s} first {r['first_ms']:10.3f} ms | median {r['median_ms']:10.3f} ms | min {r['min_ms']:10.3f} ms  ({r['calls']} inputs)")
+
+    regressed = compare(runs, load_saved(), commit, args.threshold, args.min_delta_ms) if args.compare else False
+
+    if args.save:
+        if dirty:
+            print(f"Warning: uncommitted changes, the run is saved as {commit} (dirty, never used as a baseline)")
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            for run in runs:
+                f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        print(f"Saved {len(runs)} runs to {RESULTS_FILE}")
+
+    server.shutdown()
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -60,14 +60,11 @@ CATEGORIES = {
     ],
 }
 
-from qcmgen.pictos.resolve import resolve_term_to_picto_strict
+from qcmgen.pictos.resolve import resolve_term_to_picto_strict, _load_cache
 from tqdm import tqdm
-import json
-
-arasaac_cache_path = project_root / "data" / "arasaac_cache_fr.json"
 
-with open(arasaac_cache_path) as f:
-    cached_pictos = json.load(f)
+# vue terme -> entrée du cache (quel que soit le format du fichier)
+cached_pictos = _load_cache("fr")
 
 print('Caching pictograms for distractor categories...')
 for category in tqdm(CATEGORIES):
@@ -0,0 +1,31 @@
+"""
+Compile the JSON pictogram cache into its binary snapshot (data/arasaac_cache_{lang}.bin).
+Once the snapshot exists, every process opens it with mmap instead of parsing
+the JSON, and each cache save keeps it up to date.
+
+Usage: python scripts/build_cache_snapshot.py [--lang fr]
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.cache import get_cache_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lang", default="fr")
+    args = parser.parse_args()
+
+    store = get_cache_store(args.lang)
+    n = store.build_snapshot()
+    size = os.path.getsize(store.snapshot_path)
+    print(f"Wrote {store.snapshot_path}: {n} terms, {size / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Check the ARASAAC circuit breaker against the local stand-in server.
+
+1. healthy server: a cached term resolves through the API
+2. slow server (latency > client timeout): the breaker opens after a few
+   timeouts, the remaining lookups fail fast and resolution is cache-only
+3. server back: after the cool-down a trial call closes the breaker
+
+Usage: python scripts/check_arasaac_breaker.py
+"""
+from pathlib import Path
+import os
+import socket
+import sys
+import threading
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "scripts"))
+
+TIMEOUT_S = 0.5
+COOLDOWN_S = 2.0
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+
+# avant tout import de qcmgen: les URLs et le breaker sont lus à l'import
+os.environ["ARASAAC_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+os.environ["ARASAAC_TIMEOUT_S"] = str(TIMEOUT_S)
+os.environ["ARASAAC_BREAKER_COOLDOWN_S"] = str(COOLDOWN_S)
+
+from fake_arasaac_server import make_server
+from qcmgen.pictos.arasaac_client import get_breaker, is_cache_only
+from qcmgen.pictos.resolve import resolve_term_to_picto, resolve_term_to_picto_strict
+
+
+def check(label: str, ok: bool) -> None:
+    print(f"[{'OK' if ok else 'FAIL'}] {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    server, fake = make_server(port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    breaker = get_breaker()
+
+    r = resolve_term_to_picto_strict("chat", add_to_cache=False)
+    check(f"healthy server: strict 'chat' -> {r and r.picto_id} ({r and r.source})", r is not None and r.source == "arasaac")
+    check("breaker closed", breaker.state == "closed")
+
+    fake.behaviour["latency"] = 3.0
+    terms = [f"terme inconnu {i}" for i in range(30)]
+    t0 = time.perf_counter()
+    for t in terms:
+        resolve_term_to_picto(t)  # jamais en cache: irait au réseau
+    elapsed = time.perf_counter() - t0
+    budget = breaker.failure_threshold * TIMEOUT_S + 1.0
+    check(f"slow server: {len(terms)} misses in {elapsed:.2f}s (budget {budget:.1f}s, {len(terms) * TIMEOUT_S:.0f}s without breaker)",
+          elapsed < budget)
+    check(f"breaker {breaker.state}, cache-only mode", is_cache_only())
+
+    t0 = time.perf_counter()
+    r = resolve_term_to_picto_strict("chat", add_to_cache=False)
+    check(f"cache-only strict 'chat' -> {r and r.picto_id} ({r and r.source}) in {(time.perf_counter() - t0) * 1000:.1f} ms",
+          r is not None and r.source == "cache")
+
+    fake.behaviour["latency"] = 0.0
+    time.sleep(COOLDOWN_S + 0.1)
+    check(f"after cool-down: {breaker.state}", breaker.state == "half-open")
+    r = resolve_term_to_picto_strict("chat", add_to_cache=False)
+    check(f"trial call -> {r and r.source}, breaker {breaker.state}", r is not None and r.source == "arasaac" and breaker.state == "closed")
+
+    server.shutdown()
+    print(f"{fake.requests} requests served by the fake server")
+
+
+if __name__ == "__main__":
+    main()
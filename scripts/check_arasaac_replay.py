@@ -0,0 +1,95 @@
+"""
+Check record / replay of the ARASAAC stand-in.
+
+An "upstream" stand-in (cache index) plays the real ARASAAC, so the check needs
+no network:
+1. record: a second stand-in proxies to the upstream and writes the fixtures;
+   searches and images go through the client as usual
+2. replay: with the upstream stopped, a stand-in serving the fixtures gives the
+   same answers; a term that was never recorded is a 404 (a miss), not a call out
+3. rate limit: above `rate_limit` requests per second the replay answers 429
+
+Usage: python scripts/check_arasaac_replay.py
+"""
+from pathlib import Path
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "scripts"))
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+
+# avant tout import de qcmgen: les URLs sont lues à l'import
+os.environ["ARASAAC_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+os.environ["ARASAAC_STATIC_BASE"] = f"http://127.0.0.1:{port}"
+
+import requests
+
+from fake_arasaac_server import make_server
+from qcmgen.pictos.arasaac_client import ArasaacClient, get_breaker, static_url
+
+TERMS = ["chat", "chien", "pomme", "velo", "licorne"]
+
+
+def check(label: str, ok: bool) -> None:
+    print(f"[{'OK' if ok else 'FAIL'}] {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def serve(**options):
+    server, fake = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+def snapshot(client: ArasaacClient):
+    """Search results (ids) and the first image of every term."""
+    found = {}
+    for term in TERMS:
+        hits = client.search(term)
+        ids = [h["_id"] for h in hits]
+        image = requests.get(static_url(client.pictogram_url(ids[0])), timeout=5).content if ids else None
+        found[term] = (ids, image)
+    return found
+
+
+def main():
+    upstream, _ = serve(port=0)
+    upstream_base = f"http://127.0.0.1:{upstream.server_address[1]}"
+    client = ArasaacClient()
+
+    with tempfile.TemporaryDirectory() as fixtures:
+        recorder, rec = serve(port=port, record=fixtures, upstream_api=f"{upstream_base}/v1", upstream_static=upstream_base)
+        recorded = snapshot(client)
+        check(f"record: {rec.recorded} responses written", rec.recorded >= len(TERMS))
+        check("record: unknown term recorded as a 404", (Path(fixtures) / "search" / "fr" / "licorne.json").exists())
+        recorder.shutdown()
+        recorder.server_close()
+        upstream.shutdown()
+        upstream.server_close()
+
+        replayer, rep = serve(port=port, replay=fixtures)
+        check("replay: same answers with the upstream stopped", snapshot(client) == recorded)
+        check("replay: no miss for recorded requests", rep.misses == 0)
+        check("replay: unrecorded term is a miss", client.search("girafe") == [] and rep.misses == 1)
+        url = client.pictogram_url(7114)
+        check("stored image URL stays on the public CDN", url.startswith("https://static.arasaac.org/")
+              and static_url(url).startswith(f"http://127.0.0.1:{port}/"))
+
+        get_breaker().reset()
+        rep.behaviour["rate_limit"] = 5
+        codes = [requests.get(f"http://127.0.0.1:{port}/v1/pictograms/fr/search/chat", timeout=5).status_code for _ in range(10)]
+        check(f"rate limit 5/s: {codes.count(429)} of 10 requests answered 429", codes.count(200) == 5 and codes.count(429) == 5)
+        replayer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Check the end-to-end generation budget against a slow ARASAAC stand-in.
+
+Every ARASAAC search takes --latency seconds (the circuit breaker is disabled
+so that only the deadline bounds the run). Generation must return within the
+budget: lookups started after it are answered from the local cache, and the
+stages that were cut are reported.
+
+Usage: python scripts/check_generation_budget.py [--budget 2.5] [--latency 1.0]
+"""
+from pathlib import Path
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "scripts"))
+
+with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+
+# avant tout import de qcmgen: les URLs et le breaker sont lus à l'import
+os.environ["ARASAAC_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+os.environ["ARASAAC_BREAKER_FAILURES"] = "1000000"
+
+from fake_arasaac_server import make_server
+from qcmgen.deadline import Deadline
+from qcmgen.nlp import Fact
+from qcmgen.pictos.resolve import resolve_term_to_picto_strict
+from qcmgen.qcm import ChoicePicto, generate_qcms_for_facts
+
+FACTS = [
+    Fact("Paul mange la souris.", "Paul", "manger", "mange", "la souris", "souris", [("chat", "gris", "Sing")]),
+    Fact("Le chat voit le lion.", "Le chat", "voir", "voit", "le lion", "lion", [("vache", "blanche", "Sing")]),
+    Fact("Marie boit du lait.", "Marie", "boire", "boit", "du lait", "lait", [("pomme", "rouge", "Sing")]),
+    Fact("Le chien mange le poisson.", "Le chien", "manger", "mange", "le poisson", "poisson", [("cheval", "noir", "Sing")]),
+]
+
+
+def resolver(term: str):
+    # comme l'app: résolution stricte (réseau d'abord, cache local en mode dégradé)
+    for prefix in ("le ", "la ", "du "):
+        if term.lower().startswith(prefix):
+            term = term[len(prefix):]
+    r = resolve_term_to_picto_strict(term, add_to_cache=False)
+    return ChoicePicto(picto_id=r.picto_id, url=r.url, variant=r.term) if r else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=2.5)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server, fake = make_server(port=port, latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    deadline = Deadline(args.budget)
+    t0 = time.perf_counter()
+    qcms = generate_qcms_for_facts(FACTS, require_pictos=True, picto_resolver=resolver, deadline=deadline)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{len(qcms)} QCMs in {elapsed:.2f}s (budget {args.budget}s), {fake.requests} ARASAAC requests, cut: {deadline.cut}")
+    for q in qcms:
+        print(f"  {q.question} {q.choices}")
+
+    ok = elapsed < args.budget + 0.5 and len(qcms) > 0
+    server.shutdown()
+    print("OK" if ok else "FAIL")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
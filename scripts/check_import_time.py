@@ -0,0 +1,103 @@
+"""
+Check the import-time budget of the library and of the app.
+
+Each entry point is imported in a fresh interpreter under `python -X importtime`.
+Its cost is the cumulative time of the modules it adds to a bare interpreter
+startup (best of --runs). The "app" entry imports what app/app.py imports at
+module level (read from its source), i.e. what a new Streamlit worker pays
+before the first line of the page runs.
+
+The check fails when an entry point goes over its budget (BUDGETS, scaled by
+--scale on slow machines), or when it imports one of the heavy dependencies
+that are only loaded on first use (HEAVY: spaCy, openai, fpdf, PIL, ...).
+
+Usage: python scripts/check_import_time.py [--runs 5] [--scale 1.0] [--show N]
+"""
+from pathlib import Path
+import argparse
+import ast
+import subprocess
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+
+# chargés au premier usage seulement (modèle spaCy, appel LLM, export PDF, appel ARASAAC, vecteurs)
+HEAVY = ["spacy", "openai", "dotenv", "fpdf", "PIL", "requests", "numpy"]
+
+# point d'entrée -> (imports, budget en ms); à tenir à jour avec le README (Startup time)
+BUDGETS = {
+    "qcmgen.pipeline": ("import qcmgen.pipeline", 150),
+    "qcmgen.pictos.resolve": ("import qcmgen.pictos.resolve", 100),
+    "qcmgen.pdf": ("import qcmgen.pdf", 100),
+    "qcmgen.llm": ("import qcmgen.llm", 150),
+    "qcmgen.text_pool": ("import qcmgen.text_pool", 100),
+    "app": (None, 1000),
+}
+
+
+def app_imports() -> str:
+    """The module-level imports of app/app.py."""
+    tree = ast.parse((project_root / "app" / "app.py").read_text(encoding="utf-8"))
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_time(code: str):
+    """(top-level import times in µs by module, self times in µs by module, sys.modules) of `code`."""
+    # -E: sans PYTHONPATH (un sitecustomize de test chargerait spaCy au démarrage)
+    prelude = f"import sys; sys.path[:0] = [{str(project_root / 'src')!r}, {str(project_root / 'app')!r}]\n"
+    epilogue = "\nimport sys; print(' '.join(sys.modules))"
+    proc = subprocess.run([sys.executable, "-E", "-X", "importtime", "-c", prelude + code + epilogue],
+                          capture_output=True, text=True, cwd=project_root)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise RuntimeError(f"import failed: {code!r}")
+
+    top, own = {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        own[module] = int(self_us)
+        if not name.startswith("  "):  # import de premier niveau (pas un sous-import)
+            top[module] = int(cumulative_us)
+    return top, own, set(proc.stdout.split())
+
+
+def measure(code: str, baseline, runs: int):
+    """Best (ms) over `runs` fresh interpreters, the slowest modules of that run, the modules loaded."""
+    best = None
+    for _ in range(runs):
+        top, own, modules = import_time(code)
+        ms = sum(us for module, us in top.items() if module not in baseline) / 1000
+        if best is None or ms < best[0]:
+            slowest = sorted(((us, m) for m, us in own.items() if m not in baseline), reverse=True)
+            best = (ms, slowest, modules)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point (best one counts)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    parser.add_argument("--show", type=int, default=0, help="slowest modules printed per entry point (8 when it fails)")
+    args = parser.parse_args()
+
+    baseline = set(import_time("pass")[0])
+    failed = False
+    for entry, (code, budget_ms) in BUDGETS.items():
+        ms, slowest, modules = measure(code or app_imports(), baseline, args.runs)
+        budget = budget_ms * args.scale
+        heavy = [m for m in HEAVY if m in modules]
+        ok = ms <= budget and not heavy
+        failed |= not ok
+        print(f"[{'OK' if ok else 'FAIL'}] {entry:24s} {ms:8.1f} ms (budget {budget:.0f} ms)"
+              + (f"  imports {', '.join(heavy)} at startup" if heavy else ""))
+        for us, module in slowest[:args.show or (0 if ok else 8)]:
+            print(f"    {us / 1000:7.1f} ms  {module}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
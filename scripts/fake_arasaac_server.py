@@ -0,0 +1,312 @@
+"""
+Local stand-in for the ARASAAC API and image CDN, with latency, error and rate-limit injection.
+
+Three sources for the responses:
+    - default: search results built from the local pictogram cache (same fields
+      as the real API: _id, keywords, tags, categories), images are a placeholder PNG;
+    - --record DIR: forwards every request to the real api/static.arasaac.org and
+      stores the answer in the fixture directory DIR;
+    - --replay DIR: answers from the fixtures of DIR only (no network; a request
+      that was never recorded gets a 404 and is counted in `misses`).
+
+Fixture layout (one file per request, easy to diff and to commit):
+
+    DIR/search/{lang}/{term}.json     {"status": 200, "body": [...]}
+    DIR/pictograms/{file}.png         raw image bytes
+
+Point the app or the scripts at it with:
+
+    ARASAAC_API_BASE=http://127.0.0.1:8765/v1 ARASAAC_STATIC_BASE=http://127.0.0.1:8765 streamlit run app/app.py
+
+Behaviour can be changed while running:
+    curl "http://127.0.0.1:8765/_control?latency=6&error_rate=0.5&rate_limit=20"
+
+Usage: python scripts/fake_arasaac_server.py [--port 8765] [--record DIR | --replay DIR]
+                                             [--latency 0] [--jitter 0] [--error-rate 0] [--rate-limit 0] [--down]
+"""
+from pathlib import Path
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import requests
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.cache import PictoCacheStore, cache_path
+from qcmgen.pictos.resolve import normalize_term
+
+
+def _placeholder_png() -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (230, 230, 230)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+UPSTREAM_API = "https://api.arasaac.org/v1"
+UPSTREAM_STATIC = "https://static.arasaac.org"
+
+
+class FixtureStore:
+    """Recorded responses, one file per search (per language and term) or image."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _search_path(self, lang: str, term: str) -> Path:
+        return self.root / "search" / lang / (quote(term, safe="") + ".json")
+
+    def _image_path(self, name: str) -> Path:
+        return self.root / "pictograms" / quote(name, safe="")
+
+    def get_search(self, lang: str, term: str) -> Optional[Tuple[int, bytes]]:
+        try:
+            with open(self._search_path(lang, term), encoding="utf-8") as f:
+                rec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return rec["status"], json.dumps(rec["body"], ensure_ascii=False).encode("utf-8")
+
+    def put_search(self, lang: str, term: str, status: int, body: bytes) -> None:
+        path = self._search_path(lang, term)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            parsed = json.loads(body.decode("utf-8") or "[]")
+        except ValueError:
+            parsed = []
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"status": status, "body": parsed}, f, ensure_ascii=False, indent=1)
+
+    def get_image(self, name: str) -> Optional[bytes]:
+        try:
+            return self._image_path(name).read_bytes()
+        except OSError:
+            return None
+
+    def put_image(self, name: str, data: bytes) -> None:
+        path = self._image_path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+class FakeArasaac:
+    """
+    Answers of the stand-in (cache index, recording proxy or fixture replay),
+    plus the injected behaviour and request counters.
+    """
+
+    def __init__(self, cache_file: str = None, record: Optional[str] = None, replay: Optional[str] = None,
+                 upstream_api: str = UPSTREAM_API, upstream_static: str = UPSTREAM_STATIC,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: float = 0.0, down: bool = False):
+        if record and replay:
+            raise ValueError("record and replay are exclusive")
+        self.behaviour = {"latency": latency, "jitter": jitter, "error_rate": error_rate,
+                          "rate_limit": rate_limit, "down": down}
+        self.mode = "record" if record else "replay" if replay else "cache"
+        self.fixtures = FixtureStore(record or replay) if self.mode != "cache" else None
+        self.upstream_api = upstream_api.rstrip("/")
+        self.upstream_static = upstream_static.rstrip("/")
+        self.requests = 0
+        self.misses = 0  # replay: requêtes jamais enregistrées
+        self.recorded = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._recent = deque()  # horodatages de la dernière seconde (rate limit)
+        self._png = None
+
+        self._by_keyword = {}
+        if self.mode == "cache":
+            self._index(cache_file or cache_path("fr"))
+
+    def _index(self, cache_file: str) -> None:
+        for term_norm, hit in PictoCacheStore(cache_file).data().items():
+            record = {
+                "_id": int(hit["picto_id"]),
+                "keywords": [{"keyword": hit.get("keyword") or term_norm, "plural": hit.get("plural")}],
+                "tags": hit.get("tags") or [],
+                "categories": hit.get("categories") or [],
+            }
+            for kw in {term_norm, normalize_term(hit.get("keyword") or ""), normalize_term(hit.get("plural") or "")}:
+                if kw:
+                    self._by_keyword.setdefault(kw, {})[record["_id"]] = record
+
+    def search(self, term: str):
+        return list(self._by_keyword.get(normalize_term(term), {}).values())
+
+    def png(self) -> bytes:
+        if self._png is None:
+            self._png = _placeholder_png()
+        return self._png
+
+    def over_rate_limit(self) -> bool:
+        """True when this request goes over `rate_limit` requests per second (0: no limit)."""
+        limit = self.behaviour["rate_limit"]
+        if not limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= limit:
+                self.rate_limited += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    def _upstream(self, url: str) -> Tuple[int, bytes]:
+        resp = requests.get(url, timeout=10)
+        return resp.status_code, resp.content
+
+    def answer_search(self, lang: str, term: str) -> Tuple[int, bytes]:
+        if self.mode == "cache":
+            results = self.search(term)
+            if not results:
+                return 404, b"[]"
+            return 200, json.dumps(results, ensure_ascii=False).encode("utf-8")
+
+        found = self.fixtures.get_search(lang, term)
+        if found is not None or self.mode == "replay":
+            if found is None:
+                with self._lock:
+                    self.misses += 1
+                return 404, b"[]"
+            return found
+
+        status, body = self._upstream(f"{self.upstream_api}/pictograms/{lang}/search/{quote(term, safe='')}")
+        if status in (200, 404):  # réponses définitives seulement, pas les pannes
+            self.fixtures.put_search(lang, term, status, body)
+            with self._lock:
+                self.recorded += 1
+        return status, body
+
+    def answer_image(self, picto_id: str, name: str) -> Tuple[int, bytes]:
+        if self.mode == "cache":
+            return 200, self.png()
+
+        data = self.fixtures.get_image(name)
+        if data is not None or self.mode == "replay":
+            if data is None:
+                with self._lock:
+                    self.misses += 1
+                return 404, b""
+            return 200, data
+
+        status, data = self._upstream(f"{self.upstream_static}/pictograms/{picto_id}/{name}")
+        if status == 200:
+            self.fixtures.put_image(name, data)
+            with self._lock:
+                self.recorded += 1
+        return status, data
+
+
+def make_handler(fake: FakeArasaac):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass  # pas de log par requête
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: Optional[dict] = None):
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # le client a abandonné (timeout), c'est le cas testé
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [unquote(p) for p in url.path.strip("/").split("/")]
+
+            if parts == ["_control"]:
+                for k, v in parse_qs(url.query).items():
+                    if k in fake.behaviour:
+                        fake.behaviour[k] = v[0].lower() in ("1", "true") if k == "down" else float(v[0])
+                stats = {"mode": fake.mode, "requests": fake.requests, "misses": fake.misses,
+                         "recorded": fake.recorded, "rate_limited": fake.rate_limited}
+                return self._send(200, json.dumps(dict(fake.behaviour, **stats)).encode())
+
+            with fake._lock:
+                fake.requests += 1
+            b = fake.behaviour
+            if b["down"]:
+                self.close_connection = True
+                return  # connexion fermée sans réponse
+            if fake.over_rate_limit():
+                return self._send(429, b'{"error": "rate limited"}', headers={"Retry-After": "1"})
+            delay = b["latency"] + random.uniform(0, b["jitter"])
+            if delay > 0:
+                time.sleep(delay)
+            if random.random() < b["error_rate"]:
+                return self._send(503, b'{"error": "injected"}')
+
+            try:
+                # /v1/pictograms/{lang}/search/{term}
+                if len(parts) == 5 and parts[0] == "v1" and parts[1] == "pictograms" and parts[3] == "search":
+                    status, body = fake.answer_search(parts[2], parts[4])
+                    return self._send(status, body)
+
+                # /pictograms/{id}/{id}_500.png
+                if len(parts) == 3 and parts[0] == "pictograms" and parts[2].endswith(".png"):
+                    status, body = fake.answer_image(parts[1], parts[2])
+                    return self._send(status, body, "image/png")
+            except requests.RequestException as e:  # enregistrement: ARASAAC injoignable
+                return self._send(502, json.dumps({"error": str(e)}).encode())
+
+            return self._send(404, b"{}")
+
+    return Handler
+
+
+def make_server(port: int = 8765, cache_file: str = None, **options):
+    """
+    Build the server (not started): returns (server, fake). Port 0 picks a free port.
+    options: record / replay fixture directory, upstream URLs and behaviour (see FakeArasaac).
+    """
+    fake = FakeArasaac(cache_file, **options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--lang", default="fr")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--record", metavar="DIR", help="proxy to the real ARASAAC and store the answers in DIR")
+    source.add_argument("--replay", metavar="DIR", help="answer from the fixtures recorded in DIR only")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requests per second above which HTTP 429 is returned")
+    parser.add_argument("--down", action="store_true", help="close every connection without answering")
+    args = parser.parse_args()
+
+    server, fake = make_server(args.port, cache_path(args.lang), record=args.record, replay=args.replay,
+                               latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               rate_limit=args.rate_limit, down=args.down)
+    source = f"{len(fake._by_keyword)} keywords" if fake.mode == "cache" else f"{fake.mode} {fake.fixtures.root}"
+    print(f"Fake ARASAAC on http://127.0.0.1:{args.port} ({source}), behaviour {fake.behaviour}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    if fake.mode != "cache":
+        print(f"{fake.requests} requests, {fake.recorded} recorded, {fake.misses} not in the fixtures")
+
+if __name__ == "__main__":
+    main()
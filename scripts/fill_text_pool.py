@@ -0,0 +1,40 @@
+"""
+Pre-generate LLM texts into the local text pool (data/text_pool.json), so that
+"Générer le texte" is served from the pool instead of calling OpenAI.
+
+Usage: python scripts/fill_text_pool.py [--complexities 1-5] [--sentences 1-5] [--per-key 8]
+"""
+from pathlib import Path
+import argparse
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.text_pool import get_text_pool, pool_key
+
+
+def parse_range(value: str):
+    lo, _, hi = value.partition("-")
+    return range(int(lo), int(hi or lo) + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--complexities", type=parse_range, default=parse_range("1-5"))
+    parser.add_argument("--sentences", type=parse_range, default=parse_range("1-5"))
+    parser.add_argument("--per-key", type=int, default=8, help="texts to keep per (complexity, sentences)")
+    args = parser.parse_args()
+
+    pool = get_text_pool()
+    total = 0
+    for complexity in args.complexities:
+        for nb in args.sentences:
+            added = pool.refill(complexity, nb, target=args.per_key)
+            total += added
+            print(f"{pool_key(complexity, nb)}: +{added} -> {pool.count(complexity, nb)} texts")
+    print(f"\nDone. Added {total} texts to {pool.path}.")
+
+
+if __name__ == "__main__":
+    main()
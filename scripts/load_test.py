@@ -0,0 +1,351 @@
+"""
+Load test: simulated teachers using the generator at the same time, against
+the local ARASAAC stand-in.
+
+Same code path as app/app.py, minus Streamlit: generations are submitted to
+the process-wide job pool (qcmgen.jobs, QCMGEN_JOB_WORKERS threads) with the
+app's picto resolver, lemma-based attach, distractor engine and time budget,
+complete results are shared between users and stored in the question bank
+(qcmgen.bank, texts already known are served from it), and the PDF goes
+through build_pdf.
+
+Each user loops over: think (--think seconds on average), then one action,
+drawn with the weights of --mix:
+    new     a new text (sentences of benchmarks/corpus_fr.json recombined), generated
+    regen   the user's last text submitted again (shared result when it was complete)
+    answer  answers selected for every question, then scored
+    pdf     PDF of the questions kept (a random subset)
+
+The cache is a copy of data/arasaac_cache_fr.json (or --cache-size terms, see
+bench_pipeline.build_cache) in a temporary QCMGEN_DATA_DIR; the stand-in answers
+from the cache index, or from recorded fixtures with --fixtures DIR, after
+--latency (+ up to --jitter) seconds.
+
+Report: throughput, p50/p95/p99 latency per action (a generation's latency
+includes its wait for a free worker, reported apart as "queue"), errors, peak
+RSS of the process (stand-in included), then the qcmgen.metrics totals of the
+run: time per stage and counters, among them the waits on the cache locks
+(cache_lock_*, cache_file_lock_*).
+
+Usage: python scripts/load_test.py [--users 10] [--duration 60] [--think 2] [--workers 4]
+                                  [--mix new=3,regen=2,answer=4,pdf=1] [--budget 3]
+                                  [--cache-size N] [--fixtures DIR] [--latency 0.05] [--jitter 0.05]
+                                  [--seed 0] [--json FILE]
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "scripts"))
+sys.path.insert(0, str(project_root / "app"))
+
+ACTIONS = ["new", "regen", "answer", "pdf"]
+MAX_SHARED_GENERATIONS = 256  # comme app.py
+
+
+def parse_mix(spec: str):
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {name!r} (expected {', '.join(ACTIONS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return float("nan")
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def rss_kib(field: str) -> int:
+    """VmRSS (current) or VmHWM (peak) of this process, 0 when /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if field == "VmHWM":
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB sous Linux
+        except ImportError:
+            pass
+    return 0
+
+
+class Recorder:
+    """Latencies and errors per action, shared by the user threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.notes = {}
+
+    def add(self, action: str, seconds: float) -> None:
+        with self._lock:
+            self.latencies.setdefault(action, []).append(seconds)
+
+    def error(self, action: str, e: BaseException) -> None:
+        with self._lock:
+            self.errors.setdefault(action, {})
+            key = f"{type(e).__name__}: {e}"[:120]
+            self.errors[action][key] = self.errors[action].get(key, 0) + 1
+
+    def note(self, name: str) -> None:
+        with self._lock:
+            self.notes[name] = self.notes.get(name, 0) + 1
+
+
+class LoadTest:
+    """The shared server side (job pool, shared generations, distractor engine) and the user loop."""
+
+    def __init__(self, sentences, budget_s: float, think: float, weights, recorder: Recorder):
+        from qcmgen.bank import generation_key, get_question_bank
+        from qcmgen.jobs import get_job_runner
+        from qcmgen.pdf import build_pdf
+        from qcmgen.pipeline import generate_worksheet
+        from picto_helpers import attach_pictos, resolve_choice_picto
+
+        self.sentences = sentences
+        self.budget_s = budget_s
+        self.think = think
+        self.weights = weights
+        self.recorder = recorder
+        self.generations = {}  # comme load_shared_generations: {clé: qcms}
+        self.engine = self._load_engine()
+        self._runner = get_job_runner()
+        self._key = generation_key
+        self._bank = get_question_bank()
+        self._build_pdf = build_pdf
+        self._generate = lambda text, job: generate_worksheet(
+            text, picto_resolver=resolve_choice_picto,
+            attach=lambda qcms, progress: attach_pictos(qcms, use_lemmas=True, progress=progress),
+            distractor_engine=self.engine, budget_s=self.budget_s, job=job)
+
+    @staticmethod
+    def _load_engine():
+        """Same engine as the app's load_distractor_engine (None if it cannot be built here)."""
+        from qcmgen.distractors import VectorDistractorEngine, spacy_vector_fn
+        from qcmgen.nlp import get_nlp
+
+        try:
+            categories = json.loads((project_root / "scripts" / "categories.json").read_text())
+            return VectorDistractorEngine.from_categories(categories, spacy_vector_fn(get_nlp()))
+        except Exception as e:
+            print(f"Distractor engine unavailable ({e}), generating without it")
+            return None
+
+    def generate(self, text: str):
+        """submit_generation + collect_generation of the app, waiting for the job."""
+        key = self._key(text)
+        if key in self.generations:
+            self.recorder.note("shared_hits")
+            return list(self.generations[key])
+        banked = self._bank.get_generation(key)
+        if banked is not None:
+            self.recorder.note("bank_hits")
+            self.generations[key] = banked
+            return list(banked)
+
+        submitted = time.perf_counter()
+
+        def work(job):
+            self.recorder.add("queue", time.perf_counter() - submitted)
+            result = self._generate(text, job)
+            if not result.partial and result.qcms:
+                self._bank.put_generation(key, text, result.qcms)
+            return result
+
+        job = self._runner.submit(work, key=key, name="generation")
+        job.wait()
+        if job.status == "failed":
+            raise job.error
+        result = job.result
+        if result.cut:
+            self.recorder.note("budget_cut")
+        elif result.cache_only:
+            self.recorder.note("cache_only")
+        if not result.partial and result.qcms:
+            self.generations[key] = list(result.qcms)
+            while len(self.generations) > MAX_SHARED_GENERATIONS:
+                self.generations.pop(next(iter(self.generations)), None)
+        if not result.qcms:
+            self.recorder.note("no_questions")
+        return result.qcms
+
+    def new_text(self, rng: random.Random) -> str:
+        return " ".join(rng.sample(self.sentences, rng.randint(3, min(6, len(self.sentences)))))
+
+    def user(self, uid: int, seed: int, stop_at: float) -> None:
+        rng = random.Random(seed * 1000 + uid)
+        text, qcms = None, []
+        names, weights = zip(*self.weights.items())
+        time.sleep(rng.uniform(0, self.think))  # arrivées étalées
+        while time.perf_counter() < stop_at:
+            action = rng.choices(names, weights)[0]
+            if action in ("answer", "pdf") and not qcms:
+                action = "new"  # rien à corriger ni à exporter
+            if action == "regen" and text is None:
+                action = "new"
+            started = time.perf_counter()
+            try:
+                if action == "new":
+                    text = self.new_text(rng)
+                    qcms = self.generate(text)
+                elif action == "regen":
+                    qcms = self.generate(text)
+                elif action == "answer":
+                    answers = [rng.randrange(len(q.choices)) for q in qcms]
+                    score = sum(a == q.answer_index for a, q in zip(answers, qcms))  # evaluation_and_scoring
+                else:
+                    kept = rng.sample(qcms, rng.randint(1, len(qcms)))
+                    self._build_pdf(kept, {})
+                self.recorder.add(action, time.perf_counter() - started)
+            except Exception as e:
+                self.recorder.error(action, e)
+            time.sleep(rng.expovariate(1 / self.think) if self.think > 0 else 0)
+
+
+def report(recorder: Recorder, elapsed: float, users: int, workers: int, rss_start: int, metrics) -> dict:
+    rows = {}
+    for action in ACTIONS + ["queue"]:
+        values = sorted(recorder.latencies.get(action, []))
+        if not values:
+            continue
+        rows[action] = {"count": len(values), "per_s": len(values) / elapsed,
+                        "p50_ms": percentile(values, 50) * 1000, "p95_ms": percentile(values, 95) * 1000,
+                        "p99_ms": percentile(values, 99) * 1000, "max_ms": values[-1] * 1000}
+    ops = sum(r["count"] for a, r in rows.items() if a != "queue")
+    errors = sum(n for by_msg in recorder.errors.values() for n in by_msg.values())
+    summary = {"users": users, "workers": workers, "elapsed_s": elapsed, "actions": ops,
+               "throughput_per_s": ops / elapsed, "errors": errors, "error_details": recorder.errors,
+               "notes": recorder.notes, "rss_start_mib": rss_start / 1024, "rss_peak_mib": rss_kib("VmHWM") / 1024,
+               "latency": rows, "metrics": metrics.snapshot()}
+
+    print(f"\n{users} users, {workers} workers, {elapsed:.1f} s: {ops} actions, "
+          f"{summary['throughput_per_s']:.2f} actions/s, {errors} errors")
+    print(f"{'action':8s} {'count':>6s} {'per s':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}")
+    for action, r in rows.items():
+        print(f"{action:8s} {r['count']:6d} {r['per_s']:7.2f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+              f"{r['p99_ms']:9.1f} {r['max_ms']:9.1f}")
+    if recorder.notes:
+        print("generations: " + ", ".join(f"{k} {v}" for k, v in sorted(recorder.notes.items())))
+    for action, by_msg in recorder.errors.items():
+        for msg, n in by_msg.items():
+            print(f"error [{action}] x{n}: {msg}")
+    print(f"RSS: {summary['rss_start_mib']:.0f} MiB after warm-up, peak {summary['rss_peak_mib']:.0f} MiB")
+
+    print("\nStages (qcmgen.metrics, whole run):")
+    for row in metrics.rows():
+        print(f"  {row['stage']:12s} calls {row['calls']:6d}  total {row['ms']:10.1f} ms  "
+              f"self {row['self_ms']:10.1f} ms  max {row['max_ms']:8.1f} ms")
+    counters = metrics.snapshot()["counters"]
+    if counters:
+        print("Counters:")
+        for name, value in sorted(counters.items()):
+            print(f"  {name:32s} {value:g}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load after the warm-up")
+    parser.add_argument("--think", type=float, default=2.0, help="mean think time between two actions (seconds)")
+    parser.add_argument("--workers", type=int, help="generation workers (QCMGEN_JOB_WORKERS, default 4)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("new=3,regen=2,answer=4,pdf=1"),
+                        help="action weights, e.g. new=3,regen=2,answer=4,pdf=1")
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("QCMGEN_BUDGET_S", "3")),
+                        help="generation time budget in seconds, 0 for none (as QCMGEN_BUDGET_S)")
+    parser.add_argument("--cache-size", type=int, help="pad the pictogram cache with synthetic terms up to N")
+    parser.add_argument("--fixtures", metavar="DIR", help="replay ARASAAC responses recorded with fake_arasaac_server.py --record DIR")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every ARASAAC request")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random extra ARASAAC latency, up to this many seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    # avant tout import de qcmgen: URLs ARASAAC et taille du pool lues à l'import
+    os.environ["ARASAAC_API_BASE"] = f"{base}/v1"
+    os.environ["ARASAAC_STATIC_BASE"] = base
+    if args.workers:
+        os.environ["QCMGEN_JOB_WORKERS"] = str(args.workers)
+
+    from bench_pipeline import build_cache, load_corpus
+    from fake_arasaac_server import make_server
+    from qcmgen.pictos.cache import PictoCacheStore, cache_path
+
+    server, fake = make_server(port=port, replay=args.fixtures, latency=args.latency, jitter=args.jitter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmp = tempfile.mkdtemp(prefix="qcmgen-load-")
+    try:
+        if args.cache_size:
+            PictoCacheStore(str(Path(tmp) / "arasaac_cache_fr.json")).save(build_cache(args.cache_size, base))
+        elif os.path.exists(cache_path("fr")):
+            shutil.copy(cache_path("fr"), Path(tmp) / "arasaac_cache_fr.json")
+        os.environ["QCMGEN_DATA_DIR"] = tmp  # les écritures du test ne touchent pas data/
+
+        from qcmgen.jobs import JOB_WORKERS
+        from qcmgen.metrics import get_metrics
+
+        sentences = sorted({f["sent_text"] for f in load_corpus()["facts"]})
+        load = LoadTest(sentences, args.budget or None, args.think, args.mix, Recorder())
+
+        print(f"Warm-up (spaCy, pictogram cache, stand-in on {base}, {fake.mode})...")
+        t0 = time.perf_counter()
+        load.generate(load.new_text(random.Random(args.seed)))
+        print(f"  first generation {time.perf_counter() - t0:.2f} s")
+        load.generations.clear()
+        load._bank.clear()
+        recorder = load.recorder = Recorder()
+        get_metrics().reset()
+        rss_start = rss_kib("VmRSS")
+
+        print(f"{args.users} users for {args.duration:.0f} s (think {args.think} s, mix {args.mix})...")
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        users = [threading.Thread(target=load.user, args=(uid, args.seed, stop_at), daemon=True)
+                 for uid in range(args.users)]
+        for t in users:
+            t.start()
+        for t in users:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        summary = report(recorder, elapsed, args.users, JOB_WORKERS, rss_start, get_metrics())
+        summary.update(arasaac_requests=fake.requests, arasaac=fake.mode, mix=args.mix, think_s=args.think,
+                       budget_s=args.budget, cache_size=args.cache_size)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=1)
+            print(f"Report written to {args.json}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
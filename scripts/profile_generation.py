@@ -0,0 +1,62 @@
+"""
+Replay one generation (and its PDF export) under the profiler, in a fresh process.
+
+Same path as the app: generate_worksheet with the app's picto resolver and
+lemma-based attach, then build_pdf of every generated question. Nothing is
+warmed up first, so the profile includes the spaCy model load, the pictogram
+cache parsing and the image downloads / decoding of the PDF.
+
+The profiles go to data/profiles (QCMGEN_PROFILE_DIR), see scripts/show_profile.py.
+
+Usage: python scripts/profile_generation.py (--text TEXT | --text-file FILE) [--mode all|cpu|mem] [--llm] [--no-pdf]
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+sys.path.insert(0, str(project_root / "app"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--text")
+    source.add_argument("--text-file")
+    parser.add_argument("--mode", default="all", choices=["all", "cpu", "mem"])
+    parser.add_argument("--llm", action="store_true", help="LLM generation path (needs OPENAI_API_KEY)")
+    parser.add_argument("--no-pdf", action="store_true", help="profile the generation only")
+    parser.add_argument("--top", type=int, default=15, help="hot spots printed for each profile")
+    args = parser.parse_args()
+
+    text = args.text if args.text is not None else Path(args.text_file).read_text(encoding="utf-8")
+
+    # même interrupteur que l'app: generate_worksheet et build_pdf se profilent eux-mêmes
+    os.environ["QCMGEN_PROFILE"] = args.mode
+
+    from picto_helpers import attach_pictos, resolve_choice_picto
+    from qcmgen.pdf import build_pdf
+    from qcmgen.pipeline import generate_worksheet
+    from qcmgen.profiling import list_profiles
+    from show_profile import show
+
+    result = generate_worksheet(text, use_llm_generation=args.llm, picto_resolver=resolve_choice_picto,
+                                attach=lambda qcms, progress: attach_pictos(qcms, use_lemmas=True, progress=progress))
+    print(f"{len(result.qcms)} questions in {result.elapsed_s:.2f}s")
+    profiles = [result.profile]
+
+    if not args.no_pdf and result.qcms:
+        pdf = build_pdf(result.qcms, {})
+        print(f"PDF: {len(pdf) / 1024:.0f} KiB")
+        profiles.append(str(list_profiles()[-1].with_suffix("")))
+
+    for stem in filter(None, profiles):
+        print(f"\n##### {stem}")
+        show(Path(stem), top=args.top)
+    print("\nMore: python scripts/show_profile.py last --sort tottime --group-by traceback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Question bank (qcmgen.bank) from the command line.
+
+    stats                         number of texts, questions and categories
+    search [filters]              stored questions matching --qtype / --answer / --category / --text
+                                  (near-duplicates left out, unless --all)
+    worksheet [filters] -o FILE   PDF of the matching questions (or of --ids), without generating anything
+    dedup                         recompute the near-duplicates of the whole bank (qcmgen.dedup)
+    bench --questions N           fill a temporary bank with N synthetic questions and time the lookups
+
+Usage: python scripts/question_bank.py stats
+       python scripts/question_bank.py search --answer chat --category mammal
+       python scripts/question_bank.py worksheet --qtype object --limit 10 -o fiche.pdf
+       python scripts/question_bank.py dedup
+       python scripts/question_bank.py bench --questions 200000
+"""
+from pathlib import Path
+import argparse
+import functools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.bank import QuestionBank, generation_key, get_question_bank, source_hash
+from qcmgen.qcm import ANIMALS, PEOPLE, QCM, ChoicePicto, QuestionType
+
+
+def find(bank: QuestionBank, args):
+    if getattr(args, "ids", None):
+        return bank.get(int(i) for i in args.ids.split(","))
+    found = bank.search(qtype=args.qtype, answer=args.answer, category=args.category,
+                        source=source_hash(args.text) if args.text else None, limit=args.limit, distinct=not args.all)
+    return [q for _, q in found]
+
+
+def cmd_stats(args):
+    bank = get_question_bank()
+    print(f"{bank.path}: " + ", ".join(f"{v} {k}" for k, v in bank.stats().items()))
+    for category, n in bank.categories()[:args.limit]:
+        print(f"  {n:6d}  {category}")
+
+
+def cmd_search(args):
+    bank = get_question_bank()
+    t0 = time.perf_counter()
+    found = bank.search(qtype=args.qtype, answer=args.answer, category=args.category,
+                        source=source_hash(args.text) if args.text else None, limit=args.limit, distinct=not args.all)
+    ms = (time.perf_counter() - t0) * 1000
+    for qid, q in found:
+        print(f"{qid:8d}  [{getattr(q.qtype, 'value', q.qtype)}] {q.question}  {q.choices} -> {q.choices[q.answer_index]}")
+    print(f"{len(found)} questions in {ms:.1f} ms")
+
+
+def cmd_worksheet(args):
+    from qcmgen.pdf import build_pdf
+
+    qcms = find(get_question_bank(), args)
+    if not qcms:
+        sys.exit("No question matches")
+    Path(args.output).write_bytes(build_pdf(qcms, {}))
+    print(f"{len(qcms)} questions -> {args.output}")
+
+
+def cmd_dedup(args):
+    bank = get_question_bank()
+    t0 = time.perf_counter()
+    n = bank.recompute_duplicates()
+    print(f"{n} near-duplicates among {bank.stats()['questions']} questions ({time.perf_counter() - t0:.1f} s)")
+
+
+@functools.lru_cache(maxsize=1)
+def synthetic_terms():
+    from qcmgen.pictos.resolve import _cache_items
+
+    return [t for t, _ in _cache_items("fr") if " " not in t] or ANIMALS
+
+
+def synthetic_question(rng: random.Random, qtype: QuestionType) -> str:
+    """Question wording drawn from verbs, adjectives, places and cached terms (lists of bench_near_duplicates.py)."""
+    from bench_near_duplicates import ADJECTIVES, PLACES, VERBS
+
+    terms = synthetic_terms()
+    verb = rng.choice(VERBS)
+    adj = f"{rng.choice(ADJECTIVES)} " if rng.random() < 0.5 else ""
+    place = f" {rng.choice(PLACES)}" if rng.random() < 0.5 else ""
+    if qtype in (QuestionType.SUBJECT, QuestionType.ADJ_SUBJECT):
+        return f"Qui {verb} le {adj}{rng.choice(terms)}{place} ?"
+    subject = rng.choice(PEOPLE + terms)
+    return f"Que {verb} {subject if subject in PEOPLE else f'le {adj}{subject}'}{place} ?"
+
+
+def synthetic_generation(rng: random.Random, i: int):
+    """One synthetic text with 2 to 6 questions (all question types, pictos of the local cache when known)."""
+    from qcmgen.pictos.resolve import lookup_cached_picto
+
+    qcms = []
+    for _ in range(rng.randint(2, 6)):
+        qtype = rng.choice(list(QuestionType))
+        pool = PEOPLE if qtype in (QuestionType.SUBJECT, QuestionType.ADJ_SUBJECT) else ANIMALS
+        choices = rng.sample(pool, 4)
+        answer_index = rng.randrange(4)
+        question = synthetic_question(rng, qtype)
+        hits = [lookup_cached_picto(c) for c in choices]
+        pictos = [ChoicePicto(picto_id=h.picto_id, url=h.url, variant=c) if h is not None else None
+                  for c, h in zip(choices, hits)]
+        qcms.append(QCM(question, choices, answer_index, qtype, pictos=pictos))
+    return f"Texte synthétique numéro {i}.", qcms
+
+
+def cmd_bench(args):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        bank = QuestionBank(os.path.join(tmp, "question_bank.sqlite"))
+        t0 = time.perf_counter()
+        texts, n = [], 0
+        while n < args.questions:
+            text, qcms = synthetic_generation(rng, len(texts))
+            key = generation_key(text)
+            n += bank.put_generation(key, text, qcms)
+            texts.append(key)
+        fill_s = time.perf_counter() - t0
+        size_mb = os.path.getsize(bank.path) / 1e6
+        print(f"{n} questions from {len(texts)} texts stored in {fill_s:.1f} s "
+              f"({n / fill_s:.0f} questions/s), {size_mb:.1f} MB, {bank.stats()['near_duplicates']} near-duplicates")
+
+        def timed(label, fn, inputs):
+            inputs = list(inputs)
+            if not inputs:
+                print(f"  {label:28s} skipped (no input)")
+                return
+            runs = []
+            for x in inputs:
+                t = time.perf_counter()
+                fn(x)
+                runs.append((time.perf_counter() - t) * 1000)
+            print(f"  {label:28s} median {statistics.median(runs):7.3f} ms  max {max(runs):7.3f} ms  ({len(runs)} lookups)")
+
+        keys = rng.sample(texts, min(200, len(texts)))
+        timed("get_generation (known text)", bank.get_generation, keys)
+        timed("get_generation (unknown)", bank.get_generation, [generation_key(f"inconnu {i}") for i in range(200)])
+        timed("search qtype", lambda t: bank.search(qtype=t), [t.value for t in QuestionType] * 20)
+        timed("search answer", lambda a: bank.search(answer=a), (ANIMALS + PEOPLE) * 10)
+        timed("search qtype + answer", lambda a: bank.search(qtype="object", answer=a), ANIMALS * 10)
+        categories = [c for c, _ in bank.categories()[:10]]
+        timed("search category", lambda c: bank.search(category=c), categories * 10)
+        timed("search category + qtype", lambda c: bank.search(category=c, qtype="object"), categories * 10)
+        timed("search answer (distinct)", lambda a: bank.search(answer=a, distinct=True), (ANIMALS + PEOPLE) * 10)
+        new = [synthetic_generation(rng, i) for i in range(len(texts), len(texts) + 200)]
+        timed("put_generation", lambda g: bank.put_generation(generation_key(g[0]), *g), new)
+
+        incremental = bank.stats()["near_duplicates"]  # trouvés par put_generation, un ajout à la fois
+        t0 = time.perf_counter()
+        dups = bank.recompute_duplicates()
+        print(f"  {'recompute_duplicates':28s} {time.perf_counter() - t0:8.2f} s  ({dups} near-duplicates, "
+              f"{incremental} found incrementally)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats").add_argument("--limit", type=int, default=20, help="categories listed")
+    for name in ("search", "worksheet"):
+        p = sub.add_parser(name)
+        p.add_argument("--qtype", choices=[t.value for t in QuestionType])
+        p.add_argument("--answer")
+        p.add_argument("--category", help="ARASAAC category of the answer's picto")
+        p.add_argument("--text", help="source text (questions generated from it)")
+        p.add_argument("--limit", type=int, default=50)
+        p.add_argument("--all", action="store_true", help="include near-duplicates of other stored questions")
+        if name == "worksheet":
+            p.add_argument("--ids", help="question ids, comma separated (instead of the filters)")
+            p.add_argument("-o", "--output", required=True)
+    sub.add_parser("dedup")
+    sub.add_parser("bench").add_argument("--questions", type=int, default=100000)
+    args = parser.parse_args()
+
+    {"stats": cmd_stats, "search": cmd_search, "worksheet": cmd_worksheet, "dedup": cmd_dedup,
+     "bench": cmd_bench}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
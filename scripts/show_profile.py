@@ -0,0 +1,109 @@
+"""
+Print the hot spots of a profile written by qcmgen.profiling.
+
+Without argument, lists the saved profiles; with a profile (path, stem or
+"last"), prints the top functions of its cProfile part and the top allocation
+sites of its tracemalloc part.
+
+Usage: python scripts/show_profile.py [PROFILE|last] [--top 25] [--sort cumulative|tottime|ncalls]
+                                     [--group-by lineno|filename|traceback]
+"""
+from pathlib import Path
+import argparse
+import io
+import json
+import pstats
+import sys
+import tracemalloc
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.profiling import list_profiles, profile_dir
+
+
+def resolve_stem(arg: str) -> Path:
+    if arg == "last":
+        metas = list_profiles()
+        if not metas:
+            sys.exit(f"No profile in {profile_dir()}")
+        return metas[-1].with_suffix("")
+    path = Path(arg)
+    if not path.parent.parts:
+        path = profile_dir() / path  # nom seul: dossier des profils
+    # chemin donné avec ou sans extension
+    return path.with_suffix("") if path.suffix in (".json", ".prof", ".tracemalloc") else path
+
+
+def show_list() -> None:
+    metas = list_profiles()
+    if not metas:
+        print(f"No profile in {profile_dir()}")
+        return
+    for meta_path in metas:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        peak = f"{meta['peak_bytes'] / 1e6:7.1f} MB" if meta.get("peak_bytes") else "      -   "
+        print(f"{meta_path.stem}  {meta['mode']:3s}  {meta['elapsed_s']:8.3f} s  peak {peak}")
+
+
+def show_cpu(path: Path, top: int, sort: str) -> None:
+    out = io.StringIO()
+    stats = pstats.Stats(str(path), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    # en-tête de pstats (nom du fichier, nombre d'appels) puis le tableau
+    print("\n".join(line for line in out.getvalue().splitlines() if line.strip()))
+
+
+def show_mem(path: Path, top: int, group_by: str) -> None:
+    snapshot = tracemalloc.Snapshot.load(str(path))
+    stats = snapshot.statistics(group_by)
+    total = sum(s.size for s in stats)
+    print(f"{len(stats)} allocation sites, {total / 1e6:.1f} MB still allocated at the end of the call")
+    for s in stats[:top]:
+        if group_by == "traceback":
+            print(f"{s.size / 1024:10.1f} KiB  {s.count:7d} blocks")
+            for line in s.traceback.format(limit=5):
+                print("    " + line)
+        else:
+            frame = s.traceback[0]
+            print(f"{s.size / 1024:10.1f} KiB  {s.count:7d} blocks  {frame.filename}:{frame.lineno}")
+
+
+def show(stem: Path, top: int = 25, sort: str = "cumulative", group_by: str = "lineno") -> None:
+    meta_path = Path(str(stem) + ".json")
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        peak = f", peak {meta['peak_bytes'] / 1e6:.1f} MB" if meta.get("peak_bytes") else ""
+        print(f"{meta['name']} (input {meta['input_hash']}): {meta['elapsed_s']:.3f} s{peak}")
+
+    found = False
+    cpu, mem = Path(str(stem) + ".prof"), Path(str(stem) + ".tracemalloc")
+    if cpu.exists():
+        found = True
+        print(f"\n== CPU (cProfile, sorted by {sort}) ==")
+        show_cpu(cpu, top, sort)
+    if mem.exists():
+        found = True
+        print(f"\n== Allocations (tracemalloc, by {group_by}) ==")
+        show_mem(mem, top, group_by)
+    if not found:
+        sys.exit(f"No profile data for {stem}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("profile", nargs="?", help='profile path or stem, or "last"; lists the profiles when omitted')
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, ncalls, ...)")
+    parser.add_argument("--group-by", default="lineno", choices=["lineno", "filename", "traceback"])
+    args = parser.parse_args()
+
+    if not args.profile:
+        show_list()
+        return
+
+    show(resolve_stem(args.profile), args.top, args.sort, args.group_by)
+
+
+if __name__ == "__main__":
+    main()
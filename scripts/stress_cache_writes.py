@@ -0,0 +1,110 @@
+"""
+Stress test: many processes write to the same pictogram cache file at once.
+
+Each writer process adds its own terms one by one (one save per term, like
+resolve_term_to_picto does) and a reader process keeps re-loading the file.
+At the end every written term must be in the file, and the reader must never
+have seen a truncated or empty file.
+
+Usage: python scripts/stress_cache_writes.py [--writers 8] [--terms 40] [--snapshot]
+"""
+from pathlib import Path
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import tempfile
+import time
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.cache import PictoCacheStore, from_file_format
+
+
+def fake_entry(picto_id: int):
+    return {
+        "picto_id": picto_id,
+        "url": f"https://static.arasaac.org/pictograms/{picto_id}/{picto_id}_300.png",
+        "score": 10.0,
+        "tags": ["test"],
+        "categories": ["stress"],
+        "keyword": f"terme{picto_id}",
+        "plural": None,
+        "fetched_at": time.time(),
+        "schema_version": 1,
+    }
+
+
+def writer(path: str, w: int, n_terms: int) -> None:
+    store = PictoCacheStore(path)
+    for i in range(n_terms):
+        cache = store.data()
+        picto_id = w * 100_000 + i
+        cache[f"w{w}_terme{i}"] = fake_entry(picto_id)
+        store.save(cache)
+
+
+def reader(path: str, stop, results) -> None:
+    reads, problems = 0, []
+    while not stop.is_set():
+        try:
+            with open(path, encoding="utf-8") as f:
+                raw = json.load(f)
+            if not from_file_format(raw):
+                problems.append("empty cache read")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            problems.append(f"{type(e).__name__}: {e}")
+        reads += 1
+    # un seul message: un processus ne peut pas se terminer tant que sa Queue n'est pas vidée
+    results.put((reads, len(problems), problems[:1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--terms", type=int, default=40, help="terms written by each writer")
+    parser.add_argument("--snapshot", action="store_true", help="also keep a binary snapshot up to date")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "arasaac_cache_fr.json")
+        seed = PictoCacheStore(path)
+        seed.data()["seed"] = fake_entry(1)
+        seed.save()
+        if args.snapshot:
+            seed.build_snapshot()
+
+        stop, results = mp.Event(), mp.Queue()
+        rd = mp.Process(target=reader, args=(path, stop, results))
+        rd.start()
+
+        t0 = time.perf_counter()
+        writers = [mp.Process(target=writer, args=(path, w, args.terms)) for w in range(args.writers)]
+        for p in writers:
+            p.start()
+        for p in writers:
+            p.join()
+        elapsed = time.perf_counter() - t0
+
+        stop.set()
+        reads, n_problems, problems = results.get()
+        rd.join()
+
+        cache = PictoCacheStore(path).data()
+        expected = {f"w{w}_terme{i}" for w in range(args.writers) for i in range(args.terms)} | {"seed"}
+        missing = expected - set(cache)
+
+        n_saves = args.writers * args.terms
+        print(f"{args.writers} writers x {args.terms} saves in {elapsed:.1f}s ({n_saves / elapsed:.0f} saves/s), {reads} concurrent reads")
+        print(f"Entries in file: {len(cache)} / {len(expected)} expected, {len(missing)} lost")
+        print(f"Reader errors: {n_problems}" + (f" (first: {problems[0]})" if problems else ""))
+        if missing or n_problems or any(p.exitcode != 0 for p in writers):
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Upgrade the whole pictogram cache: re-fetch every entry that is incomplete
+(no tags/categories), written with an older schema, or older than --max-age-days.
+
+Each entry is re-fetched through the resolver that wrote it (strict entries stay
+strict); for legacy entries, it is inferred from the entry (resolve.entry_resolver).
+The cache file is written every few hundred entries and at the end.
+
+Usage: python scripts/upgrade_arasaac_cache.py [--lang fr] [--max-age-days 30] [--force] [--skip-legacy]
+"""
+from pathlib import Path
+import argparse
+import sys
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root / "src"))
+
+from qcmgen.pictos.refresh import upgrade_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lang", default="fr")
+    parser.add_argument("--max-age-days", type=float, default=30.0)
+    parser.add_argument("--force", action="store_true", help="refresh every entry")
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="leave complete entries written with an older schema as they are")
+    parser.add_argument("--throttle", type=float, default=0.25, help="seconds between two ARASAAC calls")
+    args = parser.parse_args()
+
+    refreshed, failed = upgrade_cache(
+        lang=args.lang,
+        max_age=args.max_age_days * 24 * 3600,
+        force=args.force,
+        throttle=args.throttle,
+        include_legacy=not args.skip_legacy,
+    )
+    print(f"\nDone. Refreshed {refreshed} entries, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Banque de questions locale (data/question_bank.sqlite).
+
+Chaque génération complète y est gardée avec ses QCM (question, type, réponse,
+choix, pictos résolus) : un texte déjà vu est servi depuis la banque sans
+analyse ni résolution, et l'enseignant peut composer une fiche à partir de
+questions déjà générées.
+
+Tables :
+
+    texts      une génération: text_hash (clé de generation_key: texte + options), texte, options,
+               pipeline_version (GENERATION_VERSION au moment de l'écriture)
+    questions  un QCM: text_hash, position, source_hash (paragraphe source), qtype,
+               answer (réponse normalisée), choix et pictos en JSON, signature MinHash
+               et dup_of (question plus ancienne dont il est un quasi-doublon)
+    question_categories  catégories ARASAAC du picto de la réponse
+
+Index sur text_hash, source_hash, qtype, answer et catégorie : une recherche
+reste de l'ordre de la milliseconde avec des centaines de milliers de questions.
+
+Une génération n'est servie que si elle a été écrite par la même version de la
+génération (GENERATION_VERSION) depuis moins de BANK_TTL_S ; sinon le texte est
+régénéré et l'entrée remplacée. Une génération vide n'est pas gardée : un texte
+qui n'a rien donné une fois est retenté.
+
+Quasi-doublons (qcmgen.dedup) : chaque processus qui écrit garde un index LSH
+des questions « canoniques » (dup_of nul), chargé au premier ajout puis tenu à
+jour avec les questions ajoutées depuis (id > dernier vu). Une question ajoutée
+proche d'une question canonique est stockée avec dup_of = son id ; la recherche
+avec distinct=True les écarte. Les questions d'une banque v1 reçoivent leur
+signature au premier ajout.
+
+SQLite en mode WAL, une connexion par thread : plusieurs workers Streamlit (et
+les scripts) lisent pendant qu'un autre écrit. La banque n'est qu'un cache :
+une erreur SQLite est affichée et la génération continue sans elle.
+"""
+
+import hashlib
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from qcmgen.metrics import incr
+from qcmgen.pictos.cache import data_dir_path
+from qcmgen.qcm import QCM, ChoicePicto, _normalize_answer
+
+BANK_SCHEMA_VERSION = 3  # v2: questions.minhash, questions.dup_of; v3: texts.pipeline_version
+# à incrémenter quand un même texte ne donne plus les mêmes questions (génération, filtres, pools)
+GENERATION_VERSION = 1
+BANK_TTL_S = 30 * 24 * 3600.0  # une génération plus ancienne est refaite (pictos et pools à jour)
+CATEGORIES_TTL_S = 30.0  # liste des catégories (agrégat sur toute la table) recalculée au plus toutes les 30 s
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    text_hash   TEXT PRIMARY KEY,
+    text        TEXT NOT NULL,
+    options     TEXT NOT NULL,
+    n_questions INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    pipeline_version INTEGER
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id           INTEGER PRIMARY KEY,
+    text_hash    TEXT NOT NULL,
+    position     INTEGER NOT NULL,
+    source_hash  TEXT NOT NULL,
+    qtype        TEXT NOT NULL,
+    question     TEXT NOT NULL,
+    answer       TEXT NOT NULL,
+    answer_index INTEGER NOT NULL,
+    choices      TEXT NOT NULL,
+    pictos       TEXT,
+    rationale    TEXT,
+    paragraph    TEXT,
+    created_at   REAL NOT NULL,
+    minhash      BLOB,
+    dup_of       INTEGER,
+    UNIQUE (text_hash, position)
+);
+CREATE INDEX IF NOT EXISTS questions_source ON questions (source_hash);
+CREATE INDEX IF NOT EXISTS questions_qtype ON questions (qtype, id);
+CREATE INDEX IF NOT EXISTS questions_answer ON questions (answer, id);
+CREATE TABLE IF NOT EXISTS question_categories (
+    category    TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    PRIMARY KEY (category, question_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS question_categories_question ON question_categories (question_id);
+"""
+
+# colonnes ajoutées depuis la v1 (ALTER TABLE sur une banque existante)
+_ADDED_COLUMNS = {"questions": {"minhash": "BLOB", "dup_of": "INTEGER"},
+                  "texts": {"pipeline_version": "INTEGER"}}
+
+
+def question_bank_path() -> str:
+    return str(data_dir_path() / "question_bank.sqlite")
+
+
+def generation_key(text: str, use_llm_generation: bool = False, require_pictos: bool = True, items=None) -> str:
+    """Key of a generation: the text (stripped) and the options that change its questions."""
+    raw = json.dumps([text.strip(), use_llm_generation, require_pictos, items], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def source_hash(text: str) -> str:
+    """Hash of a source paragraph (whitespace-insensitive)."""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+def answer_term(answer: str) -> str:
+    """Normalized answer, as indexed (case-insensitive)."""
+    return _normalize_answer(answer).lower()
+
+
+def _answer_categories(qcm: QCM) -> List[str]:
+    """ARASAAC categories of the answer's picto (from the local cache, no network call)."""
+    from qcmgen.pictos.resolve import lookup_cached_picto
+
+    picto = qcm.pictos[qcm.answer_index] if qcm.pictos else None
+    if picto is None:
+        return []
+    hit = lookup_cached_picto(picto.variant or qcm.choices[qcm.answer_index])
+    return list(hit.categories) if hit is not None and hit.picto_id == picto.picto_id else []
+
+
+def _encode_pictos(pictos: Optional[List[Optional[ChoicePicto]]]) -> Optional[str]:
+    if pictos is None:
+        return None
+    return json.dumps([[p.picto_id, p.url, p.variant] if p is not None else None for p in pictos], ensure_ascii=False)
+
+
+def _decode_pictos(raw: Optional[str]) -> Optional[List[Optional[ChoicePicto]]]:
+    if raw is None:
+        return None
+    return [ChoicePicto(*p) if p is not None else None for p in json.loads(raw)]
+
+
+def _row_tokens(row: sqlite3.Row):
+    """Near-duplicate tokens (qcmgen.dedup) of a stored question."""
+    from qcmgen.dedup import question_tokens
+
+    return question_tokens(row["question"], json.loads(row["choices"])[row["answer_index"]])
+
+
+def _qtype_value(qtype: Any) -> str:
+    """Stored qtype: a QuestionType value, or the category of an LLM question (e.g. "animal")."""
+    return getattr(qtype, "value", qtype)
+
+
+def _row_to_qcm(row: sqlite3.Row) -> QCM:
+    # chaîne telle quelle: QuestionType hérite de str, les comparaisons avec l'enum restent vraies
+    return QCM(question=row["question"], choices=json.loads(row["choices"]), answer_index=row["answer_index"],
+               qtype=row["qtype"], rationale=row["rationale"], paragraph=row["paragraph"],
+               pictos=_decode_pictos(row["pictos"]))
+
+
+class QuestionBank:
+    """Generated QCMs in a SQLite file, one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._categories: Optional[Tuple[float, List[Tuple[str, int]]]] = None
+        self._dups = None  # NearDuplicateIndex des questions canoniques, chargé au premier ajout
+        self._dups_seen = 0  # plus grand id de question indexé
+        self._dups_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    with conn:
+                        conn.executescript(_SCHEMA)
+                        for table, added in _ADDED_COLUMNS.items():
+                            columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+                            for column, kind in added.items():
+                                if column not in columns:
+                                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+                        conn.execute(f"PRAGMA user_version={BANK_SCHEMA_VERSION}")
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def _sync_dups(self, conn: sqlite3.Connection):
+        """The near-duplicate index, with the canonical questions added since the last call (_dups_lock held)."""
+        from qcmgen.dedup import NearDuplicateIndex, get_minhasher, signature_to_bytes, signatures_from_bytes
+
+        if self._dups is None:
+            self._dups, self._dups_seen = NearDuplicateIndex(), 0
+            # banque v1: signatures et dup_of des questions qui n'en ont pas encore
+            rows = conn.execute("SELECT id, question, choices, answer_index FROM questions "
+                                "WHERE minhash IS NULL ORDER BY id").fetchall()
+            if rows:
+                tokens = [_row_tokens(r) for r in rows]
+                sigs = get_minhasher().signatures(tokens)
+                with conn:
+                    conn.executemany("UPDATE questions SET minhash = ? WHERE id = ?",
+                                     [(signature_to_bytes(sig), r["id"]) for r, sig in zip(rows, sigs)])
+                    self._update_duplicates(conn, [r["id"] for r in rows], sigs, tokens)
+        rows = conn.execute("SELECT id, minhash FROM questions WHERE id > ? AND dup_of IS NULL "
+                            "AND minhash IS NOT NULL ORDER BY id", (self._dups_seen,)).fetchall()
+        if rows:
+            self._dups.extend([r["id"] for r in rows], signatures_from_bytes([r["minhash"] for r in rows]))
+            self._dups_seen = rows[-1]["id"]
+        return self._dups
+
+    @staticmethod
+    def _update_duplicates(conn: sqlite3.Connection, ids: List[int], sigs, tokens) -> int:
+        """dup_of of the questions `ids` among themselves (one batch, exact Jaccard). Returns the duplicates."""
+        from qcmgen.dedup import duplicate_of
+
+        dup = duplicate_of(sigs, token_sets=tokens).tolist()
+        conn.executemany("UPDATE questions SET dup_of = ? WHERE id = ?",
+                         [(ids[d] if d >= 0 else None, qid) for qid, d in zip(ids, dup)])
+        return sum(d >= 0 for d in dup)
+
+    @staticmethod
+    def _closest(conn: sqlite3.Connection, index, sig, tokens, before: Optional[int] = None) -> Optional[int]:
+        """
+        Id of the indexed question closest to (sig, tokens), checked on the exact Jaccard, or None.
+        With `before`, only questions with a smaller id are candidates (same rule as duplicate_of).
+        """
+        from qcmgen.dedup import ESTIMATE_MARGIN, jaccard
+
+        candidates = [qid for qid, _ in index.query(sig, index.threshold - ESTIMATE_MARGIN)
+                      if before is None or qid < before]
+        if not candidates:
+            return None
+        rows = conn.execute(f"SELECT id, question, choices, answer_index FROM questions "
+                            f"WHERE id IN ({','.join('?' * len(candidates))})", candidates).fetchall()
+        best = max(((jaccard(tokens, _row_tokens(r)), -r["id"]) for r in rows), default=(0.0, 0))
+        return -best[1] if best[0] >= index.threshold else None
+
+    def _reattach_duplicates(self, conn: sqlite3.Connection, index, removed: List[int]) -> None:
+        """
+        Questions whose canonical question was removed: duplicate of another one, or canonical themselves.
+        Processed in id order, like duplicate_of: a question that becomes canonical may turn later
+        canonical questions into its duplicates, whose own duplicates are then processed in turn.
+        The canonical / duplicate split then matches recompute_duplicates; a question that stays a
+        duplicate keeps its dup_of even if a question promoted here is closer.
+        """
+        from qcmgen.dedup import ESTIMATE_MARGIN, signatures_from_bytes
+
+        def dependents(ids: List[int]) -> List[int]:
+            return [r["id"] for r in conn.execute(
+                f"SELECT id FROM questions WHERE dup_of IN ({','.join('?' * len(ids))})", ids)]
+
+        todo = dependents(removed)
+        heapq.heapify(todo)
+        done = set()
+        while todo:
+            qid = heapq.heappop(todo)
+            if qid in done:
+                continue
+            done.add(qid)  # on n'ajoute que des ids plus grands: tout ce qui précède est déjà fixé
+            r = conn.execute("SELECT id, question, choices, answer_index, minhash, dup_of FROM questions "
+                             "WHERE id = ?", (qid,)).fetchone()
+            sig = signatures_from_bytes([r["minhash"]])[0]
+            dup_of = self._closest(conn, index, sig, _row_tokens(r), before=qid)
+            if dup_of is None and r["dup_of"] is not None:
+                index.insert(qid, sig)
+                for other, _ in index.query(sig, index.threshold - ESTIMATE_MARGIN):
+                    if other > qid:
+                        heapq.heappush(todo, other)
+            elif dup_of is not None and r["dup_of"] is None:
+                index.discard([qid])
+                for other in dependents([qid]):
+                    heapq.heappush(todo, other)
+            conn.execute("UPDATE questions SET dup_of = ? WHERE id = ?", (dup_of, qid))
+
+    def put_generation(self, key: str, text: str, qcms: List[QCM], options: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Store (or replace) the questions of a generation. Returns the number stored.
+        An empty generation is not stored (the text is tried again next time).
+        A question close to an older canonical question is stored with dup_of = its id.
+        """
+        from qcmgen.dedup import get_minhasher, qcm_tokens, signature_to_bytes
+
+        if not qcms:
+            return 0
+        now = time.time()
+        default_source = source_hash(text)
+        rows, categories = [], []
+        for position, q in enumerate(qcms):
+            rows.append((key, position, source_hash(q.paragraph) if q.paragraph else default_source,
+                         _qtype_value(q.qtype), q.question, answer_term(q.choices[q.answer_index]),
+                         q.answer_index, json.dumps(q.choices, ensure_ascii=False), _encode_pictos(q.pictos),
+                         q.rationale, q.paragraph, now))
+            categories.append(_answer_categories(q))
+        tokens = qcm_tokens(qcms)
+        signatures = get_minhasher().signatures(tokens)
+        near_duplicates = 0
+        with self._dups_lock:
+            try:
+                conn = self._conn()
+                index = self._sync_dups(conn)
+                with conn:
+                    replaced = [r[0] for r in conn.execute("SELECT id FROM questions WHERE text_hash = ?", (key,))]
+                    conn.execute("DELETE FROM question_categories WHERE question_id IN "
+                                 "(SELECT id FROM questions WHERE text_hash = ?)", (key,))
+                    conn.execute("DELETE FROM questions WHERE text_hash = ?", (key,))
+                    conn.execute("INSERT OR REPLACE INTO texts (text_hash, text, options, n_questions, created_at, "
+                                 "pipeline_version) VALUES (?, ?, ?, ?, ?, ?)",
+                                 (key, text.strip(), json.dumps(options or {}, ensure_ascii=False, sort_keys=True),
+                                  len(qcms), now, GENERATION_VERSION))
+                    if replaced:
+                        index.discard(replaced)
+                        self._reattach_duplicates(conn, index, replaced)
+                    for row, cats, sig, toks in zip(rows, categories, signatures, tokens):
+                        dup_of = self._closest(conn, index, sig, toks)
+                        cur = conn.execute("INSERT INTO questions (text_hash, position, source_hash, qtype, question, "
+                                           "answer, answer_index, choices, pictos, rationale, paragraph, created_at, "
+                                           "minhash, dup_of) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                           row + (signature_to_bytes(sig), dup_of))
+                        if dup_of is None:
+                            index.insert(cur.lastrowid, sig)
+                            self._dups_seen = cur.lastrowid
+                        else:
+                            near_duplicates += 1
+                        conn.executemany("INSERT OR IGNORE INTO question_categories VALUES (?, ?)",
+                                         [(c, cur.lastrowid) for c in cats])
+            except sqlite3.Error as e:
+                self._dups = None  # contient peut-être des questions annulées: rechargé au prochain ajout
+                print(f"Question bank write failed: {e}")
+                return 0
+        if near_duplicates:
+            incr("bank_near_duplicates", near_duplicates)
+        if any(categories):
+            self._categories = None
+        return len(qcms)
+
+    def recompute_duplicates(self) -> int:
+        """Recompute dup_of of the whole bank in one batch (after changing NEAR_DUP_THRESHOLD). Returns the count."""
+        from qcmgen.dedup import signatures_from_bytes
+
+        with self._dups_lock:
+            conn = self._conn()
+            self._dups = None
+            self._sync_dups(conn)  # signatures manquantes (banque v1)
+            rows = conn.execute("SELECT id, question, choices, answer_index, minhash FROM questions ORDER BY id").fetchall()
+            with conn:
+                n = self._update_duplicates(conn, [r["id"] for r in rows],
+                                            signatures_from_bytes([r["minhash"] for r in rows]),
+                                            [_row_tokens(r) for r in rows])
+            self._dups = None
+        return n
+
+    def get_generation(self, key: str) -> Optional[List[QCM]]:
+        """
+        The questions stored for a generation key (in order), None when the text is unknown,
+        was generated by another GENERATION_VERSION or more than BANK_TTL_S ago.
+        """
+        try:
+            conn = self._conn()
+            if conn.execute("SELECT 1 FROM texts WHERE text_hash = ? AND pipeline_version = ? AND created_at > ?",
+                            (key, GENERATION_VERSION, time.time() - BANK_TTL_S)).fetchone() is None:
+                incr("bank_misses")
+                return None
+            rows = conn.execute("SELECT * FROM questions WHERE text_hash = ? ORDER BY position", (key,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Question bank read failed: {e}")
+            return None
+        incr("bank_hits")
+        return [_row_to_qcm(r) for r in rows]
+
+    def search(self, qtype: Optional[str] = None, answer: Optional[str] = None, category: Optional[str] = None,
+               source: Optional[str] = None, text_hash: Optional[str] = None,
+               limit: int = 50, distinct: bool = False) -> List[Tuple[int, QCM]]:
+        """
+        (id, QCM) of the stored questions matching every given filter, most recent first.
+        With distinct, near-duplicates of another stored question are left out.
+        """
+        sql = "SELECT q.* FROM questions q"
+        where, params = [], []
+        if category:
+            sql += " JOIN question_categories c ON c.question_id = q.id AND c.category = ?"
+            params.append(category)
+        for column, value in (("qtype", _qtype_value(qtype) if qtype else None),
+                              ("answer", answer_term(answer) if answer else None),
+                              ("source_hash", source), ("text_hash", text_hash)):
+            if value:
+                where.append(f"q.{column} = ?")
+                params.append(value)
+        if distinct:
+            # dup_of d'une question supprimée depuis (génération remplacée): la question redevient visible
+            where.append("(q.dup_of IS NULL OR NOT EXISTS (SELECT 1 FROM questions d WHERE d.id = q.dup_of))")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # catégorie seule (ou avec le type): parcours de son index dans l'ordre, sans trier toutes ses
+        # questions; avec un filtre plus sélectif (réponse, texte), parcours de celui-ci
+        by_category = category and not (answer or source or text_hash)
+        sql += f" ORDER BY {'c.question_id' if by_category else 'q.id'} DESC LIMIT ?"
+        params.append(int(limit))
+        try:
+            rows = self._conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            print(f"Question bank search failed: {e}")
+            return []
+        return [(r["id"], _row_to_qcm(r)) for r in rows]
+
+    def get(self, ids: Iterable[int]) -> List[QCM]:
+        """Questions by id, in the given order (unknown ids are skipped)."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        rows = self._conn().execute(f"SELECT * FROM questions WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()
+        by_id = {r["id"]: r for r in rows}
+        return [_row_to_qcm(by_id[i]) for i in ids if i in by_id]
+
+    def categories(self) -> List[Tuple[str, int]]:
+        """(category, number of questions), most frequent first (recomputed every CATEGORIES_TTL_S at most)."""
+        cached = self._categories
+        if cached is not None and time.monotonic() - cached[0] < CATEGORIES_TTL_S:
+            return cached[1]
+        try:
+            rows = [(r[0], r[1]) for r in self._conn().execute(
+                "SELECT category, COUNT(*) FROM question_categories GROUP BY category ORDER BY COUNT(*) DESC, category")]
+        except sqlite3.Error as e:
+            print(f"Question bank read failed: {e}")
+            return []
+        self._categories = (time.monotonic(), rows)
+        return rows
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._conn()
+        return {"texts": conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0],
+                "questions": conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0],
+                "near_duplicates": conn.execute("SELECT COUNT(*) FROM questions WHERE dup_of IS NOT NULL").fetchone()[0],
+                "categories": conn.execute("SELECT COUNT(DISTINCT category) FROM question_categories").fetchone()[0]}
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with conn:
+            for table in ("question_categories", "questions", "texts"):
+                conn.execute(f"DELETE FROM {table}")
+        self._categories = None
+        with self._dups_lock:
+            self._dups = None
+
+
+_BANKS: Dict[str, QuestionBank] = {}
+_BANKS_LOCK = threading.Lock()
+
+
+def get_question_bank() -> QuestionBank:
+    """Process-wide question bank (one per data dir)."""
+    path = question_bank_path()
+    with _BANKS_LOCK:
+        bank = _BANKS.get(path)
+        if bank is None:
+            bank = _BANKS[path] = QuestionBank(path)
+        return bank
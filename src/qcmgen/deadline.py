@@ -0,0 +1,70 @@
+"""
+Budget de temps d'une génération (de bout en bout).
+
+L'appelant crée un `Deadline(budget_s)` et le passe aux étapes du pipeline
+(`extract_facts`, `generate_qcms_for_facts`, `generate_qcms_from_text_llm`) ;
+chaque étape vérifie le temps restant et s'arrête proprement une fois le
+budget épuisé, en notant ce qui a été coupé dans `deadline.cut`.
+
+Les appels réseau à ARASAAC faits à l'intérieur de `with deadline.activate():`
+ont un timeout borné par le temps restant ; une fois le budget épuisé ils ne
+partent plus et la résolution continue depuis le cache local seulement.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+_CURRENT: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("qcmgen_deadline", default=None)
+
+
+class Deadline:
+    """Time budget shared by the stages of one generation request."""
+
+    def __init__(self, budget_s: Optional[float] = None):
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+        self._end = None if budget_s is None else self.started + budget_s
+        self.cut: List[str] = []  # étapes coupées ou dégradées faute de temps, dans l'ordre
+
+    def remaining(self) -> float:
+        if self._end is None:
+            return float("inf")
+        return max(0.0, self._end - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def expired(self) -> bool:
+        return self._end is not None and time.monotonic() >= self._end
+
+    def check(self, stage: str) -> bool:
+        """True while there is budget left; otherwise records `stage` as cut and returns False."""
+        if not self.expired():
+            return True
+        self.mark_cut(stage)
+        return False
+
+    def mark_cut(self, stage: str) -> None:
+        """Record `stage` as cut (once), e.g. a call stopped by its own timeout."""
+        if stage not in self.cut:
+            self.cut.append(stage)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.cut)
+
+    @contextmanager
+    def activate(self):
+        """Make this deadline the ambient one (bounds ARASAAC calls made by the resolvers)."""
+        token = _CURRENT.set(self)
+        try:
+            yield self
+        finally:
+            _CURRENT.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline activated by the caller, if any."""
+    return _CURRENT.get()
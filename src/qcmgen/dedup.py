@@ -0,0 +1,318 @@
+"""
+Détection des quasi-doublons de questions (MinHash + LSH).
+
+generate_payloads n'enlève que les doublons exacts d'un même fait ; sur un gros
+lot ou un texte LLM on obtient vite « Que mange le chat ? » et « Que mange le
+petit chat ? » pour la même réponse. Comparer toutes les paires ne passe pas à
+l'échelle de la banque (centaines de milliers de questions), d'où :
+
+  - jetons : mots de la question normalisés (minuscules, sans accents, sans
+    articles, pluriels en -s/-x/-ent ramenés au singulier) et la réponse, répétée
+    pour peser autant que la moitié de la question : même question avec une
+    autre réponse -> similarité <= 0,5, jamais un doublon ;
+  - signature MinHash de NUM_PERM valeurs de 16 bits (256 octets par question,
+    stockée telle quelle dans la banque) : la proportion de valeurs égales
+    estime la similarité de Jaccard des jetons ;
+  - LSH : la signature est coupée en bandes de r valeurs ; deux questions qui
+    ont une bande identique sont candidates, puis vérifiées sur la signature
+    entière (et, quand on a les jetons, par le Jaccard exact : l'estimation
+    sert alors de préfiltre à ESTIMATE_MARGIN près). Chaque question ne touche
+    que sa case par bande, d'où un coût quasi linéaire.
+
+`duplicate_of` / `drop_near_duplicates` traitent un lot d'un coup ;
+`NearDuplicateIndex` est la version incrémentale, utilisée par la banque à
+chaque génération ajoutée. Les deux appliquent la même règle (comparaison aux
+seules questions gardées de chaque case, la plus proche l'emporte) : un lot
+recalculé d'un coup donne les mêmes doublons que les ajouts un par un.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+import zlib
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# « Que mange le (petit) chat ? -> le poisson » : 0,83 ; chat / chien : 0,67 (l'estimation à 128
+# valeurs a un écart type d'environ 0,03: le seuil est au milieu)
+NEAR_DUP_THRESHOLD = 0.75
+NUM_PERM = 128
+MINHASH_SEED = 20240601  # fixe: les signatures stockées dans la banque restent comparables
+ESTIMATE_MARGIN = 0.1  # avec les jetons: candidats estimés >= seuil - 0,1, puis Jaccard exact
+LSH_RECALL = 0.9  # probabilité minimale qu'une paire au seuil devienne candidate
+
+_STOPWORDS = {"le", "la", "les", "l", "un", "une", "des", "du", "de", "d", "au", "aux"}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercased, unaccented words of `text`, without articles, plural -s/-x/-nt dropped."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    words = []
+    for w in _WORD.findall(text):
+        if w in _STOPWORDS:
+            continue
+        if len(w) > 4 and w.endswith("ent"):
+            w = w[:-2]  # mangent -> mange
+        elif len(w) > 3 and w[-1] in "sx":
+            w = w[:-1]
+        words.append(w)
+    return words
+
+
+def question_tokens(question: str, answer: str) -> Set[str]:
+    """Token set of a question and its answer (the answer weighs half the question)."""
+    words = set(normalize_words(question))
+    answer_key = " ".join(normalize_words(answer)) or answer.strip().lower()
+    copies = max(2, math.ceil(len(words) / 2))
+    return words | {f"={answer_key}#{i}" for i in range(copies)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def lsh_params(threshold: float = NEAR_DUP_THRESHOLD, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """(bands, rows): the longest bands that still make a pair at `threshold` a candidate with LSH_RECALL."""
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= LSH_RECALL:
+            return bands, rows
+    return num_perm, 1
+
+
+class MinHasher:
+    """NUM_PERM multiply-shift hashes (a*x + b mod 2^32, a odd) drawn from a fixed seed; top 16 bits of the min."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = MINHASH_SEED):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32)
+
+    def signatures(self, token_sets: Sequence[Set[str]], chunk: int = 4096) -> np.ndarray:
+        """(n, num_perm) uint16 signatures, by chunks of `chunk` sets."""
+        out = np.empty((len(token_sets), self.num_perm), dtype=np.uint16)
+        for start in range(0, len(token_sets), chunk):
+            sets = token_sets[start:start + chunk]
+            sizes = np.array([max(len(s), 1) for s in sets], dtype=np.int64)
+            hashes = np.array([zlib.crc32(t.encode("utf-8")) for s in sets for t in (s or ("",))], dtype=np.uint32)
+            values = hashes[:, None] * self._a[None, :] + self._b[None, :]  # modulo 2^32 (débordement uint32)
+            offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            out[start:start + len(sets)] = np.minimum.reduceat(values, offsets, axis=0) >> 16
+        return out
+
+    def signature(self, question: str, answer: str) -> np.ndarray:
+        return self.signatures([question_tokens(question, answer)])[0]
+
+
+_HASHERS: Dict[int, MinHasher] = {}
+
+
+def get_minhasher(num_perm: int = NUM_PERM) -> MinHasher:
+    hasher = _HASHERS.get(num_perm)
+    if hasher is None:
+        hasher = _HASHERS[num_perm] = MinHasher(num_perm)
+    return hasher
+
+
+def qcm_tokens(qcms: Sequence[Any]) -> List[Set[str]]:
+    """Token sets of QCMs (question + correct answer)."""
+    return [question_tokens(q.question, q.choices[q.answer_index]) for q in qcms]
+
+
+_BAND_MULTIPLIERS: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _band_keys(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """(n, bands) uint64 key of each band (the band number is mixed in: one key space for all bands)."""
+    mult = _BAND_MULTIPLIERS.get((bands, rows))
+    if mult is None:
+        rng = np.random.RandomState(MINHASH_SEED + 1)
+        mult = _BAND_MULTIPLIERS[(bands, rows)] = (
+            rng.randint(1, 1 << 62, size=(bands, rows), dtype=np.int64).astype(np.uint64),
+            np.arange(bands, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+    sig = signatures[:, :bands * rows].astype(np.uint64).reshape(len(signatures), bands, rows)
+    return (sig * mult[0][None]).sum(axis=2, dtype=np.uint64) ^ mult[1][None, :]
+
+
+def duplicate_of(signatures: np.ndarray, threshold: float = NEAR_DUP_THRESHOLD,
+                 token_sets: Optional[Sequence[Set[str]]] = None) -> np.ndarray:
+    """
+    For each signature, the index of the earlier kept signature it duplicates (-1 when kept).
+    Greedy in order, with the same rule as NearDuplicateIndex + the bank: a question is only
+    compared with the kept questions sharing one of its band buckets, and is a duplicate of
+    the most similar one (lowest index on ties). Duplicates never enter a bucket, so a bucket
+    of identical questions holds a single representative and stays linear.
+    With the token sets, the similarity of the candidates is their exact Jaccard.
+    """
+    n = len(signatures)
+    dup = np.full(n, -1, dtype=np.int64)
+    if n < 2:
+        return dup
+    bands, rows = lsh_params(threshold, signatures.shape[1])
+    keys = _band_keys(signatures, bands, rows).tolist()
+    floor = threshold - ESTIMATE_MARGIN if token_sets is not None else threshold
+    kept: Dict[int, List[int]] = {}  # clé de bande -> questions gardées de cette case
+
+    for j in range(n):
+        cand = sorted({i for key in keys[j] for i in kept.get(key, ())})
+        best: Optional[Tuple[float, int]] = None
+        if cand:
+            sims = (signatures[cand] == signatures[j][None, :]).mean(axis=1)
+            for i, s in zip(cand, sims.tolist()):
+                if s < floor:
+                    continue
+                if token_sets is not None:
+                    s = jaccard(token_sets[i], token_sets[j])
+                if s >= threshold and (best is None or s > best[0]):
+                    best = (s, i)
+        if best is None:
+            for key in keys[j]:
+                kept.setdefault(key, []).append(j)
+        else:
+            dup[j] = best[1]
+    return dup
+
+
+def drop_near_duplicates(qcms: Sequence[Any], threshold: float = NEAR_DUP_THRESHOLD) -> Tuple[List[Any], List[Any]]:
+    """(kept, dropped) QCMs: a QCM is dropped when an earlier kept one is a near-duplicate."""
+    if len(qcms) < 2:
+        return list(qcms), []
+    tokens = qcm_tokens(qcms)
+    dup = duplicate_of(get_minhasher().signatures(tokens), threshold, tokens)
+    return [q for q, d in zip(qcms, dup) if d < 0], [q for q, d in zip(qcms, dup) if d >= 0]
+
+
+class NearDuplicateIndex:
+    """
+    Incremental LSH index over signatures.
+
+    Band keys live in sorted runs (one array of n*bands keys per run) merged like a
+    binary counter: a run is merged with the previous one when it is at least half
+    its size. A query is one searchsorted per run (O(log n) runs), an insertion costs
+    O(log n) amortized; the last few signatures wait in a small buffer scanned directly.
+    """
+
+    BUFFER = 256
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, num_perm: int = NUM_PERM):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._keys: List[Hashable] = []
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint16)
+        self._n = 0
+        self._runs: List[Tuple[np.ndarray, np.ndarray]] = []  # (clés triées, position de chaque clé)
+        self._buffer_keys = np.zeros((self.BUFFER, self.bands), dtype=np.uint64)
+        self._buffer_start = 0  # positions >= _buffer_start: dans le tampon
+        self._removed: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._n - len(self._removed)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of the signatures and band keys."""
+        return (self._signatures.nbytes + self._buffer_keys.nbytes
+                + sum(keys.nbytes + pos.nbytes for keys, pos in self._runs))
+
+    def _grow(self, extra: int) -> None:
+        if self._n + extra > len(self._signatures):
+            capacity = max(1024, 2 * len(self._signatures), self._n + extra)
+            grown = np.zeros((capacity, self.num_perm), dtype=np.uint16)
+            grown[:self._n] = self._signatures[:self._n]
+            self._signatures = grown
+
+    def _push_run(self, keys: np.ndarray, first: int) -> None:
+        pos = np.repeat(np.arange(first, first + len(keys), dtype=np.int32), self.bands)
+        keys = keys.ravel()
+        order = np.argsort(keys, kind="stable")
+        self._runs.append((keys[order], pos[order]))
+        while len(self._runs) > 1 and len(self._runs[-1][0]) * 2 >= len(self._runs[-2][0]):
+            (k2, p2), (k1, p1) = self._runs.pop(), self._runs.pop()
+            keys, pos = np.concatenate((k1, k2)), np.concatenate((p1, p2))
+            order = np.argsort(keys, kind="stable")
+            self._runs.append((keys[order], pos[order]))
+
+    def _flush(self) -> None:
+        count = self._n - self._buffer_start
+        if count:
+            self._push_run(self._buffer_keys[:count].copy(), self._buffer_start)
+        self._buffer_start = self._n
+
+    def extend(self, keys: Sequence[Hashable], signatures: np.ndarray) -> None:
+        """Index many signatures at once, without looking for their duplicates."""
+        if not len(keys):
+            return
+        self._flush()
+        self._grow(len(keys))
+        self._signatures[self._n:self._n + len(keys)] = signatures
+        self._push_run(_band_keys(np.asarray(signatures), self.bands, self.rows), self._n)
+        self._keys.extend(keys)
+        self._n += len(keys)
+        self._buffer_start = self._n
+
+    def query(self, signature: np.ndarray, threshold: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """
+        (key, estimated similarity) of the indexed near-duplicates of `signature`, most similar first.
+        `threshold` lowers the index threshold, for candidates checked afterwards (exact Jaccard).
+        """
+        signature = np.asarray(signature, dtype=np.uint16)
+        band_keys = _band_keys(signature[None, :], self.bands, self.rows)
+        needles = np.sort(band_keys[0])  # clés triées: searchsorted repart de la précédente
+        found = []
+        for keys, pos in self._runs:
+            lo = keys.searchsorted(needles)
+            hit = keys[np.minimum(lo, len(keys) - 1)] == needles  # presque toujours aucune: une recherche suffit
+            if hit.any():
+                hi = keys.searchsorted(needles[hit], side="right")
+                found.extend(pos[a:b] for a, b in zip(lo[hit].tolist(), hi.tolist()))
+        count = self._n - self._buffer_start
+        if count:
+            hits = np.flatnonzero((self._buffer_keys[:count] == band_keys).any(axis=1))
+            found.append(hits + self._buffer_start)
+        if not found:
+            return []
+        cand = np.unique(np.concatenate(found))
+        sims = (self._signatures[cand] == signature[None, :]).mean(axis=1)
+        close = np.flatnonzero(sims >= (self.threshold if threshold is None else threshold))
+        close = close[np.argsort(-sims[close], kind="stable")]
+        return [(self._keys[c], float(s)) for c, s in zip(cand[close].tolist(), sims[close].tolist())
+                if c not in self._removed]
+
+    def insert(self, key: Hashable, signature: np.ndarray) -> None:
+        """Index `signature` under `key`."""
+        if self._n - self._buffer_start == self.BUFFER:
+            self._flush()
+        self._grow(1)
+        self._signatures[self._n] = signature
+        self._buffer_keys[self._n - self._buffer_start] = _band_keys(
+            np.asarray(signature, dtype=np.uint16)[None, :], self.bands, self.rows)[0]
+        self._keys.append(key)
+        self._n += 1
+
+    def add(self, key: Hashable, signature: np.ndarray) -> List[Tuple[Hashable, float]]:
+        """Near-duplicates of `signature` already indexed, then index it under `key`."""
+        matches = self.query(signature)
+        self.insert(key, signature)
+        return matches
+
+    def discard(self, keys: Sequence[Hashable]) -> None:
+        """Stop returning `keys` (their slots stay in the index)."""
+        wanted = set(keys)
+        self._removed.update(p for p, k in enumerate(self._keys) if k in wanted)
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return np.asarray(signature, dtype="<u2").tobytes()
+
+
+def signatures_from_bytes(blobs: Sequence[bytes], num_perm: int = NUM_PERM) -> np.ndarray:
+    """(n, num_perm) signatures from their stored bytes."""
+    return np.frombuffer(b"".join(blobs), dtype="<u2").reshape(len(blobs), num_perm).astype(np.uint16)
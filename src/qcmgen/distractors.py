@@ -0,0 +1,182 @@
+"""
+Moteur de distracteurs par similarité de vecteurs (vecteurs de mots spaCy).
+
+Tous les termes candidats (termes qui ont un picto) sont plongés une fois dans
+une matrice normalisée, rangée par catégorie. Pour un lot de bonnes réponses,
+un produit matriciel par catégorie donne toutes les similarités ; on garde les
+k termes de la même catégorie dont la similarité tombe dans une bande [low, high] :
+assez proches pour être plausibles, pas trop pour ne pas être des synonymes.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from qcmgen.pictos.resolve import _cache_items, lookup_cached_picto, normalize_term
+
+VectorFn = Callable[[str], np.ndarray]
+
+DEFAULT_BAND = (0.2, 0.85)
+
+# tags ARASAAC utilisés comme catégorie, par priorité
+DEFAULT_CACHE_TAGS = (
+    "animal", "food", "drink", "clothes", "furniture", "vehicle",
+    "color", "weather", "sport", "musical instrument", "body", "place", "profession",
+)
+
+
+def spacy_vector_fn(nlp) -> VectorFn:
+    """Vector of a (possibly multi-word) term: mean of the word vectors from the model vocab."""
+    def vector_of(term: str) -> np.ndarray:
+        words = [w for w in term.strip().lower().split() if w]
+        vecs = [nlp.vocab.get_vector(w) for w in words]
+        vecs = [v for v in vecs if v is not None and np.any(v)]
+        if not vecs:
+            return np.zeros(nlp.vocab.vectors_length, dtype=np.float32)
+        return np.mean(vecs, axis=0).astype(np.float32)
+    return vector_of
+
+
+class VectorDistractorEngine:
+    """
+    Precomputed, L2-normalized embedding matrix over candidate terms,
+    with one category label per term.
+    """
+
+    def __init__(self, terms: Sequence[str], categories: Sequence[str], vector_fn: VectorFn,
+                 picto_ids: Optional[Sequence[int]] = None):
+        self.vector_fn = vector_fn
+
+        rows, keep = [], []
+        for i, term in enumerate(terms):
+            v = np.asarray(vector_fn(term), dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            if norm > 0:
+                rows.append(v / norm)
+                keep.append(i)
+
+        dim = rows[0].shape[0] if rows else 0
+        self.matrix = np.vstack(rows) if rows else np.zeros((0, dim), dtype=np.float32)
+        self.terms = [terms[i] for i in keep]
+        self._term_norms = [normalize_term(t) for t in self.terms]
+
+        self.category_names = sorted(set(categories[i] for i in keep))
+        cat_ids = {c: n for n, c in enumerate(self.category_names)}
+        self._cat_ids = np.array([cat_ids[categories[i]] for i in keep], dtype=np.int32)
+        self._cat_index = cat_ids
+        self._cat_rows = [np.flatnonzero(self._cat_ids == n) for n in range(len(self.category_names))]
+        self._cat_matrices = [self.matrix[r] for r in self._cat_rows]  # un bloc contigu par catégorie
+
+        ids = [picto_ids[i] for i in keep] if picto_ids is not None else [-1 - i for i in range(len(keep))]
+        self._picto_ids = np.array(ids, dtype=np.int64)
+        self._cat_picto_ids = [self._picto_ids[r] for r in self._cat_rows]
+
+        self._row_of: Dict[str, int] = {}
+        for row, t in enumerate(self._term_norms):
+            self._row_of.setdefault(t, row)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @classmethod
+    def from_categories(cls, categories: Dict[str, List[str]], vector_fn: VectorFn,
+                        require_picto: bool = True, lang: str = "fr") -> "VectorDistractorEngine":
+        """Build from {category: [terms]} (e.g. scripts/categories.json)."""
+        terms, cats, ids = [], [], []
+        for cat, words in categories.items():
+            for w in words:
+                picto = lookup_cached_picto(w, lang=lang)
+                if require_picto and picto is None:
+                    continue
+                terms.append(w)
+                cats.append(cat)
+                ids.append(picto.picto_id if picto else -1 - len(ids))
+        return cls(terms, cats, vector_fn, picto_ids=ids)
+
+    @classmethod
+    def from_cache(cls, vector_fn: VectorFn, lang: str = "fr",
+                   tags: Iterable[str] = DEFAULT_CACHE_TAGS) -> "VectorDistractorEngine":
+        """Build from every cached picto, labelled with its first matching tag."""
+        tags = list(tags)
+        terms, cats, ids, seen = [], [], [], set()
+        for term_norm, hit in _cache_items(lang):
+            hit_tags = [str(t).strip().lower() for t in (hit.get("tags") or [])]
+            cat = next((t for t in tags if t in hit_tags), None)
+            if cat is None or "verb" in hit_tags or not hit.get("url"):
+                continue
+            term = hit.get("keyword") or term_norm
+            picto_id = int(hit.get("picto_id", -1))
+            if picto_id in seen:
+                continue  # un seul terme par picto (chat / chats)
+            seen.add(picto_id)
+            terms.append(term)
+            cats.append(cat)
+            ids.append(picto_id)
+        return cls(terms, cats, vector_fn, picto_ids=ids)
+
+    def category_of(self, term: str) -> Optional[str]:
+        row = self._row_of.get(normalize_term(term))
+        return self.category_names[self._cat_ids[row]] if row is not None else None
+
+    def _answer_matrix(self, answers: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        dim = self.matrix.shape[1]
+        out = np.zeros((len(answers), dim), dtype=np.float32)
+        rows = np.full(len(answers), -1, dtype=np.int64)
+        for i, a in enumerate(answers):
+            row = self._row_of.get(normalize_term(a))
+            if row is not None:
+                out[i] = self.matrix[row]
+                rows[i] = row
+                continue
+            v = np.asarray(self.vector_fn(a), dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            if norm > 0:
+                out[i] = v / norm
+        return out, rows
+
+    def pick(self, answers: Sequence[str], categories: Sequence[Optional[str]], k: int = 3,
+             band: Tuple[float, float] = DEFAULT_BAND) -> List[List[str]]:
+        """
+        Pick up to k distractors per answer, in the answer's category, with cosine
+        similarity in [band[0], band[1]], most similar first.
+        Answers are grouped by category: each group costs one (B x d) @ (d x N_cat)
+        product plus an argpartition, whatever the size of the batch.
+        """
+        out: List[List[str]] = [[] for _ in answers]
+        if not answers or len(self) == 0:
+            return out
+
+        A, rows = self._answer_matrix(answers)
+        answer_norms = [normalize_term(a) for a in answers]
+
+        groups: Dict[int, List[int]] = {}
+        for b, c in enumerate(categories):
+            cat_id = self._cat_index.get(c) if c else None
+            if cat_id is not None:
+                groups.setdefault(cat_id, []).append(b)
+
+        for cat_id, batch in groups.items():
+            cat_rows = self._cat_rows[cat_id]
+            sims = A[batch] @ self._cat_matrices[cat_id].T  # (B_cat, N_cat)
+
+            valid = (sims >= band[0]) & (sims <= band[1])
+            # exclure la bonne réponse elle-même (même picto)
+            answer_ids = np.array([self._picto_ids[rows[b]] if rows[b] >= 0 else np.iinfo(np.int64).min for b in batch])
+            valid &= self._cat_picto_ids[cat_id][None, :] != answer_ids[:, None]
+
+            scores = np.where(valid, sims, -np.inf)
+            kk = min(scores.shape[1], k + 1)  # +1 au cas où un homonyme de la réponse passe le filtre
+            top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+
+            for g, b in enumerate(batch):
+                cand = top[g][np.argsort(-scores[g, top[g]])]
+                for j in cand:
+                    row = cat_rows[j]
+                    if not np.isfinite(scores[g, j]) or self._term_norms[row] == answer_norms[b]:
+                        continue
+                    out[b].append(self.terms[row])
+                    if len(out[b]) == k:
+                        break
+        return out
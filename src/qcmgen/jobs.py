@@ -0,0 +1,134 @@
+"""
+Tâches de fond (génération d'une fiche, préchargements) exécutées dans un pool
+de threads partagé par le processus.
+
+Une tâche reçoit son objet `BackgroundJob` : elle y publie sa progression
+(`report(stage, done, total)`) et vérifie l'annulation, qui est coopérative :
+`report` / `check_cancelled` lèvent `JobCancelled` une fois `cancel()` appelé.
+L'interface lit l'état de la tâche à chaque rerun et récupère `result` à la fin.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+JOB_WORKERS = int(os.environ.get("QCMGEN_JOB_WORKERS", "4"))
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled."""
+
+
+class BackgroundJob:
+    """
+    State of one unit of work: status (pending, running, done, failed, cancelled),
+    current stage with done/total counters, and the result or error.
+    """
+
+    def __init__(self, fn: Callable[["BackgroundJob"], Any], key: Any = None, name: str = "job"):
+        self.fn = fn
+        self.key = key
+        self.name = name
+        self.status = "pending"
+        self.stage: Optional[str] = None
+        self.done = 0
+        self.total = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._future: Optional[Future] = None
+
+    def _run(self) -> None:
+        if self._cancel.is_set():
+            self.status = "cancelled"
+            self._finish()
+            return
+        self.status = "running"
+        try:
+            self.result = self.fn(self)
+            self.status = "done"
+        except JobCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+            print(f"Job '{self.name}' failed: {e}")
+            traceback.print_exc()
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        self.finished_at = time.monotonic()
+        self._finished.set()
+
+    def cancel(self) -> None:
+        """Ask the job to stop (it stops at its next report/check_cancelled)."""
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            # pas encore démarrée: elle ne tournera jamais
+            self.status = "cancelled"
+            self._finish()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def report(self, stage: str, done: int = 0, total: int = 0) -> None:
+        """Publish progress (called from the job); also a cancellation point."""
+        self.check_cancelled()
+        self.stage = stage
+        self.done = done
+        self.total = total
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def fraction(self) -> Optional[float]:
+        """done / total of the current stage, None when the stage has no known total."""
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.submitted_at
+
+
+class JobRunner:
+    """Thread pool running BackgroundJobs (one per process, see get_job_runner)."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qcmgen-job")
+
+    def submit(self, fn: Callable[[BackgroundJob], Any], key: Any = None, name: str = "job") -> BackgroundJob:
+        job = BackgroundJob(fn, key=key, name=name)
+        job._future = self._executor.submit(job._run)
+        return job
+
+
+_RUNNERS: Dict[str, JobRunner] = {}
+_RUNNERS_LOCK = threading.Lock()
+
+
+def get_job_runner(pool: str = "default") -> JobRunner:
+    """Process-wide job runner (separate pools keep e.g. prefetch work from delaying generations)."""
+    with _RUNNERS_LOCK:
+        runner = _RUNNERS.get(pool)
+        if runner is None:
+            runner = JobRunner()
+            _RUNNERS[pool] = runner
+        return runner
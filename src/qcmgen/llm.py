@@ -1,17 +1,47 @@
 from random import sample
-from dotenv import load_dotenv
 from pathlib import Path
 import os
 import sys
 import json
-from openai import OpenAI
 import random
-from qcmgen.qcm import QCM
+from contextlib import nullcontext
+from qcmgen.deadline import Deadline
+from qcmgen.metrics import incr, span
+from qcmgen.qcm import QCM, ChoicePicto, default_picto_resolver
+from qcmgen.pictos.resolve import lookup_cached_picto
 
 
-def generate_qcms_from_text_llm(text: str, items: dict = {}) -> list:
+def _verified_category(words: list, lang: str = "fr") -> list:
+    """(word, ChoicePicto) for the category words that have a picto in the local cache."""
+    out = []
+    for w in words:
+        r = lookup_cached_picto(w, lang=lang)
+        if r is not None:
+            out.append((w, ChoicePicto(picto_id=r.picto_id, url=r.url, variant=r.term)))
+    return out
+
+
+def generate_qcms_from_text_llm(text: str, items: dict = {}, require_pictos: bool = False, picto_resolver=None,
+                                distractor_engine=None, deadline: Deadline = None) -> list:
+    """
+    With a deadline, the LLM call gets the remaining budget as timeout (skipped, and
+    recorded in deadline.cut, when nothing is left) and picto resolution is bounded
+    as in payloads_to_qcms.
+    """
+    with deadline.activate() if deadline is not None else nullcontext():
+        return _generate_qcms_from_text_llm(text, items, require_pictos, picto_resolver, distractor_engine, deadline)
+
+
+def _generate_qcms_from_text_llm(text: str, items: dict, require_pictos: bool, picto_resolver,
+                                 distractor_engine, deadline) -> list:
 
     if items == {}:
+        if deadline is not None and not deadline.check("llm"):
+            return []
+
+        from dotenv import load_dotenv
+        from openai import APITimeoutError, OpenAI
+
         # get api key and setup client
         project_root = Path(__file__).parent.parent
         sys.path.insert(0, str(project_root) + "/qcmgen")
@@ -24,16 +54,28 @@ def generate_qcms_from_text_llm(text: str, items: dict = {}) -> list:
         # Load prompt
         llm_prompt = open(project_root.parent / "scripts" / "llm_prompt.txt").read().strip()
 
-        client = OpenAI(api_key=api_key)
+        bounded = deadline is not None and deadline.budget_s is not None
+        client = OpenAI(api_key=api_key, max_retries=0) if bounded else OpenAI(api_key=api_key)
 
         # call llm
         sentences = [s.strip() for s in text.split('.')]
-        resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=llm_prompt,
-        input="\n".join(f"- {s}" for s in sentences),
-        #response_format={"type": "json"}
-        )
+        extra = {"timeout": deadline.remaining()} if bounded else {}
+        try:
+            with span("llm"):
+                resp = client.responses.create(
+                model="gpt-4o-mini",
+                instructions=llm_prompt,
+                input="\n".join(f"- {s}" for s in sentences),
+                #response_format={"type": "json"}
+                **extra,
+                )
+        except APITimeoutError as e:
+            if not extra:
+                raise
+            # budget épuisé pendant l'appel: pas de questions LLM pour cette génération
+            print(f"LLM call cut by the generation deadline: {e}")
+            deadline.mark_cut("llm")
+            return []
         
         # clean response and convert to json
         raw = resp.output_text
@@ -44,22 +86,65 @@ def generate_qcms_from_text_llm(text: str, items: dict = {}) -> list:
         output_json = items
 
     # Import categories for distractors
+    project_root = Path(__file__).parent.parent
     CATEGORIES = json.loads((project_root.parent / "scripts" / "categories.json").read_text())
 
+    # distracteurs par similarité (VectorDistractorEngine): un seul lot pour toutes les questions
+    engine_picks = {}
+    if distractor_engine is not None:
+        questions = [q for item in output_json for q in item.get("questions", []) if "answer" in q]
+        with span("distractors"):
+            picks = distractor_engine.pick([q["answer"] for q in questions], [q.get("category") for q in questions], k=3)
+        engine_picks = {id(q): p for q, p in zip(questions, picks) if len(p) == 3}
+
     # build QCMs with distractors
+    verified_pools = {}
     all_qcms = []
     for item in output_json:
         qcms = []
         for question in item.get("questions", []):
 
-            try:
+            category = question.get("category")
+            if category not in CATEGORIES:
+                # vérifié avant de résoudre la réponse: pas de requête ARASAAC pour une question perdue
+                print(f'LLM hallucinated a new category: {category}')
+                continue
 
-                # generate distractors from category
-                distractor_candidates = [elt for elt in CATEGORIES[question["category"]] if elt != question["answer"]]
-                distractors = random.sample(distractor_candidates, k=3)
+            try:
 
-                choices = distractors + [question["answer"]]
-                random.shuffle(choices)
+                pictos = None
+                if require_pictos:
+                    # bonne réponse vérifiée d'abord, distracteurs tirés du pool "picto-vérifié" de la catégorie
+                    answer_picto = (picto_resolver or default_picto_resolver)(question["answer"])
+                    if answer_picto is None:
+                        incr("questions_dropped")
+                        continue
+                    pool = verified_pools.get(category)
+                    if pool is None:  # construit une fois par catégorie et par lot
+                        pool = verified_pools[category] = _verified_category(CATEGORIES[category])
+                    verified = [(w, p) for w, p in pool
+                                if w != question["answer"] and p.picto_id != answer_picto.picto_id]
+                    if len(verified) < 3:
+                        incr("questions_dropped")
+                        continue
+                    by_word = dict(verified)
+                    picked = engine_picks.get(id(question))
+                    if picked and all(w in by_word for w in picked):
+                        distractors = [(w, by_word[w]) for w in picked]
+                    else:
+                        distractors = random.sample(verified, k=3)
+                    pairs = distractors + [(question["answer"], answer_picto)]
+                    random.shuffle(pairs)
+                    choices = [w for w, _ in pairs]
+                    pictos = [p for _, p in pairs]
+
+                else:
+                    # generate distractors from category
+                    distractor_candidates = [elt for elt in CATEGORIES[category] if elt != question["answer"]]
+                    distractors = engine_picks.get(id(question)) or random.sample(distractor_candidates, k=3)
+
+                    choices = distractors + [question["answer"]]
+                    random.shuffle(choices)
 
                 qcms.append(
                     QCM(
@@ -68,7 +153,8 @@ def generate_qcms_from_text_llm(text: str, items: dict = {}) -> list:
                         answer_index=choices.index(question["answer"]),
                         qtype=question.get("qtype", question["category"]),
                         rationale=question.get("rationale", ""),
-                        paragraph=item["sentence"]
+                        paragraph=item["sentence"],
+                        pictos=pictos,
                     )
                 )
 
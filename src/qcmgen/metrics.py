@@ -0,0 +1,166 @@
+"""
+Instrumentation : durées par étape (spans) et compteurs.
+
+    with span("parse"):
+        ...
+    @timed("resolve")
+    def resolve_term_to_picto(...): ...
+    incr("picto_cache_hits")
+
+Deux niveaux :
+- les totaux du processus (`get_metrics()`), exportables en JSON (`to_json`) ou
+  au format texte de Prometheus (`to_prometheus`) ;
+- la trace d'une génération (`Trace`), activée comme qcmgen.deadline avec
+  `with trace.activate():`, affichée en mode debug dans l'app.
+
+Les spans s'imbriquent (la résolution d'un picto pendant le choix des
+distracteurs, par exemple) : `seconds` est le temps total d'une étape,
+`self_seconds` ce temps moins celui des étapes imbriquées, si bien que la somme
+des `self_seconds` donne le temps instrumenté sans double compte.
+"""
+
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+_TRACE: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("qcmgen_trace", default=None)
+# temps passé dans les spans enfants du span en cours (pour self_seconds)
+_CHILDREN: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("qcmgen_span", default=None)
+
+# étapes instrumentées (ordre d'affichage)
+STAGES = ["generation", "parse", "payloads", "distractors", "resolve", "arasaac", "llm", "pdf"]
+
+
+class Metrics:
+    """Span statistics (calls, total / self / max seconds) and counters, thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+
+    def add_span(self, name: str, seconds: float, self_seconds: float) -> None:
+        with self._lock:
+            s = self.spans.get(name)
+            if s is None:
+                s = self.spans[name] = {"calls": 0, "seconds": 0.0, "self_seconds": 0.0, "max_seconds": 0.0}
+            s["calls"] += 1
+            s["seconds"] += seconds
+            s["self_seconds"] += self_seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+
+    def incr(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"spans": {k: dict(v) for k, v in self.spans.items()}, "counters": dict(self.counters)}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One row per stage, known stages first, for display."""
+        spans = self.snapshot()["spans"]
+        order = [s for s in STAGES if s in spans] + sorted(s for s in spans if s not in STAGES)
+        return [dict(stage=name, calls=int(spans[name]["calls"]),
+                     ms=round(spans[name]["seconds"] * 1000, 1),
+                     self_ms=round(spans[name]["self_seconds"] * 1000, 1),
+                     max_ms=round(spans[name]["max_seconds"] * 1000, 1)) for name in order]
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=1, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = "qcmgen") -> str:
+        """Prometheus text exposition format (counters, plus the max as a gauge)."""
+        snap = self.snapshot()
+        lines = []
+
+        def family(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value:g}")
+
+        spans = sorted(snap["spans"].items())
+        family("stage_calls_total", "counter", "Calls per pipeline stage.",
+               [(f'{{stage="{k}"}}', v["calls"]) for k, v in spans])
+        family("stage_seconds_total", "counter", "Time per pipeline stage, nested stages included.",
+               [(f'{{stage="{k}"}}', v["seconds"]) for k, v in spans])
+        family("stage_self_seconds_total", "counter", "Time per pipeline stage, nested stages excluded.",
+               [(f'{{stage="{k}"}}', v["self_seconds"]) for k, v in spans])
+        family("stage_max_seconds", "gauge", "Longest single call per pipeline stage.",
+               [(f'{{stage="{k}"}}', v["max_seconds"]) for k, v in spans])
+        for name, value in sorted(snap["counters"].items()):
+            family(f"{name}_total", "counter", name.replace("_", " ").capitalize() + ".", [("", value)])
+        return "\n".join(lines) + "\n"
+
+
+class Trace(Metrics):
+    """Metrics of one generation, collected while activated (in the calling thread)."""
+
+    @contextmanager
+    def activate(self):
+        token = _TRACE.set(self)
+        try:
+            yield self
+        finally:
+            _TRACE.reset(token)
+
+
+_METRICS = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Process-wide totals."""
+    return _METRICS
+
+
+def current_trace() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+def incr(name: str, n: float = 1) -> None:
+    """Add n to a counter (process totals and the active trace)."""
+    _METRICS.incr(name, n)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.incr(name, n)
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as stage `name`."""
+    children = [0.0]
+    parent = _CHILDREN.get()
+    token = _CHILDREN.set(children)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _CHILDREN.reset(token)
+        if parent is not None:
+            parent[0] += elapsed
+        _METRICS.add_span(name, elapsed, elapsed - children[0])
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.add_span(name, elapsed, elapsed - children[0])
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
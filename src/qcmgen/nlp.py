@@ -1,20 +1,49 @@
 from __future__ import annotations
+import re
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
-import spacy
-from spacy.tokens import Span, Token
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, List, Tuple
+
+from qcmgen.deadline import Deadline
+from qcmgen.metrics import timed
+
+if TYPE_CHECKING:
+    from spacy.tokens import Span, Token
 
 
 _NLP = None
+_NLP_LOCK = threading.Lock()
 
 def get_nlp():
-    """Load and return the SpaCy NLP model for French."""
+    """Load and return the SpaCy NLP model for French (loaded once, even from several threads)."""
 
     global _NLP
     if _NLP is None:
-        _NLP = spacy.load("fr_core_news_md")
+        with _NLP_LOCK:
+            if _NLP is None:
+                import spacy  # ~0.6 s d'import: seulement au premier chargement du modèle
+
+                _NLP = spacy.load("fr_core_news_md")
     return _NLP
 
+def lemmatize_terms(terms: Iterable[str]) -> Dict[str, str]:
+    """
+    Lemmatize many short terms (QCM choices) in one batched SpaCy pass.
+    Returns {term: lemma}; determiners and punctuation are dropped,
+    e.g. "les chats" -> "chat", "mange" -> "manger".
+    """
+
+    nlp = get_nlp()
+    unique_terms = list(dict.fromkeys(t for t in terms if t and t.strip()))
+    disabled = [name for name in ("parser", "ner") if name in nlp.pipe_names]
+
+    lemmas: Dict[str, str] = {}
+    for term, doc in zip(unique_terms, nlp.pipe(unique_terms, disable=disabled)):
+        words = [(t.lemma_ or t.text).lower() for t in doc if not (t.is_punct or t.is_space or t.pos_ == "DET")]
+        lemmas[term] = " ".join(words) if words else term.strip().lower()
+    return lemmas
+
 @dataclass
 class Fact:
     sent_text: str #texte brut de la phrase
@@ -25,13 +54,36 @@ class Fact:
     obj_head: Optional[str] #nom principal de l'objet ex: "ballon"
     adj_pairs: List[Tuple[str, str]] #liste de paires (nom, adjectif) associées dans la phrase
 
-def extract_facts(text: str) -> List[Fact]:
-    """Extract facts from the given text using SpaCy NLP."""
+# les paragraphes (séparés par une ligne vide) sont analysés un par un: une phrase ne les traverse pas
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
 
+def _sentences(text: str, deadline: Optional[Deadline] = None) -> Iterator[Span]:
+    """
+    Sentences of the text, parsed paragraph by paragraph (nlp.pipe, one at a time):
+    with a deadline, no paragraph is parsed once the budget is spent. The parse of
+    a single paragraph is not interruptible, so one long paragraph can overrun it.
+    """
+    paragraphs = [p for p in _PARAGRAPH_BREAK.split(text) if p.strip()]
     nlp = get_nlp()
-    doc = nlp(text)
+    for doc in nlp.pipe(paragraphs, batch_size=1):
+        for sent in doc.sents:
+            if deadline is not None and not deadline.check("extract_facts"):
+                return
+            yield sent
+        if deadline is not None and not deadline.check("extract_facts"):
+            return
+
+@timed("parse")
+def extract_facts(text: str, deadline: Optional[Deadline] = None) -> List[Fact]:
+    """Extract facts from the given text using SpaCy NLP.
+    With a deadline, stops before the first paragraph or sentence that starts after
+    the budget is spent (see _sentences)."""
+
     facts: List[Fact] = []
-    for sent in doc.sents:
+    if deadline is not None and not deadline.check("extract_facts"):
+        return facts
+
+    for sent in _sentences(text, deadline):
         subj = None
         verb_lemma = None
         verb_text = None
@@ -83,6 +135,28 @@ def extract_facts(text: str) -> List[Fact]:
 
     return facts
 
+# faits déjà extraits, par texte (préparés pendant la saisie, voir qcmgen.pipeline.prefetch_worksheet)
+FACTS_CACHE_SIZE = 128
+_FACTS_CACHE: "OrderedDict[str, List[Fact]]" = OrderedDict()
+_FACTS_LOCK = threading.Lock()
+
+def extract_facts_cached(text: str, deadline: Optional[Deadline] = None) -> List[Fact]:
+    """extract_facts with a small per-process LRU cache keyed by the text (complete results only)."""
+    key = text.strip()
+    with _FACTS_LOCK:
+        hit = _FACTS_CACHE.get(key)
+        if hit is not None:
+            _FACTS_CACHE.move_to_end(key)
+            return list(hit)
+
+    facts = extract_facts(text, deadline=deadline)
+    if deadline is None or "extract_facts" not in deadline.cut:
+        with _FACTS_LOCK:
+            _FACTS_CACHE[key] = list(facts)
+            while len(_FACTS_CACHE) > FACTS_CACHE_SIZE:
+                _FACTS_CACHE.popitem(last=False)
+    return facts
+
 def robust_subj_extraction(sent: Span) -> Optional[Token]:
     """Extract the subject of a sentence, with robustness to certain structures."""
 
@@ -0,0 +1,88 @@
+"""
+Export PDF d'une fiche de QCM (une rangée de pictos par question).
+
+Indépendant de Streamlit pour pouvoir être appelé par l'app comme par les
+scripts (ex: scripts/bench_pipeline.py). requests, fpdf et PIL ne sont importés
+qu'au premier export.
+"""
+
+import tempfile
+from io import BytesIO
+
+from qcmgen.metrics import incr, timed
+from qcmgen.pictos.arasaac_client import static_url
+from qcmgen.profiling import profiled
+
+
+def _download_picto_to_file(url: str) -> str | None:
+    if not url:
+        return None
+    import requests
+    from PIL import Image
+
+    r = requests.get(static_url(url), timeout=10)
+    incr("bytes_downloaded", len(r.content))
+    if r.status_code != 200:
+        return None
+
+    img = Image.open(BytesIO(r.content)).convert("RGB")
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
+    img.save(tmp.name, "JPEG")
+    return tmp.name
+
+
+@timed("pdf")
+def build_pdf(qcms, edited_questions) -> bytes:
+    # profilé si QCMGEN_PROFILE est actif (qcmgen.profiling)
+    with profiled("pdf", "\n".join(q.question for q in qcms)):
+        return _build_pdf(qcms, edited_questions)
+
+
+def _build_pdf(qcms, edited_questions) -> bytes:
+    from fpdf import FPDF
+
+    pdf = FPDF(unit="mm", format="A4")
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=13)
+
+    for i, q in enumerate(qcms, start=1):
+        paragraph = q.paragraph or ""
+        question = edited_questions.get(f"edit_qcm_{i}", q.question)
+
+        if paragraph:
+            pdf.set_font("Helvetica", style="", size=11)
+            pdf.multi_cell(0, 6, f"Contexte: {paragraph}")
+            pdf.ln(1)
+
+        pdf.set_font("Helvetica", style="B", size=13)
+        pdf.multi_cell(0, 8, f"{i}. {question}")
+        pdf.ln(2)
+
+        pdf.set_font("Helvetica", size=11)
+        # Affichage des choix sur une seule ligne (4 pictos)
+        urls = q.picto_urls()
+        img_size = 18
+        cell_width = 45  # largeur par picto + texte
+
+        start_x = pdf.get_x()
+        y = pdf.get_y()
+
+        for j, choice in enumerate(q.choices):
+            x = start_x + j * cell_width
+            pdf.set_xy(x, y)
+
+            url = urls[j] if j < len(urls) else None
+            img_path = _download_picto_to_file(url)
+
+            if img_path:
+                pdf.image(img_path, x=x, y=y, w=img_size, h=img_size)
+                pdf.set_xy(x + img_size + 2, y + 5)
+                #pdf.cell(cell_width - img_size - 2, 6, choice)
+            #else:
+                #pdf.cell(cell_width, 6, choice)
+
+        # sauter une ligne après la rangée
+        pdf.ln(img_size + 6)
+
+    return pdf.output(dest="S").encode("latin1")
@@ -1,26 +1,189 @@
-import requests
-from typing import List, Dict
+from __future__ import annotations
 
-ARASAAC_SEARCH_URL = "https://api.arasaac.org/v1/pictograms/{lang}/search/{term}"
-ARASAAC_PICTO_URL = "https://static.arasaac.org/pictograms/{id}/{id}_500.png"
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, List, Dict, Optional
+
+from qcmgen.deadline import current_deadline
+from qcmgen.metrics import incr, span
+
+if TYPE_CHECKING:
+    import requests  # importé au premier appel réseau (cache-only: jamais)
+
+# URLs de base configurables (ex: serveur local de test, voir scripts/fake_arasaac_server.py)
+_PUBLIC_STATIC_BASE = "https://static.arasaac.org"  # celle des URLs stockées dans le cache
+ARASAAC_API_BASE = os.environ.get("ARASAAC_API_BASE", "https://api.arasaac.org/v1").rstrip("/")
+ARASAAC_STATIC_BASE = os.environ.get("ARASAAC_STATIC_BASE", _PUBLIC_STATIC_BASE).rstrip("/")
+
+ARASAAC_SEARCH_URL = ARASAAC_API_BASE + "/pictograms/{lang}/search/{term}"
+# toujours la base publique: une URL mise en cache ne doit pas pointer vers un serveur de test,
+# la base configurée n'est appliquée qu'au téléchargement (static_url)
+ARASAAC_PICTO_URL = _PUBLIC_STATIC_BASE + "/pictograms/{id}/{id}_500.png"
+
+ARASAAC_TIMEOUT_S = float(os.environ.get("ARASAAC_TIMEOUT_S", "5.0"))
+# ARASAAC_OFFLINE=1: jamais d'appel réseau, résolution depuis le cache local uniquement
+ARASAAC_OFFLINE = os.environ.get("ARASAAC_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+# Session HTTP partagée (keep-alive), installée par l'app au démarrage
+_DEFAULT_SESSION: Optional[requests.Session] = None
+
+
+def set_default_session(session: Optional[requests.Session]) -> None:
+    """Use a shared requests.Session for every client created afterwards."""
+    global _DEFAULT_SESSION
+    _DEFAULT_SESSION = session
+
+
+def static_url(url: str) -> str:
+    """Image URL to fetch, served from ARASAAC_STATIC_BASE (stored URLs point to the public CDN)."""
+    if url and ARASAAC_STATIC_BASE != _PUBLIC_STATIC_BASE and url.startswith(_PUBLIC_STATIC_BASE + "/"):
+        return ARASAAC_STATIC_BASE + url[len(_PUBLIC_STATIC_BASE):]
+    return url
+
+
+class ArasaacUnavailable(Exception):
+    """ARASAAC did not answer (timeout, connection error, 5xx) or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Trips after `failure_threshold` consecutive failures and then fails fast for
+    `cooldown` seconds. After the cool-down a single trial call is let through
+    (half-open): a success closes the circuit, a failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def is_open(self) -> bool:
+        """True while calls are refused (open, or half-open with the trial call in flight)."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            return self._trial_running or time.monotonic() - self._opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True  # half-open: un seul appel d'essai
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"ARASAAC circuit opened after {self._failures} failures (cache-only for {self.cooldown:.0f}s)")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self) -> None:
+        """Call abandoned by the caller (neither success nor failure): let another trial through."""
+        with self._lock:
+            self._trial_running = False
+
+    def reset(self) -> None:
+        self.record_success()
+
+
+_BREAKER = CircuitBreaker(
+    failure_threshold=int(os.environ.get("ARASAAC_BREAKER_FAILURES", "3")),
+    cooldown=float(os.environ.get("ARASAAC_BREAKER_COOLDOWN_S", "30")),
+)
+
+
+def get_breaker() -> CircuitBreaker:
+    """Process-wide circuit breaker shared by every ArasaacClient."""
+    return _BREAKER
+
+
+def is_cache_only() -> bool:
+    """True when resolution must not touch the network (offline mode, open circuit or generation deadline reached)."""
+    deadline = current_deadline()
+    return ARASAAC_OFFLINE or _BREAKER.is_open() or (deadline is not None and deadline.expired())
 
 
 class ArasaacClient:
-    def __init__(self, lang: str = "fr", timeout: float = 5.0):
+    def __init__(self, lang: str = "fr", timeout: float = ARASAAC_TIMEOUT_S, session: Optional[requests.Session] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.lang = lang
         self.timeout = timeout
+        self.session = session
+        self.breaker = breaker or _BREAKER
 
     def search(self, term: str, limit: int = 5) -> List[Dict]:
         """
         Search pictograms for a term.
         Returns a list of dicts with at least: id, keywords
+        Raises ArasaacUnavailable on timeout / connection error / 5xx, or without
+        any network call while the circuit breaker is open or once the ambient
+        generation deadline (qcmgen.deadline) is reached.
         """
         term = term.strip().lower()
         if not term:
             return []
 
+        # le timeout est borné par le budget restant de la génération en cours
+        deadline = current_deadline()
+        if deadline is not None and not deadline.check("arasaac"):
+            raise ArasaacUnavailable("generation deadline reached (cache-only mode)")
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline.remaining())
+
+        if ARASAAC_OFFLINE or not self.breaker.allow():
+            raise ArasaacUnavailable("ARASAAC circuit open (cache-only mode)")
+
+        import requests
+
         url = ARASAAC_SEARCH_URL.format(lang=self.lang, term=term)
-        resp = requests.get(url, timeout=self.timeout)
+        http = self.session or _DEFAULT_SESSION or requests
+        incr("arasaac_requests")
+        try:
+            with span("arasaac"):
+                resp = http.get(url, timeout=timeout)
+        except requests.Timeout as e:
+            incr("arasaac_errors")
+            if timeout < self.timeout:
+                # coupé par le budget de la génération, pas une panne d'ARASAAC
+                self.breaker.release_trial()
+                deadline.check("arasaac")
+            else:
+                self.breaker.record_failure()
+            raise ArasaacUnavailable(str(e)) from e
+        except requests.RequestException as e:
+            incr("arasaac_errors")
+            self.breaker.record_failure()
+            raise ArasaacUnavailable(str(e)) from e
+
+        incr("bytes_downloaded", len(resp.content))
+        if resp.status_code >= 500 or resp.status_code == 429:
+            incr("arasaac_errors")
+            self.breaker.record_failure()
+            raise ArasaacUnavailable(f"HTTP {resp.status_code} from {url}")
+        self.breaker.record_success()
 
         if resp.status_code != 200:
             return []
@@ -30,6 +193,7 @@ class ArasaacClient:
 
     def pictogram_url(self, picto_id: int) -> str:
         """
-        Return a direct URL to the pictogram image (PNG).
+        Return a direct URL to the pictogram image (PNG), on the public CDN:
+        this is the URL stored in the cache; fetch it through static_url().
         """
         return ARASAAC_PICTO_URL.format(id=picto_id)
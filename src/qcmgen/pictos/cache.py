@@ -0,0 +1,421 @@
+"""
+Stockage du cache de pictogrammes (data/arasaac_cache_{lang}.json).
+
+Un seul `PictoCacheStore` par langue et par processus : le fichier est lu une
+fois, gardé en mémoire et relu seulement si un autre processus l'a modifié.
+
+Format du fichier (schema_version 3) : chaque picto est stocké une seule fois,
+les termes pointent vers un picto_id et gardent leurs propres champs
+(TERM_FIELDS : score, keyword, plural, resolver, expected_type), qui dépendent
+de la recherche qui a trouvé le picto et pas du picto lui-même :
+
+    {"schema_version": 3,
+     "pictos": {"7114": {"url": ..., "tags": [...], ...}},
+     "terms": {"chat": {"picto_id": 7114, "score": 1.0, "keyword": "chat", ...},
+               "chats": {"picto_id": 7114, "score": 0.8, "keyword": "chat", ...}}}
+
+Les anciens formats (v1 : dict plat terme -> entrée complète, v2 : terme ->
+picto_id) sont lus tels quels ; le fichier n'est réécrit en v3 qu'au prochain
+`save` explicite, jamais au chargement.
+En mémoire, `data()` reste une vue terme -> entrée (un dict par terme : le
+record du picto plus les champs du terme). C'est la vue vivante (lectures ponctuelles et
+écritures) : pour parcourir le cache, `items()` en prend une copie sous le
+verrou, un rechargement concurrent ne peut pas la modifier pendant le parcours.
+
+Si un snapshot binaire à jour existe à côté du JSON (arasaac_cache_{lang}.bin,
+voir qcmgen.pictos.snapshot), la vue le lit via mmap au lieu de parser le JSON.
+
+Écritures entre processus (workers Streamlit, scripts) : `save` prend un verrou
+consultatif (arasaac_cache_{lang}.json.lock), relit le fichier, fusionne avec
+les entrées en mémoire puis remplace le fichier atomiquement (os.replace).
+Un lecteur voit donc toujours un fichier complet, et aucune entrée écrite par
+un autre processus n'est perdue.
+
+Attente des verrous (qcmgen.metrics) : `cache_lock_contended` /
+`cache_lock_wait_seconds` pour le verrou du store (threads d'un processus),
+`cache_file_lock_contended` / `cache_file_lock_wait_seconds` pour le verrou
+fichier (processus). Un verrou libre ne coûte pas de mesure.
+"""
+
+import json
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from qcmgen.metrics import incr
+from qcmgen.pictos.snapshot import CacheSnapshot, build_snapshot, snapshot_path_for
+
+
+def data_dir_path() -> Path:
+    """data/ of the project, or QCMGEN_DATA_DIR (e.g. an isolated cache for benchmarks)."""
+    override = os.environ.get("QCMGEN_DATA_DIR")
+    data_dir = Path(override) if override else Path(__file__).resolve().parents[3] / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def cache_path(lang: str) -> str:
+    return str(data_dir_path() / f"arasaac_cache_{lang}.json")
+
+
+CACHE_SCHEMA_VERSION = 3
+
+# champs propres à un terme (la recherche qui l'a résolu), stockés sous "terms"
+TERM_FIELDS = ("score", "keyword", "plural", "resolver", "expected_type")
+
+
+def _completeness(rec: Dict[str, Any]) -> Tuple[bool, float]:
+    return (bool(rec.get("tags") and rec.get("categories")), float(rec.get("fetched_at", 0.0)))
+
+
+def to_file_format(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    term -> entry view to the normalized on-disk format: the most complete/recent
+    record per picto, and each term's own fields (TERM_FIELDS) under "terms".
+    """
+    pictos: Dict[str, Dict[str, Any]] = {}
+    terms: Dict[str, Dict[str, Any]] = {}
+    for term, hit in flat.items():
+        if hit.get("picto_id") is None:
+            continue
+        picto_id = int(hit["picto_id"])
+        key = str(picto_id)
+        known = pictos.get(key)
+        if known is None or _completeness(hit) > _completeness(known):
+            # l'id est la clé
+            pictos[key] = {k: v for k, v in hit.items() if k != "picto_id" and k not in TERM_FIELDS}
+        terms[term] = {"picto_id": picto_id, **{k: hit[k] for k in TERM_FIELDS if k in hit}}
+    return {"schema_version": CACHE_SCHEMA_VERSION, "pictos": pictos, "terms": terms}
+
+
+def from_file_format(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """On-disk content (any schema) to the term -> entry view (one dict per term)."""
+    if "schema_version" not in raw:
+        return dict(raw)  # v1: déjà un dict plat terme -> entrée
+
+    pictos = raw.get("pictos", {})
+    flat: Dict[str, Any] = {}
+    for term, ref in raw.get("terms", {}).items():
+        if isinstance(ref, dict):
+            fields = {k: v for k, v in ref.items() if k != "picto_id"}
+            picto_id = ref.get("picto_id")
+        else:  # v2: terme -> picto_id, champs du terme pris dans le record du picto
+            fields = {}
+            picto_id = ref
+        rec = pictos.get(str(picto_id))
+        if rec is None:
+            continue
+        flat[term] = dict(rec, picto_id=int(picto_id), **fields)
+    return flat
+
+
+def _file_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    # inode inclus: os.replace change l'inode même si mtime/taille coïncident
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+@contextmanager
+def _held(lock, name: str):
+    """Hold `lock`; when it is taken, count the wait (`{name}_contended`, `{name}_wait_seconds`)."""
+    if not lock.acquire(blocking=False):
+        started = time.perf_counter()
+        lock.acquire()
+        incr(f"{name}_contended")
+        incr(f"{name}_wait_seconds", time.perf_counter() - started)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Exclusive advisory lock on `path + ".lock"` (no-op where fcntl is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path + ".lock", "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            started = time.perf_counter()
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            incr("cache_file_lock_contended")
+            incr("cache_file_lock_wait_seconds", time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _write_json_atomic(path: str, content: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class CacheView(MutableMapping):
+    """
+    term -> entry mapping: entries held in memory (the whole JSON cache, or only
+    the entries written by this process) over an optional memory-mapped snapshot.
+    """
+
+    def __init__(self):
+        self._overlay: Dict[str, Any] = {}
+        self._base: Optional[CacheSnapshot] = None
+        self._deleted: Set[str] = set()
+        self._decoded: Dict[str, Any] = {}
+        self._dirty: Dict[str, Any] = {}  # écrit depuis le dernier chargement/save
+
+    def _reset(self, overlay: Dict[str, Any], base: Optional[CacheSnapshot] = None) -> None:
+        # l'ancien snapshot n'est pas fermé: d'autres threads peuvent encore le lire
+        self._overlay = overlay
+        self._base = base
+        self._deleted = set()
+        self._decoded = {}
+        self._dirty = {}
+
+    def _pending(self) -> Tuple[Dict[str, Any], Set[str]]:
+        """Unsaved local changes: (written entries, removed terms)."""
+        return dict(self._dirty), set(self._deleted)
+
+    def _replay(self, pending: Tuple[Dict[str, Any], Set[str]]) -> None:
+        written, removed = pending
+        for term in removed:
+            if term in self:
+                del self[term]
+            else:
+                self._deleted.add(term)
+        for term, hit in written.items():
+            self[term] = hit
+
+    def _mark_clean(self) -> None:
+        self._dirty = {}
+        self._deleted = set()
+
+    @property
+    def snapshot(self) -> Optional[CacheSnapshot]:
+        return self._base
+
+    def get(self, term, default=None):
+        hit = self._overlay.get(term)
+        if hit is not None:
+            return hit
+        if self._base is not None and term not in self._deleted:
+            hit = self._decoded.get(term)
+            if hit is None:
+                hit = self._base.get(term)
+                if hit is not None:
+                    self._decoded[term] = hit  # décodé une fois, même objet aux appels suivants
+            if hit is not None:
+                return hit
+        return default
+
+    def __getitem__(self, term: str) -> Any:
+        hit = self.get(term)
+        if hit is None:
+            raise KeyError(term)
+        return hit
+
+    def __contains__(self, term) -> bool:
+        if term in self._overlay:
+            return True
+        return self._base is not None and term not in self._deleted and term in self._base
+
+    def __setitem__(self, term: str, hit: Any) -> None:
+        self._overlay[term] = hit
+        self._dirty[term] = hit
+        self._deleted.discard(term)
+
+    def __delitem__(self, term: str) -> None:
+        # le terme reste dans _deleted même sans snapshot: save() ne doit pas le reprendre du disque
+        found = self._overlay.pop(term, None) is not None
+        self._dirty.pop(term, None)
+        if self._base is not None and term in self._base and term not in self._deleted:
+            found = True
+        if not found:
+            raise KeyError(term)
+        self._deleted.add(term)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from list(self._overlay)
+        if self._base is not None:
+            for term in self._base.terms():
+                if term not in self._overlay and term not in self._deleted:
+                    yield term
+
+    def __len__(self) -> int:
+        if self._base is None:
+            return len(self._overlay)
+        shadowed = sum(1 for t in self._overlay if t in self._base)
+        hidden = sum(1 for t in self._deleted if t in self._base)
+        return len(self._base) + len(self._overlay) - shadowed - hidden
+
+
+class PictoCacheStore:
+    """
+    Thread-safe in-memory view of one cache file.
+    `data()` always returns the same mapping object (reloaded in place),
+    so callers can keep references to it; iterate with `items()`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot_path = snapshot_path_for(path)
+        self._lock = threading.RLock()
+        self._data = CacheView()
+        self._stamp: Optional[Tuple[Any, Any]] = None
+        self._loaded = False
+        self.version = 0  # incrémenté à chaque rechargement/écriture (invalide les index dérivés)
+        self._pictos: Dict[int, Dict[str, Any]] = {}
+        self._pictos_version = -1
+
+    def _disk_stamp(self) -> Tuple[Any, Any]:
+        return _file_stamp(self.path), _file_stamp(self.snapshot_path)
+
+    def _reload(self) -> None:
+        """
+        Re-read the file if it changed on disk. Local changes not saved yet are
+        replayed on top of the new content, so a reload never drops them.
+        """
+        stamp = self._disk_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        json_mtime, snap_mtime = _file_mtime(self.path), _file_mtime(self.snapshot_path)
+        pending = self._data._pending()
+
+        # snapshot binaire à jour: mmap, pas de json.load
+        if snap_mtime is not None and (json_mtime is None or snap_mtime >= json_mtime):
+            try:
+                base = CacheSnapshot(self.snapshot_path)
+            except (OSError, ValueError):
+                base = None
+            if base is not None:
+                self._data._reset({}, base)
+                self._data._replay(pending)
+                self._stamp = stamp
+                self._loaded = True
+                self.version += 1
+                return
+
+        if json_mtime is None:
+            raw: Dict[str, Any] = {}
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except Exception:
+                # fichier en cours d'écriture ou corrompu: on garde la version en mémoire
+                return
+
+        flat = from_file_format(raw)
+        if raw and "schema_version" not in raw:
+            flat = from_file_format(to_file_format(flat))  # v1: même vue que le format normalisé
+
+        self._data._reset(flat)
+        self._data._replay(pending)
+        self._stamp = stamp
+        self._loaded = True
+        self.version += 1
+
+    def data(self) -> Dict[str, Any]:
+        with _held(self._lock, "cache_lock"):
+            self._reload()
+            return self._data
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Snapshot of the (term, entry) pairs, taken under the lock."""
+        with _held(self._lock, "cache_lock"):
+            self._reload()
+            out = []
+            for term in list(self._data):
+                hit = self._data.get(term)
+                if hit is not None:
+                    out.append((term, hit))
+            return out
+
+    def save(self, cache: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Write the cache under the cross-process lock: re-read the file if another
+        process changed it, merge (local changes win), then replace it atomically.
+        """
+        with _held(self._lock, "cache_lock"), _file_lock(self.path):
+            if cache is not None and cache is not self._data:
+                self._data.update(cache)
+            self._reload()  # fusion avec les écritures des autres processus
+
+            flat = dict(self._data)  # copie: d'autres threads peuvent écrire pendant le dump
+            _write_json_atomic(self.path, to_file_format(flat))
+
+            # snapshot binaire présent: on le recompile pour qu'il reste à jour
+            base = None
+            if self._data.snapshot is not None or os.path.exists(self.snapshot_path):
+                build_snapshot(flat, self.snapshot_path)
+                base = CacheSnapshot(self.snapshot_path)
+            if base is not None:
+                self._data._reset({}, base)
+            self._data._mark_clean()
+
+            self._stamp = self._disk_stamp()
+            self._loaded = True
+            self.version += 1
+
+    def build_snapshot(self) -> int:
+        """Compile the current cache into the binary snapshot next to the JSON file."""
+        with _held(self._lock, "cache_lock"), _file_lock(self.path):
+            self._reload()
+            n = build_snapshot(dict(self._data), self.snapshot_path)
+            self._stamp = None  # rechargé (via mmap) au prochain accès
+            return n
+
+    def pictos(self) -> Dict[int, Dict[str, Any]]:
+        """picto_id -> record (one per picto, whatever the number of alias terms; no TERM_FIELDS)."""
+        with _held(self._lock, "cache_lock"):
+            self._reload()
+            if self._pictos_version != self.version:
+                self._pictos = {int(k): dict(p, picto_id=int(k)) for k, p in to_file_format(self._data)["pictos"].items()}
+                self._pictos_version = self.version
+            return self._pictos
+
+    def terms_for(self, picto_id: int):
+        """Alias terms pointing to a picto."""
+        return [t for t, hit in self.items() if int(hit.get("picto_id", -1)) == picto_id]
+
+
+_STORES: Dict[str, PictoCacheStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_cache_store(lang: str = "fr") -> PictoCacheStore:
+    """Return the process-wide cache store for a language."""
+    with _STORES_LOCK:
+        store = _STORES.get(lang)
+        if store is None:
+            store = PictoCacheStore(cache_path(lang))
+            _STORES[lang] = store
+        return store
@@ -0,0 +1,180 @@
+"""
+Index local des mots-clés ARASAAC : trie de préfixes + index de n-grammes.
+
+Les mots-clés sont normalisés une seule fois à la construction (voir
+`normalize_term`), puis un terme est classé comme dans `_score_candidate` :
+exact (13.5) > sous-chaîne (3.5) > n'importe quel mot-clé (0.5).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+EXACT_SCORE = 10.0
+SUBSTRING_SCORE = 3.0
+ANY_SCORE = 0.5
+
+
+def score_keywords(term_norm: str, kws: List[str]) -> float:
+    """
+    Score a normalized term against a list of normalized keywords.
+    Shared by `_score_candidate` and `KeywordIndex` so both always agree.
+    """
+    score = 0.0
+
+    # Exact keyword match
+    if term_norm in kws:
+        score += EXACT_SCORE
+
+    # Substring match in any keyword
+    if any(term_norm in kw for kw in kws):
+        score += SUBSTRING_SCORE
+
+    # Fallback: tiny score if has any keywords
+    if kws:
+        score += ANY_SCORE
+
+    return score
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.entries: List[int] = []  # entrées dont un mot-clé se termine ici
+
+
+class KeywordIndex:
+    """
+    In-memory index over normalized keywords.
+
+    - exact / prefix lookups walk a character trie,
+    - substring lookups intersect posting lists of character n-grams
+      (grams of length 1..ngram are indexed so short terms work too),
+    - every entry keeps its insertion order, which is used to break ties
+      the same way the resolvers do (first best candidate wins).
+    """
+
+    def __init__(self, ngram: int = 3):
+        self.ngram = ngram
+        self._root = _TrieNode()
+        self._keys: List[Any] = []
+        self._has_keywords: List[bool] = []
+        self._grams: Dict[str, Set[str]] = {}
+        self._kw_entries: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Any, keywords: Iterable[str]) -> int:
+        """Add an entry with its (already normalized) keywords. Returns its entry id."""
+        eid = len(self._keys)
+        self._keys.append(key)
+
+        kws = [kw for kw in dict.fromkeys(keywords) if kw]
+        self._has_keywords.append(bool(kws))
+
+        for kw in kws:
+            node = self._root
+            for ch in kw:
+                node = node.children.setdefault(ch, _TrieNode())
+            node.entries.append(eid)
+
+            if kw not in self._kw_entries:
+                self._kw_entries[kw] = []
+                for n in range(1, self.ngram + 1):
+                    for i in range(len(kw) - n + 1):
+                        self._grams.setdefault(kw[i:i + n], set()).add(kw)
+            self._kw_entries[kw].append(eid)
+
+        return eid
+
+    def _node(self, prefix: str) -> Optional[_TrieNode]:
+        node = self._root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def exact(self, term_norm: str) -> List[int]:
+        """Entry ids having `term_norm` as one of their keywords."""
+        node = self._node(term_norm)
+        return sorted(set(node.entries)) if node is not None else []
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Keywords starting with `prefix` (depth-first, alphabetical)."""
+        node = self._node(prefix)
+        if node is None:
+            return []
+
+        out: List[str] = []
+        stack: List[Tuple[str, _TrieNode]] = [(prefix, node)]
+        while stack:
+            word, cur = stack.pop()
+            if cur.entries:
+                out.append(word)
+                if limit is not None and len(out) >= limit:
+                    break
+            for ch in sorted(cur.children, reverse=True):
+                stack.append((word + ch, cur.children[ch]))
+        return out
+
+    def substring(self, term_norm: str) -> List[str]:
+        """Keywords containing `term_norm`."""
+        if not term_norm:
+            return list(self._kw_entries)
+
+        n = min(self.ngram, len(term_norm))
+        postings = []
+        for i in range(len(term_norm) - n + 1):
+            p = self._grams.get(term_norm[i:i + n])
+            if not p:
+                return []
+            postings.append(p)
+
+        postings.sort(key=len)
+        cands = set(postings[0])
+        for p in postings[1:]:
+            cands &= p
+            if not cands:
+                return []
+
+        # les n-grammes ne garantissent pas la contiguïté: on vérifie
+        return [kw for kw in cands if term_norm in kw]
+
+    def search(self, term_norm: str, limit: Optional[int] = None, include_any: bool = False) -> List[Tuple[float, Any]]:
+        """
+        Rank entries for a normalized term: exact > substring > any.
+        Returns (score, key) pairs, best first, ties in insertion order.
+        """
+        exact = set(self.exact(term_norm))
+
+        sub: Set[int] = set()
+        for kw in self.substring(term_norm):
+            sub.update(self._kw_entries[kw])
+
+        ranked: List[Tuple[float, int]] = []
+        for eid in exact:
+            ranked.append((EXACT_SCORE + SUBSTRING_SCORE + ANY_SCORE, eid))
+        for eid in sub - exact:
+            ranked.append((SUBSTRING_SCORE + ANY_SCORE, eid))
+
+        if include_any:
+            for eid, has_kw in enumerate(self._has_keywords):
+                if eid not in sub:
+                    ranked.append((ANY_SCORE if has_kw else 0.0, eid))
+
+        ranked.sort(key=lambda x: (-x[0], x[1]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(score, self._keys[eid]) for score, eid in ranked]
+
+    def search_many(self, terms: Iterable[str], limit: Optional[int] = None) -> Dict[str, List[Tuple[float, Any]]]:
+        """Batch version of `search` (one independent lookup per unique term)."""
+        out: Dict[str, List[Tuple[float, Any]]] = {}
+        for t in terms:
+            if t not in out:
+                out[t] = self.search(t, limit=limit)
+        return out
@@ -0,0 +1,184 @@
+"""
+Rafraîchissement des entrées du cache de pictogrammes hors du chemin de la requête.
+
+`resolve_term_to_picto` sert une entrée ancienne ou incomplète tout de suite et
+appelle `schedule_refresh` ; un thread de fond la recharge depuis ARASAAC.
+`upgrade_cache` fait la même chose pour tout le cache, en une commande
+(voir scripts/upgrade_arasaac_cache.py).
+
+Une entrée est rafraîchie par le résolveur qui l'a écrite (champ "resolver") :
+une entrée stricte reste stricte, avec le même expected_type. Pour les entrées
+anciennes, qui ne l'enregistrent pas, il est déduit de l'entrée (voir
+`entry_resolver`).
+
+`upgrade_cache` rafraîchit les entrées dans la vue en mémoire et n'écrit le
+fichier (JSON + snapshot, sous le verrou fichier) que toutes les
+UPGRADE_SAVE_EVERY entrées et à la fin, pas une fois par entrée.
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from qcmgen.pictos.resolve import (
+    CACHE_MAX_AGE_S,
+    RESOLVER_DEFAULT,
+    RESOLVER_STRICT,
+    _cache_entry,
+    _cache_items,
+    _fetch_and_cache,
+    _load_cache,
+    _resolve_strict,
+    _save_cache,
+    entry_resolver,
+    needs_refresh,
+)
+
+# après un échec (ARASAAC indisponible), on ne retente pas la même entrée avant ce délai
+RETRY_AFTER_S = 600.0
+# délai minimal entre deux appels ARASAAC du thread de fond
+REFRESH_INTERVAL_S = 0.25
+# upgrade_cache: entrées rafraîchies entre deux écritures du fichier
+UPGRADE_SAVE_EVERY = 200
+
+
+def refresh_entry(term_norm: str, lang: str = "fr", limit: int = 12, save: bool = True) -> bool:
+    """
+    Re-fetch one cache entry synchronously, through the resolver that wrote it.
+    The entry is written to the in-memory cache, and to disk unless save is False.
+    If nothing matches any more, the current entry is kept. Returns True on success.
+    """
+    cache = _load_cache(lang)
+    hit = cache.get(term_norm) or {}
+
+    if entry_resolver(term_norm, hit) == RESOLVER_DEFAULT:
+        if _fetch_and_cache(term_norm, term_norm, lang, limit, cache) is None:
+            return False
+    else:
+        expected_type = hit.get("expected_type")
+        r = _resolve_strict(term_norm, lang, limit, expected_type, add_to_cache=False)
+        # ARASAAC indisponible: réponse servie depuis le cache, rien n'a été rafraîchi
+        if r is None or r.source == "cache":
+            return False
+        cache[term_norm] = _cache_entry(r.picto_id, r.url, r.score, r.tags, r.categories, r.keyword, r.plural,
+                                        resolver=RESOLVER_STRICT, expected_type=expected_type)
+    if save:
+        _save_cache(lang, cache)
+    return True
+
+
+class CacheRefresher:
+    """
+    Single background worker thread per language.
+    Terms are deduplicated while queued, and failed terms are not retried
+    before RETRY_AFTER_S seconds.
+    """
+
+    def __init__(self, lang: str = "fr"):
+        self.lang = lang
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending: Set[str] = set()
+        self._failed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, term_norm: str) -> bool:
+        with self._lock:
+            if term_norm in self._pending:
+                return False
+            failed = self._failed_at.get(term_norm)
+            if failed is not None and time.time() - failed < RETRY_AFTER_S:
+                return False
+            self._pending.add(term_norm)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"picto-refresh-{self.lang}", daemon=True)
+                self._thread.start()
+        self._queue.put(term_norm)
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait until the queue is drained (used by scripts)."""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending():
+            if deadline is not None and time.time() > deadline:
+                return
+            time.sleep(0.05)
+
+    def _run(self) -> None:
+        while True:
+            term_norm = self._queue.get()
+            try:
+                ok = refresh_entry(term_norm, lang=self.lang)
+            except Exception as e:
+                print(f"Refresh failed for '{term_norm}': {e}")
+                ok = False
+            with self._lock:
+                self._pending.discard(term_norm)
+                if ok:
+                    self._failed_at.pop(term_norm, None)
+                else:
+                    self._failed_at[term_norm] = time.time()
+            self._queue.task_done()
+            time.sleep(REFRESH_INTERVAL_S)  # pas de rafale vers ARASAAC
+
+
+_REFRESHERS: Dict[str, CacheRefresher] = {}
+_REFRESHERS_LOCK = threading.Lock()
+
+
+def get_refresher(lang: str = "fr") -> CacheRefresher:
+    with _REFRESHERS_LOCK:
+        refresher = _REFRESHERS.get(lang)
+        if refresher is None:
+            refresher = CacheRefresher(lang)
+            _REFRESHERS[lang] = refresher
+        return refresher
+
+
+def schedule_refresh(term_norm: str, lang: str = "fr") -> bool:
+    """Queue a background refresh of a cache entry (no-op if already queued)."""
+    return get_refresher(lang).submit(term_norm)
+
+
+def upgrade_cache(lang: str = "fr", max_age: float = CACHE_MAX_AGE_S, force: bool = False,
+                  throttle: float = REFRESH_INTERVAL_S, include_legacy: bool = True) -> Tuple[int, int]:
+    """
+    Bulk upgrade: synchronously refresh every old or incomplete entry (all entries with force).
+    Legacy entries (older schema) are included unless include_legacy is False.
+    The file is written every UPGRADE_SAVE_EVERY refreshed entries and at the end.
+    Returns (refreshed, failed).
+    """
+    from tqdm import tqdm
+
+    todo = [
+        t for t, hit in _cache_items(lang)
+        if force or needs_refresh(hit, max_age=max_age, include_legacy=include_legacy)
+    ]
+
+    refreshed, failed, unsaved = 0, 0, 0
+    try:
+        for term_norm in tqdm(todo):
+            try:
+                ok = refresh_entry(term_norm, lang=lang, save=False)
+            except Exception as e:
+                print(f"Refresh failed for '{term_norm}': {e}")
+                ok = False
+            if ok:
+                refreshed += 1
+                unsaved += 1
+                if unsaved >= UPGRADE_SAVE_EVERY:
+                    _save_cache(lang, _load_cache(lang))
+                    unsaved = 0
+            else:
+                failed += 1
+            time.sleep(throttle)  # throttle simple (évite de spammer)
+    finally:
+        if unsaved:  # interrompu (Ctrl-C) ou terminé: les entrées déjà rafraîchies sont gardées
+            _save_cache(lang, _load_cache(lang))
+
+    return refreshed, failed
@@ -1,13 +1,14 @@
 ## Done with ChatGPT
 
-import json
-import os
+import time
 import unicodedata
-from pathlib import Path
 from dataclasses import dataclass
 from typing import Optional, Dict, Any, List, Tuple
 
-from qcmgen.pictos.arasaac_client import ArasaacClient
+from qcmgen.metrics import incr, timed
+from qcmgen.pictos.arasaac_client import ArasaacClient, ArasaacUnavailable, is_cache_only
+from qcmgen.pictos.cache import cache_path, get_cache_store
+from qcmgen.pictos.keyword_index import EXACT_SCORE, KeywordIndex, score_keywords
 
 EXPECTED_TAGS = {
     "color": {"color", "colour"},
@@ -19,6 +20,16 @@ EXPECTED_TAGS = {
 }
 
 
+# version du format d'une entrée du cache (0 = ancienne entrée sans fetched_at)
+ENTRY_SCHEMA_VERSION = 1
+# au-delà, une entrée est servie mais rafraîchie en arrière-plan
+CACHE_MAX_AGE_S = 30 * 24 * 3600
+
+# résolveur qui a écrit une entrée (le rafraîchissement repasse par le même)
+RESOLVER_DEFAULT = "default"
+RESOLVER_STRICT = "strict"
+
+
 @dataclass(frozen=True)
 class ResolvedPicto:
     term: str
@@ -69,49 +80,30 @@ def _extract_keywords(item: Dict[str, Any]) -> List[str]:
     return out
 
 
-def _score_candidate(term_norm: str, cand: Dict[str, Any]) -> float:
-    score = 0.0
-    kws = _extract_keywords(cand)
-
-    # Exact keyword match
-    if term_norm in kws:
-        score += 10.0
-
-    # Substring match in any keyword
-    if any(term_norm in kw for kw in kws):
-        score += 3.0
-
-    # Fallback: tiny score if has any keywords
-    if kws:
-        score += 0.5
-
-    return score
+def _score_candidate(term_norm: str, cand: Dict[str, Any], kws: Optional[List[str]] = None) -> float:
+    if kws is None:
+        kws = _extract_keywords(cand)
+    return score_keywords(term_norm, kws)
 
 def _cache_path(lang: str) -> str:
-    project_root = Path(__file__).resolve().parents[3]
-    data_dir = project_root / "data"
-    data_dir.mkdir(parents=True, exist_ok=True)
-    return str(data_dir / f"arasaac_cache_{lang}.json")
-
+    return cache_path(lang)
 
 
 def _load_cache(lang: str) -> Dict[str, Any]:
-    path = _cache_path(lang)
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    # dict partagé par tout le processus (voir qcmgen.pictos.cache)
+    return get_cache_store(lang).data()
+
+
+def _cache_items(lang: str) -> List[Tuple[str, Dict[str, Any]]]:
+    # copie prise sous le verrou du store: à utiliser pour tout parcours du cache
+    return get_cache_store(lang).items()
 
 
 def _save_cache(lang: str, cache: Dict[str, Any]) -> None:
-    path = _cache_path(lang)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+    get_cache_store(lang).save(cache)
 
 
+@timed("resolve")
 def resolve_term_to_picto(term: str, lang: str = "fr", limit: int = 12, expected_type: str | None = None) -> Optional[ResolvedPicto]:
     """
     Resolve a term to the best ARASAAC pictogram candidate.
@@ -122,11 +114,74 @@ def resolve_term_to_picto(term: str, lang: str = "fr", limit: int = 12, expected
         return None
 
     cache = _load_cache(lang)
+    hit = _cached_resolved(term, term_norm, cache, lang)
+    if hit is not None:
+        return hit
+
+    resolved = _fetch_and_cache(term, term_norm, lang, limit, cache)
+    if resolved is not None:
+        _save_cache(lang, cache)
+
+    return resolved
+
+def _cache_entry(picto_id: int, url: str, score: float, tags: List[str], categories: List[str],
+                 kw: Optional[str], pl: Optional[str], resolver: str = RESOLVER_DEFAULT,
+                 expected_type: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "picto_id": picto_id,
+        "url": url,
+        "score": score,
+        "tags": tags,
+        "categories": categories,
+        "keyword": kw,
+        "plural": pl,
+        "fetched_at": time.time(),
+        "schema_version": ENTRY_SCHEMA_VERSION,
+        "resolver": resolver,
+        "expected_type": expected_type,
+    }
+
+def is_legacy_entry(hit: Dict[str, Any]) -> bool:
+    """Entry written before ENTRY_SCHEMA_VERSION (no fetched_at, unknown resolver)."""
+    return int(hit.get("schema_version", 0)) < ENTRY_SCHEMA_VERSION
+
+def entry_resolver(term_norm: str, hit: Dict[str, Any]) -> str:
+    """
+    Resolver that wrote an entry. Legacy entries do not record it: only an entry
+    whose keyword is the term itself can come from the strict resolver, the others
+    (plural, singularized or fuzzy match) were written by the default one and would
+    never pass the strict match. The default resolver accepts any entry, so a
+    wrong guess the other way only loses the strictness.
+    """
+    resolver = hit.get("resolver")
+    if resolver:
+        return resolver
+    keyword = hit.get("keyword")
+    return RESOLVER_STRICT if keyword and normalize_term(str(keyword)) == term_norm else RESOLVER_DEFAULT
+
+def needs_refresh(hit: Dict[str, Any], max_age: float = CACHE_MAX_AGE_S, include_legacy: bool = False) -> bool:
+    """
+    Incomplete (no tags/categories) or expired cache entry.
+    A complete legacy entry is only stale with include_legacy (explicit upgrade),
+    otherwise the first run after an upgrade would re-fetch the whole cache.
+    """
+    if not (hit.get("tags") and hit.get("categories")):
+        return True
+    if is_legacy_entry(hit):
+        return include_legacy
+    return time.time() - float(hit.get("fetched_at", 0.0)) > max_age
+
+def _cached_resolved(term: str, term_norm: str, cache: Dict[str, Any], lang: str = "fr") -> Optional[ResolvedPicto]:
     if term_norm in cache:
         hit = cache[term_norm]
 
-        # Si ancienne entrée (pas de tags), on refetch pour enrichir
-        if hit.get("tags") and hit.get("categories"):
+        # stale-while-revalidate: une entrée ancienne ou incomplète (pas de tags) est servie
+        # tout de suite, et rafraîchie en arrière-plan (jamais dans le chemin de la requête)
+        if hit.get("picto_id") is not None and hit.get("url"):
+            if needs_refresh(hit) and not is_cache_only():
+                from qcmgen.pictos.refresh import schedule_refresh
+                schedule_refresh(term_norm, lang=lang)
+            incr("picto_cache_hits")
             return ResolvedPicto(
                 term=term,
                 picto_id=int(hit["picto_id"]),
@@ -137,9 +192,11 @@ def resolve_term_to_picto(term: str, lang: str = "fr", limit: int = 12, expected
                 keyword=hit.get("keyword"),
                 plural=hit.get("plural"),
             )
+    incr("picto_cache_misses")
+    return None
 
-
-
+def _fetch_and_cache(term: str, term_norm: str, lang: str, limit: int, cache: Dict[str, Any]) -> Optional[ResolvedPicto]:
+    """Search ARASAAC for a term and store the best candidate in `cache` (not saved to disk)."""
     client = ArasaacClient(lang=lang)
     queries = [term_norm]
     sing = _naive_singularize_fr(term_norm)
@@ -149,7 +206,10 @@ def resolve_term_to_picto(term: str, lang: str = "fr", limit: int = 12, expected
     best: Optional[Tuple[float, Dict[str, Any]]] = None
 
     for q in queries:
-        results = client.search(q, limit=limit)
+        try:
+            results = client.search(q, limit=limit)
+        except ArasaacUnavailable:
+            return None  # mode dégradé (cache seul): un manque, jamais mis en cache
         for cand in results:
             s = _score_candidate(q, cand)
             if best is None or s > best[0]:
@@ -179,17 +239,8 @@ def resolve_term_to_picto(term: str, lang: str = "fr", limit: int = 12, expected
     plural=pl,
 )
 
-    cache[term_norm] = {
-        "picto_id": picto_id,
-        "url": url,
-        "score": score,
-        "tags": tags,
-        "categories": categories,
-        "keyword": kw,
-        "plural": pl,
-    }
+    cache[term_norm] = _cache_entry(picto_id, url, score, tags, categories, kw, pl)
     print(f"Caching pictogram for term '{term_norm}' (picto_id={picto_id})")
-    _save_cache(lang, cache)
 
     return resolved
 
@@ -214,53 +265,93 @@ import random
 from typing import Set
 
 
-def sample_cached_by_tag(tag: str, k: int = 3, exclude_ids: Optional[Set[int]] = None, lang: str = "fr") -> List[ResolvedPicto]:
-    tag = tag.strip().lower()
-    exclude_ids = exclude_ids or set()
+def _cache_version(lang: str) -> int:
+    store = get_cache_store(lang)
+    store.data()  # recharge si le fichier a changé
+    return store.version
 
-    cache = _load_cache(lang)
-    candidates: List[ResolvedPicto] = []
 
-    for term_norm, hit in cache.items():
-        picto_id = int(hit.get("picto_id", -1))
-        if picto_id in exclude_ids:
-            continue
+def _hit_to_picto(term_norm: str, hit: Dict[str, Any]) -> ResolvedPicto:
+    return ResolvedPicto(
+        term=term_norm,
+        picto_id=int(hit.get("picto_id", -1)),
+        url=str(hit.get("url")),
+        score=float(hit.get("score", 0.0)),
+        tags=hit.get("tags", []) or [],
+        categories=hit.get("categories", []) or [],
+        keyword=hit.get("keyword"),
+        plural=hit.get("plural"),
+    )
+
 
+_TAG_POOLS: Dict[Tuple[str, str], Tuple[int, List[ResolvedPicto]]] = {}
+
+
+def cached_pictos_by_tag(tag: str, lang: str = "fr") -> List[ResolvedPicto]:
+    """
+    Precomputed "picto-verified" pool: every cached entry carrying `tag`, in cache order.
+    Rebuilt only when the cache changes.
+    """
+    tag = tag.strip().lower()
+    version = _cache_version(lang)
+    known = _TAG_POOLS.get((lang, tag))
+    if known is not None and known[0] == version:
+        return known[1]
+
+    pool: List[ResolvedPicto] = []
+    for term_norm, hit in _cache_items(lang):
         tags = hit.get("tags", []) or []
         tags = [str(t).strip().lower() for t in tags]
+        if tag in tags and hit.get("url"):
+            pool.append(_hit_to_picto(term_norm, hit))
 
-        if tag not in tags:
-            continue
+    _TAG_POOLS[(lang, tag)] = (version, pool)
+    return pool
+
+
+def lookup_cached_picto(term: str, lang: str = "fr") -> Optional[ResolvedPicto]:
+    """Cache-only lookup (no network call): the cached picto for a term, if any."""
+    term_norm = normalize_term(term)
+    hit = _load_cache(lang).get(term_norm)
+    if not hit or not hit.get("url"):
+        return None
+    return _hit_to_picto(term_norm, hit)
+
+
+def sample_cached_by_tag(tag: str, k: int = 3, exclude_ids: Optional[Set[int]] = None, lang: str = "fr") -> List[ResolvedPicto]:
+    return sample_from_pool(cached_pictos_by_tag(tag, lang), k=k, exclude_ids=exclude_ids)
 
-        candidates.append(
-            ResolvedPicto(
-                term=term_norm,
-                picto_id=picto_id,
-                url=str(hit.get("url")),
-                score=float(hit.get("score", 0.0)),
-                tags=hit.get("tags", []) or [],
-                categories=hit.get("categories", []) or [],
-                keyword=hit.get("keyword"),
-                plural=hit.get("plural"),
-            )
-        )
+
+def sample_from_pool(pool: List[ResolvedPicto], k: int = 3, exclude_ids: Optional[Set[int]] = None) -> List[ResolvedPicto]:
+    """Sample k pictos from a precomputed tag pool (same random draws as sample_cached_by_tag)."""
+    exclude_ids = exclude_ids or set()
+
+    candidates = [p for p in pool if p.picto_id not in exclude_ids]
 
     if len(candidates) <= k:
         return candidates
 
     return random.sample(candidates, k)
 
+@timed("resolve")
 def resolve_term_to_picto_strict(term: str, lang: str = "fr", limit: int = 12, expected_type: str | None = None, add_to_cache: bool = True) -> Optional[ResolvedPicto]:
     """
     Strict resolver: only accept if term matches a keyword exactly (case/accents normalized).
     This avoids weird matches (e.g., proper names).
     """
+    return _resolve_strict(term, lang, limit, expected_type, add_to_cache)
+
+def _resolve_strict(term: str, lang: str, limit: int, expected_type: str | None, add_to_cache: bool) -> Optional[ResolvedPicto]:
+    # sans @timed: aussi appelé par le rafraîchissement de fond (hors latence des requêtes)
     term_norm = normalize_term(term)
     if not term_norm:
         return None
 
     client = ArasaacClient(lang=lang)
-    results = client.search(term_norm, limit=limit)
+    try:
+        results = client.search(term_norm, limit=limit)
+    except ArasaacUnavailable:
+        return _strict_from_cache(term, term_norm, lang, expected_type)
 
     best: Optional[Tuple[float, Dict[str, Any]]] = None
     for cand in results:
@@ -270,7 +361,7 @@ def resolve_term_to_picto_strict(term: str, lang: str = "fr", limit: int = 12, e
         kws = _extract_keywords(cand)
         if term_norm not in kws:
             continue  # strict: must be exact keyword
-        s = _score_candidate(term_norm, cand)
+        s = _score_candidate(term_norm, cand, kws)
         if best is None or s > best[0]:
             best = (s, cand)
 
@@ -290,15 +381,8 @@ def resolve_term_to_picto_strict(term: str, lang: str = "fr", limit: int = 12, e
 
         cache = _load_cache(lang)
 
-        cache[term_norm] = {
-            "picto_id": picto_id,
-            "url": url,
-            "score": score,
-            "tags": tags,
-            "categories": categories,
-            "keyword": kw,
-            "plural": pl,
-        }
+        cache[term_norm] = _cache_entry(picto_id, url, score, tags, categories, kw, pl,
+                                        resolver=RESOLVER_STRICT, expected_type=expected_type)
 
         _save_cache(lang, cache)
 
@@ -313,6 +397,27 @@ def resolve_term_to_picto_strict(term: str, lang: str = "fr", limit: int = 12, e
         plural=pl,
     )
 
+def _strict_from_cache(term: str, term_norm: str, lang: str = "fr", expected_type: str | None = None) -> Optional[ResolvedPicto]:
+    """Cache-only version of the strict resolver (ARASAAC unavailable): exact keyword match in the local cache."""
+    for r in rank_cached_pictos(term_norm, lang=lang):
+        if r.score < EXACT_SCORE:
+            break  # plus de correspondance exacte
+        if _matches_expected_type(expected_type, r.tags, r.categories):
+            incr("picto_cache_hits")
+            return ResolvedPicto(
+                term=term,
+                picto_id=r.picto_id,
+                url=r.url,
+                score=r.score,
+                tags=r.tags,
+                categories=r.categories,
+                keyword=r.keyword,
+                plural=r.plural,
+                source="cache",
+            )
+    incr("picto_cache_misses")
+    return None
+
 def _matches_expected_type(expected_type: str | None, tags: list[str], categories: list[str]) -> bool:
     if not expected_type:
         return True
@@ -326,12 +431,91 @@ def _matches_expected_type(expected_type: str | None, tags: list[str], categorie
     return bool(s & required)
 
 
+@timed("resolve")
 def resolve_many_terms_to_picto(terms: List[str], lang: str = "fr", limit: int = 12) -> Dict[str, Optional[ResolvedPicto]]:
     """
     Resolve multiple terms to pictograms.
     Returns a dictionary mapping each term to its resolved pictogram (or None if not found).
+    Batched: one cache lookup pass, network only for the misses, one save at the end.
     """
+    cache = _load_cache(lang)
     result: Dict[str, Optional[ResolvedPicto]] = {}
+    fetched = False
+
     for term in terms:
-        result[term] = resolve_term_to_picto(term, lang=lang, limit=limit)
+        if term in result:
+            continue
+        term_norm = normalize_term(term)
+        if not term_norm:
+            result[term] = None
+            continue
+
+        hit = _cached_resolved(term, term_norm, cache, lang)
+        if hit is None:
+            hit = _fetch_and_cache(term, term_norm, lang, limit, cache)
+            fetched = fetched or hit is not None
+        result[term] = hit
+
+    if fetched:
+        _save_cache(lang, cache)
     return result
+
+
+def _cache_keywords(term_norm: str, hit: Dict[str, Any]) -> List[str]:
+    """Normalized keywords known locally for a cache entry (term key, keyword, plural)."""
+    kws = [term_norm]
+    for x in (hit.get("keyword"), hit.get("plural")):
+        if x:
+            kws.append(normalize_term(str(x)))
+    return kws
+
+
+_KEYWORD_INDEXES: Dict[str, Tuple[int, KeywordIndex]] = {}
+
+
+def build_cache_keyword_index(lang: str = "fr") -> KeywordIndex:
+    """
+    Build (or reuse) the keyword index over the local cache.
+    Entry keys are the cache term keys; rebuilt when the cache changes.
+    """
+    version = _cache_version(lang)
+    known = _KEYWORD_INDEXES.get(lang)
+    if known is not None and known[0] == version:
+        return known[1]
+
+    index = KeywordIndex()
+    for term_norm, hit in _cache_items(lang):
+        index.add(term_norm, _cache_keywords(term_norm, hit))
+    _KEYWORD_INDEXES[lang] = (version, index)
+    return index
+
+
+def rank_cached_pictos(term: str, lang: str = "fr", limit: int = 12) -> List[ResolvedPicto]:
+    """
+    Rank cached pictograms for a term without any network call
+    (exact keyword > substring > any, same scores as `_score_candidate`).
+    """
+    term_norm = normalize_term(term)
+    if not term_norm:
+        return []
+
+    cache = _load_cache(lang)
+    index = build_cache_keyword_index(lang)
+
+    out: List[ResolvedPicto] = []
+    for score, key in index.search(term_norm, limit=limit):
+        hit = cache[key]
+        out.append(
+            ResolvedPicto(
+                term=key,
+                picto_id=int(hit["picto_id"]),
+                url=str(hit["url"]),
+                score=score,
+                tags=hit.get("tags", []) or [],
+                categories=hit.get("categories", []) or [],
+                keyword=hit.get("keyword"),
+                plural=hit.get("plural"),
+                source="cache",
+            )
+        )
+    return out
@@ -0,0 +1,211 @@
+"""
+Snapshot binaire, en lecture seule, du cache de pictogrammes.
+
+Compilé depuis le JSON (scripts/build_cache_snapshot.py), il est ouvert avec
+mmap : pas de json.load au démarrage, les pages sont partagées entre les
+processus (workers Streamlit, scripts), et un terme se cherche par recherche
+dichotomique dans la table triée, sans construire de dict Python.
+
+Format (little-endian) :
+    header   MAGIC, version, n_terms, n_pictos, offsets des sections
+    terms    n_terms x (str_off, str_len, picto_index, score,
+                        4 x (str_off, str_len) : keyword, plural, resolver, expected_type),
+             dans l'ordre du cache (champs propres au terme, voir qcmgen.pictos.cache)
+    sorted   n_terms x index dans terms, triés par octets UTF-8 du terme
+    pictos   n_pictos x (picto_id, fetched_at, schema_version,
+                         3 x (str_off, str_len) : url, tags, categories)
+    strings  blob UTF-8 (tags/categories joints par \\x1f)
+"""
+
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"QCMPSNP1"
+SNAPSHOT_VERSION = 3
+
+_HEADER = struct.Struct("<8sIIIQQQQ")
+_TERM = struct.Struct("<IIid" + "II" * 4)
+_INDEX = struct.Struct("<I")
+_PICTO = struct.Struct("<qdi" + "II" * 3)
+_NONE = 0xFFFFFFFF  # longueur réservée: champ absent (None)
+_SEP = "\x1f"
+
+
+def snapshot_path_for(json_path: str) -> str:
+    base, _ = os.path.splitext(json_path)
+    return base + ".bin"
+
+
+class _Strings:
+    def __init__(self):
+        self.blob = bytearray()
+        self._offsets: Dict[bytes, int] = {}
+
+    def add(self, s: Optional[str]) -> Tuple[int, int]:
+        if s is None:
+            return 0, _NONE
+        b = s.encode("utf-8")
+        off = self._offsets.get(b)
+        if off is None:
+            off = len(self.blob)
+            self.blob += b
+            self._offsets[b] = off
+        return off, len(b)
+
+
+def build_snapshot(flat: Dict[str, Dict[str, Any]], path: str) -> int:
+    """
+    Compile a term -> entry cache view into a snapshot file (written atomically,
+    so processes that mmapped the previous file keep a valid mapping).
+    Returns the number of terms.
+    """
+    strings = _Strings()
+
+    picto_index: Dict[int, int] = {}
+    picto_rows: List[bytes] = []
+    term_rows: List[Tuple[bytes, int, Dict[str, Any]]] = []
+
+    for term, hit in flat.items():
+        if hit.get("picto_id") is None or not hit.get("url"):
+            continue
+        picto_id = int(hit["picto_id"])
+        if picto_id not in picto_index:
+            fields = []
+            for value in (
+                str(hit["url"]),
+                _SEP.join(str(t) for t in (hit.get("tags") or [])),
+                _SEP.join(str(c) for c in (hit.get("categories") or [])),
+            ):
+                fields.extend(strings.add(value))
+            picto_index[picto_id] = len(picto_rows)
+            picto_rows.append(_PICTO.pack(
+                picto_id,
+                float(hit.get("fetched_at", 0.0)),
+                int(hit.get("schema_version", 0)),
+                *fields,
+            ))
+        term_rows.append((term.encode("utf-8"), picto_index[picto_id], hit))
+
+    terms_blob = bytearray()
+    for b, idx, hit in term_rows:
+        off, length = strings.add(b.decode("utf-8"))
+        fields = []
+        for value in (hit.get("keyword"), hit.get("plural"), hit.get("resolver"), hit.get("expected_type")):
+            fields.extend(strings.add(value))
+        terms_blob += _TERM.pack(off, length, idx, float(hit.get("score", 0.0)), *fields)
+    # l'ordre du cache est conservé pour l'itération (les pools échantillonnés en dépendent),
+    # la recherche passe par un index trié à part
+    order = sorted(range(len(term_rows)), key=lambda i: term_rows[i][0])
+    sorted_blob = b"".join(_INDEX.pack(i) for i in order)
+
+    terms_off = _HEADER.size
+    sorted_off = terms_off + len(terms_blob)
+    pictos_off = sorted_off + len(sorted_blob)
+    strings_off = pictos_off + _PICTO.size * len(picto_rows)
+    header = _HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(term_rows), len(picto_rows),
+                          terms_off, sorted_off, pictos_off, strings_off)
+
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(terms_blob)
+        f.write(sorted_blob)
+        for row in picto_rows:
+            f.write(row)
+        f.write(strings.blob)
+    os.replace(tmp, path)
+    return len(term_rows)
+
+
+class CacheSnapshot:
+    """Read-only, memory-mapped snapshot. Entries are decoded on demand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_terms, n_pictos, terms_off, sorted_off, pictos_off, strings_off = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            self._mm.close()
+            raise ValueError(f"Not a picto cache snapshot (v{SNAPSHOT_VERSION}): {path}")
+        self.n_terms = n_terms
+        self.n_pictos = n_pictos
+        self._terms_off = terms_off
+        self._sorted_off = sorted_off
+        self._pictos_off = pictos_off
+        self._strings_off = strings_off
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.n_terms
+
+    def _bytes(self, off: int, length: int) -> Optional[bytes]:
+        if length == _NONE:
+            return None
+        start = self._strings_off + off
+        return self._mm[start:start + length]
+
+    def _term_row(self, i: int) -> Tuple[bytes, int]:
+        off, length, idx = _TERM.unpack_from(self._mm, self._terms_off + i * _TERM.size)[:3]
+        return self._bytes(off, length), idx
+
+    def _sorted_row(self, rank: int) -> int:
+        return _INDEX.unpack_from(self._mm, self._sorted_off + rank * _INDEX.size)[0]
+
+    def _find(self, term: str) -> int:
+        """Index of term in the terms table (dichotomie sur l'index trié), -1 if absent."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            b, _ = self._term_row(self._sorted_row(mid))
+            if b < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_terms:
+            i = self._sorted_row(lo)
+            if self._term_row(i)[0] == key:
+                return i
+        return -1
+
+    def _entry(self, i: int) -> Dict[str, Any]:
+        """Entry of the i-th term: its picto record plus its own fields."""
+        term_row = _TERM.unpack_from(self._mm, self._terms_off + i * _TERM.size)
+        idx, score = term_row[2], term_row[3]
+        kw, pl, resolver, expected = (self._bytes(term_row[4 + 2 * k], term_row[5 + 2 * k]) for k in range(4))
+        row = _PICTO.unpack_from(self._mm, self._pictos_off + idx * _PICTO.size)
+        picto_id, fetched_at, schema_version = row[:3]
+        url, tags, cats = (self._bytes(row[3 + 2 * k], row[4 + 2 * k]) for k in range(3))
+        entry = {
+            "picto_id": picto_id,
+            "url": url.decode("utf-8"),
+            "score": score,
+            "tags": tags.decode("utf-8").split(_SEP) if tags else [],
+            "categories": cats.decode("utf-8").split(_SEP) if cats else [],
+            "keyword": kw.decode("utf-8") if kw is not None else None,
+            "plural": pl.decode("utf-8") if pl is not None else None,
+        }
+        if schema_version:
+            entry["fetched_at"] = fetched_at
+            entry["schema_version"] = schema_version
+            entry["resolver"] = resolver.decode("utf-8") if resolver is not None else None
+            entry["expected_type"] = expected.decode("utf-8") if expected is not None else None
+        return entry
+
+    def __contains__(self, term: str) -> bool:
+        return self._find(term) >= 0
+
+    def get(self, term: str) -> Optional[Dict[str, Any]]:
+        i = self._find(term)
+        if i < 0:
+            return None
+        return self._entry(i)
+
+    def terms(self) -> Iterator[str]:
+        for i in range(self.n_terms):
+            yield self._term_row(i)[0].decode("utf-8")
@@ -0,0 +1,177 @@
+"""
+Pipeline complet texte -> fiche de QCM, indépendant de Streamlit.
+
+`generate_worksheet` enchaîne analyse du texte (ou appel LLM), génération
+"picto-aware", résolution des pictos des choix et filtrage. L'app le lance en
+tâche de fond (qcmgen.jobs) : avec un `job`, chaque étape publie sa progression
+et peut être annulée entre deux résolutions.
+
+Les quasi-doublons d'une même fiche (qcmgen.dedup) sont écartés à la fin.
+
+Chaque génération renvoie sa trace (qcmgen.metrics) : temps par étape et
+compteurs (cache, appels réseau, questions écartées), affichés en mode debug.
+
+`prefetch_worksheet` fait le travail spéculatif pendant la saisie : analyse du
+texte et résolution des bonnes réponses probables, pour que le clic sur
+"Générer" tombe sur des caches chauds.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from qcmgen.deadline import Deadline
+from qcmgen.jobs import BackgroundJob
+from qcmgen.metrics import Trace, incr, span
+from qcmgen.nlp import extract_facts_cached
+from qcmgen.pictos.arasaac_client import is_cache_only
+from qcmgen.profiling import profiled
+from qcmgen.pictos.resolve import resolve_many_terms_to_picto
+from qcmgen.qcm import (
+    QCM,
+    PictoResolver,
+    QuestionType,
+    _normalize_answer,
+    default_picto_resolver,
+    generate_payloads,
+    generate_qcms_for_facts,
+)
+
+# attach(qcms, progress) remplit q.pictos; progress(done, total) après chaque choix résolu
+AttachFn = Callable[[List[QCM], Optional[Callable[[int, int], None]]], List[QCM]]
+
+
+@dataclass
+class GenerationResult:
+    qcms: List[QCM]
+    cut: List[str] = field(default_factory=list)  # étapes coupées par le budget de temps
+    cache_only: bool = False  # ARASAAC indisponible pendant la génération
+    elapsed_s: float = 0.0
+    trace: Optional[Trace] = None  # temps par étape et compteurs de cette génération
+    profile: Optional[str] = None  # chemin du profil (sans extension) quand la génération a été profilée
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.cut) or self.cache_only
+
+
+def _tracked_resolver(resolver: PictoResolver, job: Optional[BackgroundJob], stage: str, total: int) -> PictoResolver:
+    """Resolver wrapper reporting done/total to the job (and stopping there on cancellation)."""
+    if job is None:
+        return resolver
+    count = [0]
+
+    def resolve(term: str):
+        job.check_cancelled()
+        picto = resolver(term)
+        count[0] += 1
+        job.report(stage, count[0], max(total, count[0]))
+        return picto
+    return resolve
+
+
+def generate_worksheet(text: str, use_llm_generation: bool = False, require_pictos: bool = True,
+                       items: Optional[dict] = None, picto_resolver: Optional[PictoResolver] = None,
+                       attach: Optional[AttachFn] = None, distractor_engine=None,
+                       budget_s: Optional[float] = None, job: Optional[BackgroundJob] = None,
+                       profile: Optional[str] = None) -> GenerationResult:
+    """
+    Generate the QCMs of a text within budget_s seconds (None: no limit).
+    With require_pictos, questions without a picto for every choice are dropped.
+    profile ("cpu", "mem", "all"; None: QCMGEN_PROFILE) profiles this call, see qcmgen.profiling.
+    """
+    deadline = Deadline(budget_s)
+    resolver = picto_resolver or default_picto_resolver
+    trace = Trace()
+
+    with profiled("generation", text, profile) as run, trace.activate(), span("generation"):
+        result = _generate_worksheet(text, use_llm_generation, require_pictos, items, resolver, attach,
+                                     distractor_engine, deadline, job)
+    result.trace = trace
+    result.profile = run.path if run is not None else None
+    return result
+
+
+def _generate_worksheet(text: str, use_llm_generation: bool, require_pictos: bool, items: Optional[dict],
+                        resolver: PictoResolver, attach: Optional[AttachFn], distractor_engine,
+                        deadline: Deadline, job: Optional[BackgroundJob]) -> GenerationResult:
+    with deadline.activate():  # borne aussi les appels ARASAAC de attach
+        if use_llm_generation:
+            from qcmgen.llm import generate_qcms_from_text_llm
+
+            if job is not None:
+                job.report("llm")
+            qcms = generate_qcms_from_text_llm(text, items or {}, require_pictos=require_pictos,
+                                               picto_resolver=_tracked_resolver(resolver, job, "answers", 0),
+                                               distractor_engine=distractor_engine, deadline=deadline)
+        else:
+            if job is not None:
+                job.report("parse")
+            facts = extract_facts_cached(text, deadline=deadline)
+
+            n_answers = len({_normalize_answer(p.correct) for f in facts for p in generate_payloads(f)})
+            if job is not None:
+                job.report("answers", 0, n_answers)
+            qcms = generate_qcms_for_facts(facts, require_pictos=require_pictos,
+                                           picto_resolver=_tracked_resolver(resolver, job, "answers", n_answers),
+                                           distractor_engine=distractor_engine, deadline=deadline)
+
+        print(len(qcms), "QCM générés avant filtrage.")
+
+        # Résolution groupée des pictos de tous les choix (une seule fois par choix).
+        # Avec require_pictos, la génération les a déjà remplis: cette étape ne fait rien.
+        if attach is not None:
+            progress = (lambda done, total: job.report("pictos", done, total)) if job is not None else None
+            attach(qcms, progress)
+        cache_only = is_cache_only()
+
+    if require_pictos:
+        # Filtrer les QCM sans pictos valides (filet de sécurité, normalement aucun)
+        filtered = []
+        for q in qcms:
+            if q.has_all_pictos():
+                filtered.append(q)
+            else:
+                incr("questions_dropped")
+                print(f'Removing question {q.question} with choices {q.choices}')
+                print(f'pictos found: {[p is not None for p in (q.pictos or [])]}')
+        qcms = filtered
+        print(len(qcms), "QCM générés après filtrage.")
+
+    # quasi-doublons (« Que mange le chat ? » / « Que mange le petit chat ? »): le premier reste
+    from qcmgen.dedup import drop_near_duplicates  # numpy: importé à la première génération seulement
+
+    qcms, near_duplicates = drop_near_duplicates(qcms)
+    for q in near_duplicates:
+        incr("questions_near_duplicate")
+        print(f"Removing near-duplicate question {q.question} -> {q.choices[q.answer_index]}")
+
+    print(f"Génération en {deadline.elapsed():.2f}s, étapes coupées: {deadline.cut}")
+    return GenerationResult(qcms=qcms, cut=list(deadline.cut), cache_only=cache_only, elapsed_s=deadline.elapsed())
+
+
+def prefetch_worksheet(text: str, picto_resolver: Optional[PictoResolver] = None,
+                       job: Optional[BackgroundJob] = None) -> int:
+    """
+    Speculative work for a text that is not submitted yet: parse it (facts cache),
+    then resolve its likely answers (subjects, objects, adjective-noun heads) with the
+    same resolver and the same batched ARASAAC lookup as generation, so that both
+    warm up. Cancellable between two terms. Returns the number of answers resolved.
+    """
+    if job is not None:
+        job.report("parse")
+    facts = extract_facts_cached(text)
+    payloads = [p for f in facts for p in generate_payloads(f)]
+
+    answers = list(dict.fromkeys(_normalize_answer(p.correct) for p in payloads))
+    resolver = _tracked_resolver(picto_resolver or default_picto_resolver, job, "answers", len(answers))
+    for answer in answers:
+        resolver(answer)
+
+    # métadonnées ARASAAC des réponses OBJECT / ADJ_NOUN (même lot que payloads_to_qcms)
+    terms = [_normalize_answer(p.correct).strip().lower() for p in payloads
+             if p.qtype in (QuestionType.OBJECT, QuestionType.ADJ_NOUN) and p.correct.strip()]
+    if terms:
+        if job is not None:
+            job.check_cancelled()
+        resolve_many_terms_to_picto(terms, lang="fr")
+    return len(answers)
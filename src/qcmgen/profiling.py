@@ -0,0 +1,143 @@
+"""
+Profilage à la demande d'une génération ou d'un export PDF.
+
+Désactivé par défaut. QCMGEN_PROFILE=cpu (cProfile), mem (tracemalloc) ou all
+active le profilage de chaque appel de `generate_worksheet` / `build_pdf` ;
+l'app peut aussi le demander pour une seule génération (mode debug), et
+scripts/profile_generation.py rejoue une requête profilée dans un processus neuf
+(chargement de spaCy et lecture du cache compris).
+
+Chaque appel profilé écrit dans QCMGEN_PROFILE_DIR (data/profiles par défaut) :
+
+    20261019-143000-125-generation-3f2a9c1e.json         nom, empreinte de l'entrée, durée, pic mémoire
+    20261019-143000-125-generation-3f2a9c1e.prof         pstats (cProfile)
+    20261019-143000-125-generation-3f2a9c1e.tracemalloc  snapshot tracemalloc
+
+Seuls les QCMGEN_PROFILE_KEEP derniers profils sont gardés (20 par défaut).
+scripts/show_profile.py affiche les points chauds d'un profil.
+
+cProfile ne suit que le thread appelant, tracemalloc tout le processus : un seul
+profil tourne à la fois, un appel qui arrive pendant ce temps n'est pas profilé.
+"""
+
+import cProfile
+import hashlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from qcmgen.pictos.cache import data_dir_path
+
+MODES = ("cpu", "mem", "all")
+TRACEMALLOC_FRAMES = 10
+
+_ACTIVE = threading.Lock()
+
+
+def profile_mode(mode: Optional[str] = None) -> Optional[str]:
+    """Effective mode: `mode` if given, else QCMGEN_PROFILE ("1"/"true" mean all); None when off."""
+    mode = (mode if mode is not None else os.environ.get("QCMGEN_PROFILE", "")).strip().lower()
+    if mode in ("1", "true", "yes"):
+        return "all"
+    return mode if mode in MODES else None
+
+
+def profile_dir() -> Path:
+    override = os.environ.get("QCMGEN_PROFILE_DIR")
+    path = Path(override) if override else data_dir_path() / "profiles"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def input_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+class ProfileRun:
+    """Where one profiled call is written; `path` (stem, without extension) is set once it is saved."""
+
+    def __init__(self, name: str, key: str, mode: str):
+        self.name = name
+        self.key = key
+        self.mode = mode
+        self.path: Optional[str] = None
+
+
+def list_profiles(directory: Optional[Path] = None) -> List[Path]:
+    """Metadata files of the saved profiles, oldest first."""
+    return sorted((directory or profile_dir()).glob("*.json"))
+
+
+def _rotate(directory: Path, keep: int) -> None:
+    metas = list_profiles(directory)
+    for meta in metas[:max(0, len(metas) - keep)]:
+        for f in directory.glob(meta.stem + ".*"):
+            try:
+                f.unlink()
+            except OSError:
+                pass
+
+
+@contextmanager
+def profiled(name: str, key_text: str, mode: Optional[str] = None):
+    """
+    Profile the enclosed block when profiling is on (see profile_mode).
+    Yields a ProfileRun, or None when the block is not profiled.
+    """
+    mode = profile_mode(mode)
+    if mode is None or not _ACTIVE.acquire(blocking=False):
+        yield None
+        return
+
+    run = ProfileRun(name, input_hash(key_text), mode)
+    profiler = cProfile.Profile() if mode in ("cpu", "all") else None
+    trace_mem = mode in ("mem", "all") and not tracemalloc.is_tracing()
+    try:
+        if trace_mem:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        started = time.perf_counter()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError as e:  # autre profileur déjà actif (débogueur, Python 3.12+)
+                print(f"cProfile unavailable: {e}")
+                profiler = None
+        try:
+            yield run
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            snapshot, peak = None, None
+            if trace_mem:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            _save(run, profiler, snapshot, elapsed, peak)
+    finally:
+        _ACTIVE.release()
+
+
+def _save(run: ProfileRun, profiler, snapshot, elapsed: float, peak: Optional[int]) -> None:
+    try:
+        directory = profile_dir()
+        stem = directory / f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]}-{run.name}-{run.key}"
+        if profiler is not None:
+            profiler.dump_stats(str(stem) + ".prof")
+        if snapshot is not None:
+            snapshot.dump(str(stem) + ".tracemalloc")
+        meta = {"name": run.name, "input_hash": run.key, "mode": run.mode, "elapsed_s": round(elapsed, 4),
+                "peak_bytes": peak, "created_at": time.time(), "pid": os.getpid()}
+        with open(str(stem) + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        run.path = str(stem)
+        _rotate(directory, int(os.environ.get("QCMGEN_PROFILE_KEEP", "20")))
+        print(f"Profile written to {stem}.* ({elapsed:.2f}s)")
+    except OSError as e:
+        print(f"Could not write profile {run.name}: {e}")
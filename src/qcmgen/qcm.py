@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from contextlib import nullcontext
 from enum import Enum
 import random
 from typing import Callable, Dict
+from qcmgen.deadline import Deadline
+from qcmgen.metrics import incr, span
 from qcmgen.nlp import Fact
-from qcmgen.pictos.resolve import resolve_term_to_picto, sample_cached_by_tag
+from qcmgen.pictos.resolve import (
+    ResolvedPicto,
+    cached_pictos_by_tag,
+    lookup_cached_picto,
+    resolve_many_terms_to_picto,
+    resolve_term_to_picto,
+    sample_from_pool,
+)
 
 
 
@@ -44,6 +54,12 @@ QUESTION_SPECS = {
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
+@dataclass(frozen=True)
+class ChoicePicto:
+    picto_id: int
+    url: str
+    variant: Optional[str] = None  # variante du terme qui a trouvé le picto (lemme, singulier, ...)
+
 @dataclass
 class QCM:
     question: str
@@ -52,6 +68,14 @@ class QCM:
     qtype: QuestionType
     rationale: Optional[str] = None
     paragraph: Optional[str] = None  # contexte/source
+    pictos: Optional[List[Optional[ChoicePicto]]] = None  # un par choix, None tant que non résolu
+
+    def has_all_pictos(self) -> bool:
+        return self.pictos is not None and all(p is not None for p in self.pictos)
+
+    def picto_urls(self) -> List[Optional[str]]:
+        pictos = self.pictos or [None] * len(self.choices)
+        return [p.url if p is not None else None for p in pictos]
 
 from typing import Dict
 
@@ -127,10 +151,18 @@ def build_choices_with_arasaac(correct: str, category : str = "animals", k: int
         return build_choices(correct, category, k)
 
     r = resolve_term_to_picto(correct_norm, lang="fr")
+    return _build_choices_from_resolved(correct, r, category, k)
+
+def _build_choices_from_resolved(correct: str, r: Optional[ResolvedPicto], category: str = "animals", k: int = 3,
+                                 animal_pool: Optional[List[ResolvedPicto]] = None) -> tuple[list[str], int]:
+    """build_choices_with_arasaac once the answer is resolved (animal_pool: precomputed 'animal' tag pool)."""
+    correct_norm = correct.strip().lower()
 
     # If we can detect it's an animal, sample other animals from cache
     if r is not None and ("animal" in (r.tags or [])):
-        distract_pictos = sample_cached_by_tag("animal", k=k, exclude_ids={r.picto_id}, lang="fr")
+        if animal_pool is None:
+            animal_pool = cached_pictos_by_tag("animal", lang="fr")
+        distract_pictos = sample_from_pool(animal_pool, k=k, exclude_ids={r.picto_id})
         distract_terms = []
         for p in distract_pictos:
             if "verb" in (p.tags or []) or "verb" in (p.categories or []):
@@ -142,7 +174,6 @@ def build_choices_with_arasaac(correct: str, category : str = "animals", k: int
         distract_terms = [d for d in distract_terms if d.lower() != correct_norm]
         if len(distract_terms) >= k:
             choices = distract_terms[:k] + [correct]
-            import random
             random.shuffle(choices)
             return choices, choices.index(correct)
 
@@ -150,29 +181,243 @@ def build_choices_with_arasaac(correct: str, category : str = "animals", k: int
     return build_choices(correct, category, k)
 
 
-def _normalize_answer(s: str) -> str:
-    return " ".join(s.strip().split())
+# Génération "picto-aware": on ne tire les distracteurs que parmi des termes
+# dont le picto est déjà connu, et on vérifie la bonne réponse avant de construire les choix.
+
+PictoResolver = Callable[[str], Optional[ChoicePicto]]
 
-def payload_to_qcm(payload: QcmPayload) -> QCM:
-    question = payload.template.format(**payload.template_vars) #remplir les variables du template (ex : "Que {verb} {subj} ?".format(verb="voir", subj="Martin") => "Que voir Martin ?") 
+def default_picto_resolver(term: str) -> Optional[ChoicePicto]:
+    r = resolve_term_to_picto(term, lang="fr")
+    return ChoicePicto(picto_id=r.picto_id, url=r.url, variant=r.term) if r else None
 
-    correct = _normalize_answer(payload.correct)
-    if payload.qtype == QuestionType.SUBJECT:
-        choices, answer_index = build_choices(correct, "people", k=3)
-    elif payload.qtype in (QuestionType.OBJECT, QuestionType.ADJ_NOUN):
-        choices, answer_index = build_choices_with_arasaac(correct, k=3)
+def verified_pool(pool_name: str, lang: str = "fr") -> List[Tuple[str, ChoicePicto]]:
+    """Terms of a distractor pool that have a picto in the local cache (no network)."""
+    out = []
+    for term in POOLS[pool_name]:
+        r = lookup_cached_picto(term, lang=lang)
+        if r is not None:
+            out.append((term, ChoicePicto(picto_id=r.picto_id, url=r.url, variant=r.term)))
+    return out
+
+def _cached_answer(correct: str, correct_picto: ChoicePicto) -> Optional[ResolvedPicto]:
+    """ARASAAC metadata of an answer already resolved to correct_picto, read from the local cache (no network)."""
+    r = lookup_cached_picto(correct_picto.variant or correct, lang="fr")
+    return r if r is not None and r.picto_id == correct_picto.picto_id else None
+
+def build_choices_verified(correct: str, correct_picto: ChoicePicto, pool_name: str, k: int = 3,
+                           use_arasaac: bool = False) -> Optional[Tuple[List[str], int, List[ChoicePicto]]]:
+    """
+    Build k+1 choices where every choice has a picto.
+    Distractors come from the picto-verified pools only (cache tag pool when the answer
+    is an animal and use_arasaac is set, the fixed pool otherwise).
+    Returns None if there are not enough verified distractors.
+    """
+    r = None
+    if use_arasaac:
+        r = _cached_answer(correct, correct_picto) or resolve_term_to_picto(correct.strip().lower(), lang="fr")
+    return _build_verified_from_resolved(correct, correct_picto, r, pool_name, k)
+
+def _build_verified_from_resolved(correct: str, correct_picto: ChoicePicto, r: Optional[ResolvedPicto], pool_name: str,
+                                  k: int = 3, animal_pool: Optional[List[ResolvedPicto]] = None,
+                                  verified: Optional[List[Tuple[str, ChoicePicto]]] = None,
+                                  ) -> Optional[Tuple[List[str], int, List[ChoicePicto]]]:
+    """build_choices_verified once the answer is resolved (animal_pool / verified: pools precomputed for the batch)."""
+    correct_norm = correct.strip().lower()
+    distractors: List[Tuple[str, ChoicePicto]] = []
+
+    if r is not None and ("animal" in (r.tags or [])):
+        if animal_pool is None:
+            animal_pool = cached_pictos_by_tag("animal", lang="fr")
+        exclude = {r.picto_id, correct_picto.picto_id}
+        for p in sample_from_pool(animal_pool, k=k, exclude_ids=exclude):
+            if "verb" in (p.tags or []) or "verb" in (p.categories or []):
+                continue
+            term = p.keyword if p.keyword else p.term
+            if term.lower() != correct_norm:
+                distractors.append((term, ChoicePicto(picto_id=p.picto_id, url=p.url, variant=p.term)))
+
+    if len(distractors) < k:
+        if verified is None:
+            verified = verified_pool(pool_name)
+        pool = [(t, p) for t, p in verified
+                if t.lower() != correct_norm and p.picto_id != correct_picto.picto_id]
+        if len(pool) < k:
+            return None
+        distractors = random.sample(pool, k)
+
+    choices = distractors[:k] + [(correct, correct_picto)]
+    random.shuffle(choices)
+    terms = [t for t, _ in choices]
+    return terms, terms.index(correct), [p for _, p in choices]
+
+def _engine_category(engine, correct: str, r: Optional[ResolvedPicto]) -> Optional[str]:
+    """Category of an answer for the distractor engine: known term, else first matching ARASAAC tag."""
+    cat = engine.category_of(correct)
+    if cat is None and r is not None:
+        cat = next((t for t in (r.tags or []) if t in engine.category_names), None)
+    return cat
+
+def _choices_from_picks(correct: str, picks: List[str], correct_picto: Optional[ChoicePicto]):
+    """Shuffle engine picks with the answer; with a correct_picto every pick must have a cached picto."""
+    pictos = None
+    if correct_picto is not None:
+        found = [lookup_cached_picto(t, lang="fr") for t in picks]
+        if any(p is None for p in found):
+            return None
+        pairs = [(t, ChoicePicto(picto_id=p.picto_id, url=p.url, variant=p.term)) for t, p in zip(picks, found)]
+        pairs.append((correct, correct_picto))
+        random.shuffle(pairs)
+        choices = [t for t, _ in pairs]
+        pictos = [p for _, p in pairs]
     else:
-        choices, answer_index = build_choices(correct, payload.pool_name, k=3)
+        choices = list(picks) + [correct]
+        random.shuffle(choices)
+    return choices, choices.index(correct), pictos
 
+def _normalize_answer(s: str) -> str:
+    return " ".join(s.strip().split())
 
-    return QCM(
-        question=question,
-        choices=choices,
-        answer_index=answer_index,
-        qtype=payload.qtype,
-        rationale=payload.rationale,
-        paragraph=None,
-    )
+def payload_to_qcm(payload: QcmPayload, require_pictos: bool = False,
+                   picto_resolver: Optional[PictoResolver] = None) -> Optional[QCM]:
+    """
+    Convert a payload into a QCM.
+    With require_pictos, the correct answer must resolve first and distractors are drawn
+    from picto-verified pools only: returns None instead of a QCM that would be filtered out later.
+    """
+    return payloads_to_qcms([payload], require_pictos=require_pictos, picto_resolver=picto_resolver)[0]
+
+def payloads_to_qcms(payloads: List[QcmPayload], require_pictos: bool = False,
+                     picto_resolver: Optional[PictoResolver] = None,
+                     distractor_engine=None, deadline: Optional[Deadline] = None) -> List[Optional[QCM]]:
+    """
+    Batch version of payload_to_qcm (all payloads of a text, or of many texts).
+    1. every unique correct answer that needs ARASAAC metadata is resolved in one batched lookup,
+    2. distractor pools are fetched once per tag,
+    3. QCMs are built in payload order, so random draws (and the output under a fixed seed)
+       are the same as mapping payload_to_qcm one by one.
+    With a distractor_engine (qcmgen.distractors), OBJECT/ADJ_NOUN distractors are picked
+    by vector similarity for the whole batch at once (this changes the draws).
+    With a deadline, ARASAAC calls are bounded by the remaining budget and, once it is
+    spent, answers are resolved from the local cache only (see qcmgen.deadline).
+    Returns one entry per payload (None when require_pictos drops it).
+    """
+    with deadline.activate() if deadline is not None else nullcontext():
+        return _payloads_to_qcms(payloads, require_pictos, picto_resolver, distractor_engine)
+
+def _payloads_to_qcms(payloads: List[QcmPayload], require_pictos: bool,
+                      picto_resolver: Optional[PictoResolver], distractor_engine) -> List[Optional[QCM]]:
+    corrects = [_normalize_answer(p.correct) for p in payloads]
+    arasaac = [p.qtype in (QuestionType.OBJECT, QuestionType.ADJ_NOUN) for p in payloads]
+
+    # 1. une seule résolution groupée des bonnes réponses
+    answer_pictos: Dict[str, Optional[ChoicePicto]] = {}
+    if require_pictos:
+        resolver = picto_resolver or default_picto_resolver
+        for c in corrects:
+            if c not in answer_pictos:
+                answer_pictos[c] = resolver(c)
+
+    # métadonnées ARASAAC (tags): une réponse déjà résolue ci-dessus est lue dans le cache local,
+    # seules les autres passent par resolve_many_terms_to_picto
+    resolved: Dict[str, Optional[ResolvedPicto]] = {}
+    to_resolve = []
+    for c, a in zip(corrects, arasaac):
+        key = c.strip().lower()
+        if not a or not key or key in resolved:
+            continue
+        if require_pictos:
+            if answer_pictos[c] is None:
+                continue
+            r = _cached_answer(c, answer_pictos[c])
+            if r is not None:
+                resolved[key] = r
+                continue
+        to_resolve.append(key)
+    if to_resolve:
+        resolved.update(resolve_many_terms_to_picto(to_resolve, lang="fr"))
+
+    # 2. et 3. distracteurs et construction des QCM
+    with span("distractors"):
+        return _build_qcms(payloads, corrects, arasaac, answer_pictos, resolved, require_pictos, distractor_engine)
+
+def _build_qcms(payloads: List[QcmPayload], corrects: List[str], arasaac: List[bool],
+                answer_pictos: Dict[str, Optional[ChoicePicto]], resolved: Dict[str, Optional[ResolvedPicto]],
+                require_pictos: bool, distractor_engine) -> List[Optional[QCM]]:
+    """Steps 2 and 3 of _payloads_to_qcms: distractor pools, then the QCMs in payload order."""
+    # 2. pools de distracteurs par tag, calculés une fois pour le lot
+    animal_pool = cached_pictos_by_tag("animal", lang="fr") if any(
+        r is not None and "animal" in (r.tags or []) for r in resolved.values()) else None
+    verified_pools: Dict[str, List[Tuple[str, ChoicePicto]]] = {}
+    if require_pictos:
+        for payload in payloads:
+            pool_name = "people" if payload.qtype == QuestionType.SUBJECT else payload.pool_name
+            if pool_name not in verified_pools:
+                verified_pools[pool_name] = verified_pool(pool_name)
+
+    # distracteurs par similarité: un seul appel au moteur pour tout le lot
+    engine_picks: Dict[int, List[str]] = {}
+    if distractor_engine is not None:
+        batch = [i for i, a in enumerate(arasaac) if a and corrects[i].strip()
+                 and (not require_pictos or answer_pictos[corrects[i]] is not None)]
+        categories = [_engine_category(distractor_engine, corrects[i], resolved.get(corrects[i].strip().lower())) for i in batch]
+        for i, picks in zip(batch, distractor_engine.pick([corrects[i] for i in batch], categories, k=3)):
+            if len(picks) == 3:
+                engine_picks[i] = picks
+
+    # 3. construction dans l'ordre des payloads
+    qcms: List[Optional[QCM]] = []
+    for i, (payload, correct, use_arasaac) in enumerate(zip(payloads, corrects, arasaac)):
+        question = payload.template.format(**payload.template_vars) #remplir les variables du template (ex : "Que {verb} {subj} ?".format(verb="voir", subj="Martin") => "Que voir Martin ?") 
+        r = resolved.get(correct.strip().lower()) if use_arasaac else None
+
+        # avec require_pictos, une bonne réponse sans picto écarte la question, moteur ou non
+        correct_picto = answer_pictos[correct] if require_pictos else None
+        if require_pictos and correct_picto is None:
+            incr("questions_dropped")
+            qcms.append(None)
+            continue
+
+        if i in engine_picks:
+            built = _choices_from_picks(correct, engine_picks[i], correct_picto)
+            if built is not None:
+                choices, answer_index, pictos = built
+                qcms.append(QCM(question=question, choices=choices, answer_index=answer_index, qtype=payload.qtype,
+                                rationale=payload.rationale, paragraph=None, pictos=pictos))
+                continue
+
+        if require_pictos:
+            pool_name = "people" if payload.qtype == QuestionType.SUBJECT else payload.pool_name
+            built = _build_verified_from_resolved(correct, correct_picto, r, pool_name, k=3, animal_pool=animal_pool,
+                                                  verified=verified_pools[pool_name])
+            if built is None:
+                incr("questions_dropped")
+                qcms.append(None)
+                continue
+            choices, answer_index, pictos = built
+
+        else:
+            pictos = None
+            if payload.qtype == QuestionType.SUBJECT:
+                choices, answer_index = build_choices(correct, "people", k=3)
+            elif use_arasaac:
+                if correct.strip():
+                    choices, answer_index = _build_choices_from_resolved(correct, r, k=3, animal_pool=animal_pool)
+                else:
+                    choices, answer_index = build_choices(correct, "animals", k=3)
+            else:
+                choices, answer_index = build_choices(correct, payload.pool_name, k=3)
+
+        qcms.append(QCM(
+            question=question,
+            choices=choices,
+            answer_index=answer_index,
+            qtype=payload.qtype,
+            rationale=payload.rationale,
+            paragraph=None,
+            pictos=pictos,
+        ))
+
+    return qcms
  
 
 # Fonctions d'expansion pour chaque type de question
@@ -264,8 +509,30 @@ def generate_payloads(fact: Fact) -> List[QcmPayload]:
 
     return unique_payloads
 
-def generate_qcms(fact: Fact, max_qcms: int = 6) -> List[QCM]:
-    payloads = generate_payloads(fact)
-    qcms = [payload_to_qcm(p) for p in payloads]
-    return qcms[:max_qcms]
+def generate_qcms(fact: Fact, max_qcms: int = 6, require_pictos: bool = False,
+                  picto_resolver: Optional[PictoResolver] = None) -> List[QCM]:
+    return generate_qcms_for_facts([fact], max_qcms=max_qcms, require_pictos=require_pictos,
+                                   picto_resolver=picto_resolver)
+
+def generate_qcms_for_facts(facts: List[Fact], max_qcms: int = 6, require_pictos: bool = False,
+                            picto_resolver: Optional[PictoResolver] = None,
+                            distractor_engine=None, deadline: Optional[Deadline] = None) -> List[QCM]:
+    """
+    Generate the QCMs of many facts (a whole text, or many texts) with one batched
+    payload conversion. Same output as calling generate_qcms on each fact in order.
+    max_qcms applies per fact. With a deadline, see payloads_to_qcms.
+    """
+    with span("payloads"):
+        per_fact = [generate_payloads(fact) for fact in facts]
+    converted = payloads_to_qcms([p for payloads in per_fact for p in payloads],
+                                 require_pictos=require_pictos, picto_resolver=picto_resolver,
+                                 distractor_engine=distractor_engine, deadline=deadline)
+
+    qcms: List[QCM] = []
+    start = 0
+    for payloads in per_fact:
+        fact_qcms = [q for q in converted[start:start + len(payloads)] if q is not None]
+        qcms.extend(fact_qcms[:max_qcms])
+        start += len(payloads)
+    return qcms
 
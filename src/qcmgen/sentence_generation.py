@@ -1,14 +1,16 @@
-from dotenv import load_dotenv
 from pathlib import Path
 import os
 import sys
 import json
-from openai import OpenAI
+
+from qcmgen.metrics import span
 
 def generate_text(nb_phrases: int = 1, complexity: int = 2):
     """
     Generate sentences which will be used to extract questions after
     """
+    from dotenv import load_dotenv
+    from openai import OpenAI
 
     # get api key and setup client
     project_root = Path(__file__).parent.parent
@@ -23,10 +25,11 @@ def generate_text(nb_phrases: int = 1, complexity: int = 2):
     llm_prompt = open(project_root.parent / "scripts" / "llm_text_generation_prompt.txt").read().strip()
     llm_prompt += '\n' + f' Complexity : {complexity} - num_paragraphs : {nb_phrases}'
     client = OpenAI(api_key=api_key)
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=llm_prompt,
-        input="Generate the JSON now")
+    with span("llm"):
+        resp = client.responses.create(
+            model="gpt-4o-mini",
+            instructions=llm_prompt,
+            input="Generate the JSON now")
     
     raw = resp.output_text
     data = json.loads(raw)
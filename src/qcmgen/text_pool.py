@@ -0,0 +1,191 @@
+"""
+Réserve locale de textes pré-générés par le LLM (data/text_pool.json).
+
+Au lieu d'un appel OpenAI bloquant à chaque clic sur "Générer le texte", on tire
+un texte (paragraphes + items) déjà généré pour le couple (complexité, nombre
+de phrases). Une session ne revoit pas un texte déjà tiré. Quand il reste moins
+de LOW_WATER textes pour un couple, une tâche de fond (qcmgen.jobs) en génère
+par lot jusqu'à TARGET. Un couple ne garde jamais plus de MAX_TEXTS textes (les
+plus anciens sortent en premier). Voir aussi scripts/fill_text_pool.py.
+
+    {"version": 1,
+     "texts": {"3:2": [{"id": "…", "paragraphs": [...], "items": [...], "created_at": …}]}}
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from qcmgen.jobs import get_job_runner
+from qcmgen.pictos.cache import _file_lock, _write_json_atomic, data_dir_path
+
+LOW_WATER = int(os.environ.get("QCMGEN_TEXT_POOL_LOW", "3"))
+TARGET = int(os.environ.get("QCMGEN_TEXT_POOL_TARGET", "8"))
+# plafond par couple: les générations directes (session qui a tout vu) ne font pas grossir le fichier sans fin
+MAX_TEXTS = max(TARGET, int(os.environ.get("QCMGEN_TEXT_POOL_MAX", "50")))
+
+POOL_VERSION = 1
+
+GenerateFn = Callable[[int, int], Tuple[List[str], Any]]
+
+
+def text_pool_path() -> str:
+    return str(data_dir_path() / "text_pool.json")
+
+
+def pool_key(complexity: int, nb_phrases: int) -> str:
+    return f"{int(complexity)}:{int(nb_phrases)}"
+
+
+def _text_id(paragraphs: List[str]) -> str:
+    return hashlib.sha1("\n".join(paragraphs).encode("utf-8")).hexdigest()[:16]
+
+
+def _default_generate(nb_phrases: int, complexity: int):
+    from qcmgen.sentence_generation import generate_text
+    return generate_text(nb_phrases, complexity)
+
+
+class TextPool:
+    """
+    Pre-generated texts by (complexity, number of sentences), kept in memory and
+    written with the same lock + merge + atomic replace as the picto cache.
+    """
+
+    def __init__(self, path: str, generate: GenerateFn = _default_generate):
+        self.path = path
+        self.generate = generate
+        self._lock = threading.RLock()
+        self._texts: Dict[str, List[Dict[str, Any]]] = {}
+        self._mtime: Optional[float] = None
+        self._refilling: Set[str] = set()
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except Exception:
+            return  # fichier corrompu: on garde la version en mémoire
+        self._texts = raw.get("texts", {})
+        self._mtime = mtime
+
+    def count(self, complexity: int, nb_phrases: int) -> int:
+        with self._lock:
+            self._reload()
+            return len(self._texts.get(pool_key(complexity, nb_phrases), []))
+
+    def add(self, complexity: int, nb_phrases: int, texts: Iterable[Tuple[List[str], Any]]) -> int:
+        """
+        Add generated (paragraphs, items) pairs; duplicates are skipped, and the oldest
+        texts beyond MAX_TEXTS are dropped. Returns the number added.
+        """
+        key = pool_key(complexity, nb_phrases)
+        new = [{"id": _text_id(p), "paragraphs": p, "items": items, "created_at": time.time()} for p, items in texts]
+        with self._lock, _file_lock(self.path):
+            self._mtime = None
+            self._reload()  # fusion avec ce que d'autres processus ont ajouté
+            entries = self._texts.setdefault(key, [])
+            known = {e["id"] for e in entries}
+            added = 0
+            for e in new:
+                if e["id"] not in known:
+                    entries.append(e)
+                    known.add(e["id"])
+                    added += 1
+            del entries[:-MAX_TEXTS]
+            _write_json_atomic(self.path, {"version": POOL_VERSION, "texts": self._texts})
+            self._mtime = os.stat(self.path).st_mtime
+            return added
+
+    def draw(self, complexity: int, nb_phrases: int, exclude_ids: Optional[Set[str]] = None) -> Optional[Dict[str, Any]]:
+        """A random text of the pool not in exclude_ids (None when there is none left)."""
+        exclude_ids = exclude_ids or set()
+        with self._lock:
+            self._reload()
+            candidates = [e for e in self._texts.get(pool_key(complexity, nb_phrases), []) if e["id"] not in exclude_ids]
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+    def refill(self, complexity: int, nb_phrases: int, target: int = TARGET, job=None) -> int:
+        """Generate texts (blocking LLM calls) until the pool holds `target` texts for this key (at most MAX_TEXTS)."""
+        target = min(target, MAX_TEXTS)
+        added = 0
+        attempts = 0
+        while self.count(complexity, nb_phrases) < target and attempts < 2 * target:
+            attempts += 1
+            if job is not None:
+                job.report("refill", self.count(complexity, nb_phrases), target)
+            try:
+                paragraphs, items = self.generate(nb_phrases, complexity)
+            except Exception as e:
+                print(f"Text pool refill failed for {pool_key(complexity, nb_phrases)}: {e}")
+                break
+            added += self.add(complexity, nb_phrases, [(paragraphs, items)])
+        return added
+
+    def schedule_refill(self, complexity: int, nb_phrases: int, target: int = TARGET) -> bool:
+        """Refill a key in the background (no-op if a refill of this key is already running)."""
+        key = pool_key(complexity, nb_phrases)
+        with self._lock:
+            if key in self._refilling:
+                return False
+            self._refilling.add(key)
+
+        def work(job):
+            try:
+                return self.refill(complexity, nb_phrases, target=target, job=job)
+            finally:
+                with self._lock:
+                    self._refilling.discard(key)
+
+        get_job_runner("text-pool").submit(work, key=key, name=f"text-pool-{key}")
+        return True
+
+    def get_text(self, complexity: int, nb_phrases: int, seen_ids: Optional[Set[str]] = None):
+        """
+        (paragraphs, items, text_id) for a text this session has not seen yet.
+        Served from the pool when possible; otherwise generated synchronously (and pooled).
+        Schedules a background refill when the key is low.
+        """
+        seen_ids = seen_ids or set()
+        with self._lock:
+            self._reload()
+            entries = list(self._texts.get(pool_key(complexity, nb_phrases), []))
+        candidates = [e for e in entries if e["id"] not in seen_ids]
+        entry = random.choice(candidates) if candidates else None
+
+        # sous le seuil (pour la réserve, ou pour ce que cette session n'a pas vu): recharge en fond,
+        # toujours jusqu'à TARGET (au-delà, une session qui a tout vu passe par l'appel direct)
+        if len(entries) < TARGET and (len(entries) < LOW_WATER or len(candidates) - 1 < LOW_WATER):
+            self.schedule_refill(complexity, nb_phrases)
+
+        if entry is None:
+            # réserve vide (ou tout déjà vu): appel direct, gardé pour les suivants
+            paragraphs, items = self.generate(nb_phrases, complexity)
+            self.add(complexity, nb_phrases, [(paragraphs, items)])
+            return paragraphs, items, _text_id(paragraphs)
+        return entry["paragraphs"], entry["items"], entry["id"]
+
+
+_POOL: Optional[TextPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_text_pool() -> TextPool:
+    """Process-wide text pool."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = TextPool(text_pool_path())
+        return _POOL
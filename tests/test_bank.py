@@ -0,0 +1,24 @@
+from qcmgen.bank import QuestionBank
+from qcmgen.qcm import QCM, ChoicePicto, QuestionType
+
+
+def _llm_qcm(category: str, answer: str) -> QCM:
+    # questions du mode LLM: qtype est la catégorie, pas un QuestionType
+    return QCM(question=f"Quel {category} est dans le texte ?", choices=[answer, "eau", "pain", "lait"],
+               answer_index=0, qtype=category, rationale="vu dans le texte", paragraph="Le chat boit du jus.",
+               pictos=[ChoicePicto(picto_id=1, url="https://static.arasaac.org/1.png"), None, None, None])
+
+
+def test_llm_qcms_round_trip(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite"))
+    template = QCM(question="Que boit le chat ?", choices=["jus", "eau", "pain", "lait"], answer_index=0,
+                   qtype=QuestionType.OBJECT)
+    qcms = [_llm_qcm("drink", "jus"), _llm_qcm("animal", "chat"), template]
+
+    assert bank.put_generation("k", "Le chat boit du jus.", qcms) == 3
+    stored = bank.get_generation("k")
+    assert [q.qtype for q in stored] == ["drink", "animal", QuestionType.OBJECT]
+    assert [(q.question, q.choices, q.pictos) for q in stored] == [(q.question, q.choices, q.pictos) for q in qcms]
+
+    assert [q.choices[0] for _, q in bank.search(qtype="drink")] == ["jus"]
+    assert [q.choices[0] for _, q in bank.search(qtype=QuestionType.OBJECT)] == ["jus"]
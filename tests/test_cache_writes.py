@@ -0,0 +1,15 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "stress_cache_writes.py"
+
+
+@pytest.mark.parametrize("extra", [[], ["--snapshot"]], ids=["json", "snapshot"])
+def test_concurrent_cache_writes(extra):
+    # plusieurs processus écrivent le même fichier: aucune entrée perdue, aucun fichier tronqué lu
+    result = subprocess.run([sys.executable, str(SCRIPT), "--writers", "4", "--terms", "20", *extra],
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
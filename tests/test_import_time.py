@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "check_import_time.py"
+
+
+def test_import_time_budget():
+    # budgets du README (Startup time); QCMGEN_IMPORT_TIME_SCALE=2 sur une machine lente
+    scale = os.environ.get("QCMGEN_IMPORT_TIME_SCALE", "1.0")
+    result = subprocess.run([sys.executable, str(SCRIPT), "--runs", "3", "--scale", scale],
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr